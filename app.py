@@ -11,6 +11,9 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 import joblib
 import os
+from flask import Response
+
+from inference.metrics import metrics
 
 # Initialize the Dash app with dark theme
 app = dash.Dash(__name__, 
@@ -134,6 +137,11 @@ app.layout = html.Div([
     dash.page_container
 ])
 
+# Prometheus-style metrics for the prediction path
+@app.server.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # Register pages
 import pages.home
 import pages.predictor
@@ -0,0 +1,255 @@
+"""Reproducible benchmark of the prediction path on synthetic workloads.
+
+Form rows are sampled (seeded) from the predictor's options codes, assembled
+into each backend's inputs as the app does, and scored by each backend:
+
+    artifact  compiled, memory-mapped artifact (what the app serves)
+    numpy     NumPy engine on the exported .npz plus the joblib scaler
+    keras     tf.keras model plus the joblib scaler (requires TensorFlow)
+
+For every backend it measures single-row latency, batch throughput at several
+batch sizes and multi-threaded throughput (direct calls and through the
+MicroBatcher), plus peak memory. Results are written as JSON; pass
+--baseline to fail when a run regresses against an earlier report.
+
+    python -m benchmarks.predictor_bench --output bench.json
+    python -m benchmarks.predictor_bench --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from inference.features import allowed_values, feature_names, model_matrix
+
+BACKENDS = ('artifact', 'numpy', 'keras')
+
+
+def synthetic_features(n_rows, seed=0):
+    """Sample n_rows feature vectors uniformly from each feature's valid codes."""
+    rng = np.random.default_rng(seed)
+    columns = [rng.choice(sorted(allowed_values[name]), size=n_rows) for name in feature_names]
+    return np.column_stack(columns).astype(float)
+
+
+def load_backend(name):
+    """Return (predict_fn, n_inputs, input columns) for a backend."""
+    if name == 'artifact':
+        from inference.artifact import load_artifact
+        from inference.registry import MODEL_PATH
+
+        artifact = load_artifact(MODEL_PATH)
+        return artifact.predict, artifact.n_inputs, artifact.feature_order
+
+    import joblib
+
+    # The scaler was fitted on a DataFrame; plain arrays are expected here
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    scaler = joblib.load("models/scaler.pkl")
+    if name == 'numpy':
+        from inference.numpy_model import load_model
+
+        model = load_model("models/multilabel_classification_model.npz")
+    else:
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model("models/multilabel_classification_model.h5")
+    n_inputs = model.n_inputs if name == 'numpy' else model.input_shape[-1]
+    return (lambda x: model.predict(scaler.transform(x), batch_size=len(x), verbose=0), n_inputs,
+            [str(c) for c in scaler.feature_names_in_])
+
+
+def model_rows(features, order, n_inputs):
+    """Assemble form rows into the model's inputs; fails, as the artifact
+    build does, when they do not match the width the model expects."""
+    rows = model_matrix(features, order)
+    if rows.shape[1] != n_inputs:
+        raise ValueError(f"The predictor assembles {rows.shape[1]} inputs, but the model expects {n_inputs}")
+    return rows
+
+
+def percentiles_ms(samples):
+    samples = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'mean': float(samples.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def bench_single_row(predict, features, iterations):
+    for row in features[:10]:
+        predict(row[None, :])
+    timings = []
+    for i in range(iterations):
+        row = features[i % len(features)][None, :]
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    return percentiles_ms(timings)
+
+
+def bench_batches(predict, features, batch_sizes, min_seconds):
+    results = {}
+    for size in batch_sizes:
+        batch = features[:size] if size <= len(features) else np.resize(features, (size, features.shape[1]))
+        predict(batch)
+        rows, started = 0, time.perf_counter()
+        while time.perf_counter() - started < min_seconds:
+            predict(batch)
+            rows += size
+        elapsed = time.perf_counter() - started
+        results[str(size)] = {'rows_per_s': rows / elapsed, 'ms_per_batch': elapsed / (rows / size) * 1000}
+    return results
+
+
+def bench_concurrent(predict, features, thread_counts, requests_per_thread):
+    """Throughput of single-row requests issued from several threads at once."""
+    results = {}
+    for threads in thread_counts:
+        latencies = [[] for _ in range(threads)]
+
+        def worker(t):
+            for i in range(requests_per_thread):
+                row = features[(t * requests_per_thread + i) % len(features)]
+                started = time.perf_counter()
+                predict(row)
+                latencies[t].append(time.perf_counter() - started)
+
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        results[str(threads)] = {
+            'requests_per_s': threads * requests_per_thread / elapsed,
+            'latency_ms': percentiles_ms([t for per_thread in latencies for t in per_thread]),
+        }
+    return results
+
+
+def run_backend(name, args):
+    # Peak memory is traced over loading and the largest batch only, since
+    # tracemalloc would distort the timings below
+    tracemalloc.start()
+    started = time.perf_counter()
+    predict, n_inputs, order = load_backend(name)
+    load_seconds = time.perf_counter() - started
+    features = model_rows(synthetic_features(args.rows, args.seed), order, n_inputs)
+    predict(np.resize(features, (max(args.batch_sizes), n_inputs)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'backend': name,
+        'n_inputs': int(n_inputs),
+        'load_seconds': load_seconds,
+        'peak_traced_mb': peak / 2**20,
+        'single_row_latency_ms': bench_single_row(predict, features, args.iterations),
+        'batch_throughput': bench_batches(predict, features, args.batch_sizes, args.min_seconds),
+        'concurrent_direct': bench_concurrent(lambda row: predict(row[None, :]), features,
+                                              args.threads, args.requests_per_thread),
+    }
+
+    from inference.micro_batch import MicroBatcher
+
+    batcher = MicroBatcher(predict, max_batch_size=args.max_batch_size, max_wait_ms=args.batch_window_ms)
+    result['concurrent_micro_batched'] = bench_concurrent(batcher.predict, features,
+                                                          args.threads, args.requests_per_thread)
+    result['micro_batcher'] = {k: v for k, v in batcher.stats().items() if k in ('batches', 'mean_batch_size')}
+
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def find_regressions(report, baseline, tolerance):
+    """Compare key figures with a baseline report; return human-readable regressions."""
+    previous = {r['backend']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        old = previous.get(result['backend'])
+        if old is None:
+            continue
+        checks = [('single-row p50 ms', result['single_row_latency_ms']['p50'],
+                   old['single_row_latency_ms']['p50'], 'lower')]
+        for size, figures in result['batch_throughput'].items():
+            if size in old['batch_throughput']:
+                checks.append((f"batch {size} rows/s", figures['rows_per_s'],
+                               old['batch_throughput'][size]['rows_per_s'], 'higher'))
+        for label, new, before, better in checks:
+            worse = new > before * (1 + tolerance) if better == 'lower' else new < before * (1 - tolerance)
+            if worse:
+                regressions.append(f"{result['backend']}: {label} {before:.4g} -> {new:.4g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the predictor on synthetic workloads")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['artifact', 'numpy'])
+    parser.add_argument('--rows', type=int, default=10_000, help="synthetic feature vectors to sample")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=2000, help="single-row predictions to time")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64, 512, 4096])
+    parser.add_argument('--min-seconds', type=float, default=1.0, help="time spent per batch size")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests-per-thread', type=int, default=500)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment(), 'config': vars(args), 'results': []}
+    for name in args.backends:
+        try:
+            result = run_backend(name, args)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+        report['results'].append(result)
+        print(f"{name:>8}: single row p50 {result['single_row_latency_ms']['p50']:.3f} ms, "
+              f"batch {args.batch_sizes[-1]} {result['batch_throughput'][str(args.batch_sizes[-1])]['rows_per_s']:,.0f} rows/s",
+              file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
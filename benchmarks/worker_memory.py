@@ -0,0 +1,150 @@
+"""Per-worker memory of the predictor under different model loading paths.
+
+Starts N worker processes per mode, has each load the model and score one
+batch, and reports their memory while all of them are alive at once:
+
+    keras  tf.keras.models.load_model on the .h5 plus the joblib scaler
+    numpy  NumPy engine with weights copied into each process (.npz)
+    mmap   compiled artifact memory-mapped read-only (shared page cache)
+
+RSS counts shared pages in every process; PSS splits them between the
+processes sharing them, so summed PSS is the node's real footprint.
+
+    python -m benchmarks.worker_memory --workers 4 --output worker_memory.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+H5_PATH = "models/multilabel_classification_model.h5"
+NPZ_PATH = "models/multilabel_classification_model.npz"
+SCALER_PATH = "models/scaler.pkl"
+ARTIFACT_PATH = "models/predictor_model.bin"
+
+MODES = ('keras', 'numpy', 'mmap')
+
+
+def memory_kb():
+    """RSS/PSS/shared/private memory of this process in kB (Linux smaps_rollup)."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    def kb(name):
+        return int(fields.get(name, '0 kB').split()[0])
+
+    return {
+        'rss': kb('Rss'),
+        'pss': kb('Pss'),
+        'shared': kb('Shared_Clean') + kb('Shared_Dirty'),
+        'private': kb('Private_Clean') + kb('Private_Dirty'),
+    }
+
+
+def _load(mode):
+    if mode == 'keras':
+        import joblib
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(H5_PATH)
+        scaler = joblib.load(SCALER_PATH)
+        return lambda x: model.predict(scaler.transform(x), verbose=0), model.input_shape[-1]
+    if mode == 'numpy':
+        from inference.numpy_model import load_model
+
+        model = load_model(NPZ_PATH)
+        return model.predict, model.n_inputs
+    from inference.artifact import load_artifact
+
+    artifact = load_artifact(ARTIFACT_PATH)
+    return artifact.predict, artifact.n_inputs
+
+
+def _worker(mode, barrier, results):
+    try:
+        baseline = memory_kb()
+        started = time.perf_counter()
+        predict, n_inputs = _load(mode)
+        load_seconds = time.perf_counter() - started
+        predict(np.ones((64, n_inputs)))
+
+        # Measure only once every worker has loaded, so shared pages are shared
+        barrier.wait()
+        results.put({'baseline': baseline, 'loaded': memory_kb(), 'load_seconds': load_seconds})
+        barrier.wait()
+    except Exception as e:
+        barrier.abort()
+        results.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_mode(mode, workers):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(mode, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=300) for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [r['error'] for r in reports if 'error' in r]
+    if errors:
+        raise RuntimeError(errors[0])
+
+    loaded = [r['loaded'] for r in reports]
+    summary = {
+        'mode': mode,
+        'workers': workers,
+        'mean_load_seconds': float(np.mean([r['load_seconds'] for r in reports])),
+        'per_worker': reports,
+    }
+    for key in loaded[0]:
+        summary[f"mean_{key}_kb"] = float(np.mean([m[key] for m in loaded]))
+        summary[f"total_{key}_kb"] = int(sum(m[key] for m in loaded))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': [],
+    }
+    for mode in args.modes:
+        try:
+            summary = run_mode(mode, args.workers)
+        except Exception as e:
+            print(f"Skipping {mode}: {e}", file=sys.stderr)
+            continue
+        report['results'].append(summary)
+        print(f"{mode:>6}: mean RSS {summary['mean_rss_kb'] / 1024:8.1f} MB, "
+              f"total PSS {summary.get('total_pss_kb', 0) / 1024:8.1f} MB, "
+              f"load {summary['mean_load_seconds']:.3f}s", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""BM25 inverted index over the chunks of a DocChat index.
+
+Built with the vector index and saved in the same directory, so exact terms
+(drug names, "otitis media") can be matched without embedding the query.
+Postings are stored as flat arrays per term with their BM25 term-frequency
+weight precomputed, so scoring a query is one vectorised add per query term.
+"""
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+POSTINGS_FILE = "bm25.npz"
+CHUNKS_FILE = "chunks.json"
+
+# Baked into the saved weights; changing them needs a new index (bump
+# docchat.index.FORMAT_VERSION)
+K1 = 1.5
+B = 0.75
+
+TOKEN = re.compile(r"\b\w\w+\b")
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+
+class BM25Index:
+    """Postings of terms[i] are doc_ids[offsets[i]:offsets[i + 1]], with their
+    saturated, length-normalised term frequencies in weights."""
+
+    def __init__(self, terms, idf, offsets, doc_ids, weights, chunks):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.terms = np.asarray(terms, dtype=str)
+        self.idf = idf
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.chunks = chunks
+
+    @classmethod
+    def build(cls, docs):
+        counts = [Counter(tokenize(doc.page_content)) for doc in docs]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+        postings = {}
+        for doc_id, doc_counts in enumerate(counts):
+            for term, tf in doc_counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        pairs = np.array([pair for term in terms for pair in postings[term]], dtype=np.float32).reshape(-1, 2)
+        doc_ids = pairs[:, 0].astype(np.int32)
+        tf = pairs[:, 1]
+        weights = tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[doc_ids] / average))
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        chunks = [{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in docs]
+        return cls(terms, idf, offsets, doc_ids, weights.astype(np.float32), chunks)
+
+    def save(self, directory):
+        np.savez(os.path.join(directory, POSTINGS_FILE), terms=self.terms, idf=self.idf, offsets=self.offsets,
+                 doc_ids=self.doc_ids, weights=self.weights)
+        with open(os.path.join(directory, CHUNKS_FILE), 'w') as f:
+            json.dump(self.chunks, f, default=str)
+
+    @classmethod
+    def load(cls, directory):
+        with np.load(os.path.join(directory, POSTINGS_FILE)) as saved:
+            arrays = {name: saved[name] for name in saved.files}
+        with open(os.path.join(directory, CHUNKS_FILE)) as f:
+            chunks = json.load(f)
+        return cls(arrays['terms'].tolist(), arrays['idf'], arrays['offsets'], arrays['doc_ids'],
+                   arrays['weights'], chunks)
+
+    def search(self, query, k):
+        """Ids of the (at most) k best-scoring chunks, best first."""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.vocabulary.get(term)
+            if i is not None:
+                start, end = self.offsets[i], self.offsets[i + 1]
+                # A term's postings hold each chunk once, so this adds in place
+                scores[self.doc_ids[start:end]] += self.idf[i] * self.weights[start:end]
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind='stable')].tolist()
+
+    def document(self, chunk_id):
+        return Document(**self.chunks[chunk_id])
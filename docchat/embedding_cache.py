@@ -0,0 +1,86 @@
+"""Durable cache of chunk embeddings in front of an embedding backend.
+
+Vectors are stored in SQLite by (embedding model, sha256 of the chunk text),
+so rebuilding the index after the splitter settings change, or ingesting
+documents that overlap ones seen before, only sends chunks the cache has not
+seen to the backend. The database is shared by all indexes and processes.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDINGS_FILE = "embeddings.sqlite3"
+
+# Hashes looked up per query (SQLite limits the number of parameters)
+LOOKUP_BATCH = 500
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeds documents through embedding, reusing vectors stored for model.
+
+    Queries are passed straight through: some backends embed queries
+    differently from documents, and they are not worth storing.
+    """
+
+    def __init__(self, embedding, model, path):
+        self.embedding = embedding
+        self.model = model
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                       "(model TEXT, hash TEXT, vector BLOB, PRIMARY KEY (model, hash))")
+
+    def _connect(self):
+        # Waits for another process's write instead of failing
+        return sqlite3.connect(self.path, timeout=60)
+
+    def _lookup(self, db, hashes):
+        found = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[start:start + LOOKUP_BATCH]
+            rows = db.execute(f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN "
+                              f"({', '.join('?' * len(batch))})", [self.model, *batch])
+            found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        with closing(self._connect()) as db:
+            found = self._lookup(db, list(dict.fromkeys(hashes)))
+            missing = {key: text for key, text in zip(hashes, texts) if key not in found}
+            if missing:
+                vectors = self.embedding.embed_documents(list(missing.values()))
+                computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+                with db:
+                    db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                                   [(self.model, key, vector.tobytes()) for key, vector in computed.items()])
+                found.update(computed)
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[key].tolist() for key in hashes]
+
+    def embed_query(self, text):
+        return self.embedding.embed_query(text)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
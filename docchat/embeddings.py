@@ -0,0 +1,146 @@
+"""Embedding backends for DocChat retrieval.
+
+A backend turns the 'embedding' entry of the index settings into a LangChain
+Embeddings object:
+
+    google  Google's embedding API, through the durable embedding cache
+    local   TF-IDF vectors reduced by truncated SVD, computed on the CPU
+            without network access
+
+The backend is chosen by the DOCCHAT_EMBEDDINGS environment variable (or
+--embeddings of python -m docchat.index); a backend is added by giving it
+default settings in DEFAULTS and a factory in FACTORIES.
+
+The local backend is fitted to the chunks of the index it embeds, so its
+model is saved in the index directory and loaded with it. A query is
+embedded by summing the projected rows of its terms, which takes tens of
+microseconds.
+"""
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from docchat.embedding_cache import EMBEDDINGS_FILE, CachedEmbeddings
+
+DEFAULTS = {
+    'google': {'model': "models/embedding-001"},
+    'local': {'dimensions': 256},
+}
+
+DEFAULT_BACKEND = os.environ.get('DOCCHAT_EMBEDDINGS', 'google')
+
+LOCAL_MODEL_FILE = "local_embeddings.npz"
+
+# Tokenisation of the local backend; part of the model, so changing it needs
+# a new index (bump docchat.index.FORMAT_VERSION)
+VECTORIZER_OPTIONS = {'stop_words': 'english', 'sublinear_tf': True, 'dtype': np.float32}
+
+
+def embedding_settings(backend=DEFAULT_BACKEND):
+    if backend not in DEFAULTS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(DEFAULTS)}")
+    return {'backend': backend, **DEFAULTS[backend]}
+
+
+class FittedEmbeddings(Embeddings, ABC):
+    """An embedding backend fitted to the chunks of one index and saved in
+    its directory. build_index fits and saves it before embedding the
+    chunks; open_index loads it when the index was built elsewhere."""
+
+    fitted = False
+
+    @abstractmethod
+    def fit(self, texts):
+        """Fit to the texts; returns self."""
+
+    @abstractmethod
+    def save(self, directory):
+        """Save the fitted model in directory."""
+
+    @abstractmethod
+    def load(self, directory):
+        """Load the model saved in directory; returns self."""
+
+
+class LocalEmbeddings(FittedEmbeddings):
+    """Latent semantic vectors: TF-IDF over the index's chunks, projected on
+    their top singular vectors and normalised to unit length."""
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self._analyzer = TfidfVectorizer(**VECTORIZER_OPTIONS).build_analyzer()
+
+    def _set(self, terms, idf, projection):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.terms = np.asarray(terms, dtype=str)
+        self.idf = idf
+        # Row i is term i projected on the singular vectors, so a text's
+        # vector is the TF-IDF-weighted sum of the rows of its terms
+        self.projection = np.ascontiguousarray(projection, dtype=np.float32)
+        self.fitted = True
+
+    def fit(self, texts):
+        vectorizer = TfidfVectorizer(**VECTORIZER_OPTIONS)
+        tfidf = vectorizer.fit_transform(texts)
+        n_components = max(1, min(self.dimensions, tfidf.shape[0] - 1, tfidf.shape[1] - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=0).fit(tfidf)
+        self._set(vectorizer.get_feature_names_out(), vectorizer.idf_.astype(np.float32), svd.components_.T)
+        return self
+
+    def save(self, directory):
+        np.savez(os.path.join(directory, LOCAL_MODEL_FILE), terms=self.terms, idf=self.idf,
+                 projection=self.projection)
+
+    def load(self, directory):
+        with np.load(os.path.join(directory, LOCAL_MODEL_FILE)) as saved:
+            self._set(saved['terms'].tolist(), saved['idf'], saved['projection'])
+        return self
+
+    def _embed(self, text):
+        if not self.fitted:
+            raise RuntimeError("LocalEmbeddings must be fitted or loaded before embedding")
+        ids = [self.vocabulary[term] for term in self._analyzer(text) if term in self.vocabulary]
+        vector = np.zeros(self.projection.shape[1], dtype=np.float32)
+        if ids:
+            ids, counts = np.unique(ids, return_counts=True)
+            # Same weighting as TfidfVectorizer: sublinear tf, idf, unit norm
+            weights = (1 + np.log(counts, dtype=np.float32)) * self.idf[ids]
+            vector = weights @ self.projection[ids] / np.linalg.norm(weights)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def google_embedding(settings, cache_dir):
+    # Imported here so the local backend works without Google credentials
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=settings['model']), settings['model'],
+                            os.path.join(cache_dir, EMBEDDINGS_FILE))
+
+
+def local_embedding(settings, cache_dir):
+    # Cheap to compute and specific to one index, so not cached
+    return LocalEmbeddings(settings['dimensions'])
+
+
+FACTORIES = {
+    'google': google_embedding,
+    'local': local_embedding,
+}
+
+
+def create_embedding(settings, cache_dir):
+    """The Embeddings object of a backend, from embedding_settings()."""
+    return FACTORIES[settings['backend']](settings, cache_dir)
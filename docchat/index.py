@@ -0,0 +1,319 @@
+"""Persistent Chroma and BM25 indexes of the DocChat PDFs.
+
+The index is built once per key, a hash of the PDFs together with the
+splitter and embedding settings, and saved under .cache/docchat. Later
+starts, and every other worker, open the saved collection instead of parsing
+and embedding the PDFs again. A file lock lets only one process build a
+given index; the others wait for it and then open it, or, after
+BUILD_TIMEOUT, fall back to an earlier index of the same PDFs. Chunks are embedded by
+the backend chosen in docchat.embeddings; the remote one goes through a
+durable cache (docchat.embedding_cache), so a rebuild only embeds chunks
+whose text is new. The BM25 index of the same chunks (docchat.bm25) is saved
+in the same directory; open_retriever fuses the two (docchat.retrieval).
+An index replaced by one of newer PDFs is marked SUPERSEDED and deleted
+only once it is STALE_SECONDS old and no process has it open.
+
+    python -m docchat.index assets/book2.pdf
+    python -m docchat.index --embeddings local
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from filelock import FileLock, Timeout
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_chroma import Chroma
+from langchain_community.document_loaders import PyPDFLoader
+
+from docchat.bm25 import BM25Index
+from docchat.embedding_cache import CachedEmbeddings
+from docchat.embeddings import DEFAULTS, FittedEmbeddings, create_embedding, embedding_settings
+from docchat.retrieval import HybridRetriever
+
+PDF_PATHS = ["assets/book2.pdf"]
+CACHE_DIR = ".cache/docchat"
+
+# Written last; its presence marks an index as complete
+MANIFEST = "manifest.json"
+COLLECTION = "docchat"
+# Written into an index built from earlier contents of the PDFs
+SUPERSEDED = "SUPERSEDED"
+# Locked (shared) by every process that has the index open
+READERS = ".readers"
+
+# How long (seconds) to wait for another process building the same index
+BUILD_TIMEOUT = 600.0
+
+# How long (seconds) a replaced index is kept before it may be deleted
+STALE_SECONDS = 3600.0
+
+# Part of the index key; bump when the way chunks are built or stored changes
+FORMAT_VERSION = 2
+
+# Splitter and embedding settings; changing any of them builds a new index
+SETTINGS = {
+    'chunk_size': 1000,
+    'chunk_overlap': 200,
+    'embedding': embedding_settings(),
+}
+
+
+def index_key(pdf_paths, settings=SETTINGS):
+    digest = hashlib.sha256(f"docchat-index/{FORMAT_VERSION}".encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    for path in pdf_paths:
+        # The path is stored with every chunk, so it is part of the key too
+        digest.update(b"\0" + path.encode() + b"\0")
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def load_documents(pdf_paths):
+    """Pages of the PDFs; files that fail to load are reported and skipped."""
+    data = []
+    for pdf_path in pdf_paths:
+        print(f"Loading file: {pdf_path}")
+        try:
+            current_data = PyPDFLoader(pdf_path).load()
+            data.extend(current_data)
+            print(f"Successfully loaded {len(current_data)} pages from {pdf_path}")
+        except Exception as e:
+            print(f"Error loading {pdf_path}: {str(e)}")
+    return data
+
+
+def split_documents(data, settings=SETTINGS):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=settings['chunk_size'],
+                                              chunk_overlap=settings['chunk_overlap'])
+    return splitter.split_documents(data)
+
+
+# Open files holding the shared locks of the indexes this process uses,
+# kept until it exits
+_open_indexes = {}
+
+
+def _hold_open(directory):
+    """Mark the index in directory as in use by this process."""
+    if directory not in _open_indexes:
+        f = open(os.path.join(directory, READERS), 'a')
+        fcntl.flock(f, fcntl.LOCK_SH)
+        _open_indexes[directory] = f
+
+
+def _in_use(directory):
+    """Whether any process has the index in directory open."""
+    try:
+        f = open(os.path.join(directory, READERS), 'a')
+    except OSError:
+        return False
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_index(pdf_paths, directory, embedding, settings=SETTINGS, progress=print):
+    """Parse, split and embed the PDFs into a persistent collection in
+    directory. Returns the manifest."""
+    started = time.perf_counter()
+    cached = embedding.stats() if isinstance(embedding, CachedEmbeddings) else None
+    # Left over by a build that was interrupted
+    shutil.rmtree(directory, ignore_errors=True)
+
+    progress("Loading documents...")
+    data = load_documents(pdf_paths)
+    if not data:
+        raise FileNotFoundError("No PDF files could be loaded. Please check the file paths.")
+
+    progress("Splitting documents...")
+    docs = split_documents(data, settings)
+    # Lets the retriever match vector results with BM25 ones
+    for chunk_id, doc in enumerate(docs):
+        doc.metadata['chunk'] = chunk_id
+
+    if isinstance(embedding, FittedEmbeddings):
+        progress("Fitting embeddings...")
+        os.makedirs(directory, exist_ok=True)
+        embedding.fit([doc.page_content for doc in docs]).save(directory)
+
+    progress("Creating vector store...")
+    Chroma.from_documents(documents=docs, embedding=embedding, collection_name=COLLECTION,
+                          persist_directory=directory)
+
+    progress("Indexing terms...")
+    lexical = BM25Index.build(docs)
+    lexical.save(directory)
+
+    manifest = {
+        'key': index_key(pdf_paths, settings),
+        'sources': [os.path.abspath(path) for path in pdf_paths],
+        'settings': settings,
+        'n_pages': len(data),
+        'n_chunks': len(docs),
+        'n_terms': len(lexical.terms),
+        'build_seconds': round(time.perf_counter() - started, 3),
+    }
+    if cached is not None:
+        # Cache lookups of this build alone
+        after = embedding.stats()
+        hits, misses = after['hits'] - cached['hits'], after['misses'] - cached['misses']
+        manifest['embedding_cache'] = {'hits': hits, 'misses': misses,
+                                       'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0}
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def prepare_index(pdf_paths=PDF_PATHS, cache_dir=CACHE_DIR, settings=SETTINGS, embedding=None, progress=print):
+    """Build the index of the PDFs if there is none for their current contents
+    and these settings. Returns its directory and the embedding to query it.
+
+    progress(text) is called with the stage of a build, if one is needed.
+    """
+    paths = [path for path in pdf_paths if os.path.exists(path)]
+    for path in pdf_paths:
+        if path not in paths:
+            print(f"File not found: {path}")
+    if not paths:
+        raise FileNotFoundError("No PDF files could be loaded. Please check the file paths.")
+
+    key = index_key(paths, settings)
+    directory = target = os.path.join(cache_dir, key[:16])
+    if embedding is None:
+        embedding = create_embedding(settings['embedding'], cache_dir)
+    sources = [os.path.abspath(path) for path in paths]
+    if _read_manifest(directory) is None:
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with FileLock(os.path.join(cache_dir, f".{key[:16]}.lock"), timeout=BUILD_TIMEOUT):
+                # Another process may have built it while this one waited
+                if _read_manifest(directory) is None:
+                    _build(paths, directory, embedding, settings, progress)
+        except Timeout:
+            directory = _previous_index(cache_dir, sources, settings)
+            if directory is None:
+                # Build a private copy rather than wait any longer
+                directory = os.path.join(cache_dir, f"{key[:16]}-{os.getpid()}")
+                print(f"Timed out after {BUILD_TIMEOUT:.0f}s waiting for the DocChat index {key[:16]}; "
+                      f"building it in {directory}")
+                _build(paths, directory, embedding, settings, progress)
+            else:
+                print(f"Timed out after {BUILD_TIMEOUT:.0f}s waiting for the DocChat index {key[:16]}; "
+                      f"using the earlier index {directory}")
+    else:
+        # The PDFs may have gone back to these contents
+        try:
+            os.remove(os.path.join(directory, SUPERSEDED))
+        except FileNotFoundError:
+            pass
+    _hold_open(directory)
+    if directory == target:
+        _remove_stale(cache_dir, directory, sources, settings)
+    if isinstance(embedding, FittedEmbeddings) and not embedding.fitted:
+        embedding.load(directory)
+    return directory, embedding
+
+
+def _build(pdf_paths, directory, embedding, settings, progress):
+    manifest = build_index(pdf_paths, directory, embedding, settings, progress)
+    print(f"Built DocChat index {os.path.basename(directory)}: {manifest['n_chunks']} chunks "
+          f"in {manifest['build_seconds']:.1f}s")
+    if 'embedding_cache' in manifest:
+        cache = manifest['embedding_cache']
+        print(f"Embedding cache: {cache['hits']} hits, {cache['misses']} embedded "
+              f"({cache['hit_rate']:.0%} hit rate)")
+
+
+def _previous_index(cache_dir, sources, settings):
+    """The newest complete index of the same PDFs and settings, or None."""
+    found = []
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        manifest = _read_manifest(path)
+        if (not entry.startswith('.') and manifest is not None
+                and (manifest.get('sources'), manifest.get('settings')) == (sources, settings)):
+            found.append((os.path.getmtime(os.path.join(path, MANIFEST)), path))
+    return max(found)[1] if found else None
+
+
+def open_index(pdf_paths=PDF_PATHS, cache_dir=CACHE_DIR, settings=SETTINGS, embedding=None, progress=print):
+    """The persisted Chroma store of the PDFs, built first if needed."""
+    directory, embedding = prepare_index(pdf_paths, cache_dir, settings, embedding, progress)
+    return Chroma(collection_name=COLLECTION, embedding_function=embedding, persist_directory=directory)
+
+
+def open_retriever(pdf_paths=PDF_PATHS, cache_dir=CACHE_DIR, settings=SETTINGS, embedding=None, progress=print,
+                   **options):
+    """A HybridRetriever over the PDFs' BM25 and vector indexes, built first
+    if needed. options (k, candidates, vector_timeout, ...) are passed on."""
+    directory, embedding = prepare_index(pdf_paths, cache_dir, settings, embedding, progress)
+    vectorstore = Chroma(collection_name=COLLECTION, embedding_function=embedding, persist_directory=directory)
+    return HybridRetriever(vectorstore=vectorstore, lexical=BM25Index.load(directory), **options)
+
+
+def _remove_stale(cache_dir, current, sources, settings, stale_seconds=STALE_SECONDS):
+    """Retire indexes built from earlier contents of the same PDFs.
+
+    Each is first marked SUPERSEDED, and deleted once the mark is older than
+    stale_seconds, provided no process has it open or is building it.
+    """
+    now = time.time()
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if path == current or entry.startswith('.') or not os.path.isdir(path):
+            continue
+        marker = os.path.join(path, SUPERSEDED)
+        try:
+            marked = os.path.getmtime(marker)
+        except FileNotFoundError:
+            previous = _read_manifest(path)
+            if previous is not None and (previous.get('sources'), previous.get('settings')) == (sources, settings):
+                open(marker, 'w').close()
+            continue
+        if now - marked < stale_seconds or _in_use(path):
+            continue
+        try:
+            with FileLock(os.path.join(cache_dir, f".{entry[:16]}.lock"), timeout=0):
+                shutil.rmtree(path, ignore_errors=True)
+        except Timeout:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the persistent DocChat index")
+    parser.add_argument('pdf_paths', nargs='*', default=PDF_PATHS)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--embeddings', choices=list(DEFAULTS), default=SETTINGS['embedding']['backend'],
+                        help="embedding backend (default: $DOCCHAT_EMBEDDINGS or google)")
+    args = parser.parse_args(argv)
+
+    settings = {**SETTINGS, 'embedding': embedding_settings(args.embeddings)}
+    started = time.perf_counter()
+    vectorstore = open_index(args.pdf_paths, args.cache_dir, settings)
+    print(f"Opened index of {vectorstore._collection.count()} chunks in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Hybrid DocChat retriever: BM25 and vector search fused by reciprocal rank.
+
+Both searches rank a pool of candidates and reciprocal rank fusion merges
+the two rankings, so a chunk that either search ranks highly is retrieved.
+The vector search (which embeds the query, possibly over the network) runs
+alongside the BM25 one; if it fails or takes longer than vector_timeout,
+the query is answered from BM25 alone and vector search is skipped for
+cooldown seconds, so later queries do not wait for it again.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper
+RRF_K = 60
+
+# Shared by all retrievers; a timed-out search finishes here in the background
+_vector_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="docchat-vector")
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merge rankings (lists of ids, best first) into one, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieves k chunks for a query from a BM25Index and the Chroma store of
+    the same chunks (whose metadata hold their 'chunk' id)."""
+
+    vectorstore: Any
+    lexical: Any
+    k: int = 5
+    candidates: int = 20
+    vector_timeout: float = 1.0
+    cooldown: float = 30.0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _skip_vector_until: float = PrivateAttr(default=0.0)
+    _counts: dict = PrivateAttr(default_factory=lambda: {'hybrid': 0, 'lexical_only': 0,
+                                                         'vector_failures': 0, 'vector_timeouts': 0})
+
+    def _vector_ranking(self, query):
+        docs = self.vectorstore.similarity_search(query, k=self.candidates)
+        return [doc.metadata['chunk'] for doc in docs if 'chunk' in doc.metadata]
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        started = time.perf_counter()
+        future = None
+        if time.monotonic() >= self._skip_vector_until:
+            future = _vector_pool.submit(self._vector_ranking, query)
+        rankings = [self.lexical.search(query, self.candidates)]
+
+        if future is not None:
+            try:
+                remaining = self.vector_timeout - (time.perf_counter() - started)
+                rankings.append(future.result(timeout=max(remaining, 0)))
+            except FutureTimeout:
+                self._count('vector_timeouts')
+                self._skip_vector_until = time.monotonic() + self.cooldown
+            except Exception as e:
+                print(f"Vector search failed, answering from BM25 only: {e}")
+                self._count('vector_failures')
+                self._skip_vector_until = time.monotonic() + self.cooldown
+        self._count('hybrid' if len(rankings) > 1 else 'lexical_only')
+
+        chunk_ids = reciprocal_rank_fusion(rankings)[:self.k]
+        return [self.lexical.document(chunk_id) for chunk_id in chunk_ids]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,114 @@
+"""DocChat answers generated in background threads and read while they stream.
+
+start_answer(stream) runs stream(), an iterator of text pieces, in a thread
+and returns a job id; the page polls the job and shows the text so far, so
+the wait users feel is the time to the first token rather than to the whole
+answer. Both are recorded as histograms on /metrics.
+
+Jobs live in the process that started them, so polls must reach the same
+worker (sticky sessions when more than one is running).
+"""
+import threading
+import time
+import uuid
+
+from inference.metrics import metrics
+
+ANSWER_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+time_to_first_token = metrics.histogram(
+    'docchat_time_to_first_token_seconds',
+    "Time from a DocChat question to the first streamed piece of its answer",
+    buckets=ANSWER_BUCKETS)
+answer_seconds = metrics.histogram(
+    'docchat_answer_seconds',
+    "Time to stream whole DocChat answers",
+    buckets=ANSWER_BUCKETS)
+
+# Finished jobs nobody read to the end (closed pages) are dropped once they
+# have not been polled for this long (seconds)
+JOB_TTL = 600
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class AnswerJob:
+    def __init__(self):
+        self.text = ''
+        self.done = False
+        self.error = None
+        self.started = time.perf_counter()
+        # Last poll, or the finish if later
+        self.touched = self.started
+        self.first_token_seconds = None
+        self.total_seconds = None
+        self._lock = threading.Lock()
+
+    def run(self, stream):
+        status = 'ok'
+        try:
+            for piece in stream():
+                if not piece:
+                    continue
+                with self._lock:
+                    if self.first_token_seconds is None:
+                        self.first_token_seconds = time.perf_counter() - self.started
+                        time_to_first_token.observe(self.first_token_seconds)
+                    self.text += piece
+        except Exception as e:
+            status = 'error'
+            print(f"Error streaming answer: {e}")
+            with self._lock:
+                self.error = str(e)
+        finally:
+            with self._lock:
+                self.total_seconds = time.perf_counter() - self.started
+                self.touched = self.started + self.total_seconds
+                self.done = True
+            answer_seconds.observe(self.total_seconds, status=status)
+            print(f"Answer streamed: first token "
+                  f"{'-' if self.first_token_seconds is None else f'{self.first_token_seconds:.2f}s'}, "
+                  f"total {self.total_seconds:.2f}s, {len(self.text)} chars")
+
+    def expired(self, now):
+        with self._lock:
+            return self.done and now - self.touched > JOB_TTL
+
+    def snapshot(self):
+        with self._lock:
+            self.touched = time.perf_counter()
+            return {
+                'text': self.text,
+                'done': self.done,
+                'error': self.error,
+                'first_token_seconds': self.first_token_seconds,
+                'total_seconds': self.total_seconds,
+            }
+
+
+def start_answer(stream):
+    """Run stream() in a background thread; returns the id to poll it by."""
+    now = time.perf_counter()
+    job = AnswerJob()
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        for stale in [key for key, other in _jobs.items() if other.expired(now)]:
+            del _jobs[stale]
+        _jobs[job_id] = job
+    threading.Thread(target=job.run, args=(stream,), daemon=True).start()
+    return job_id
+
+
+def poll_answer(job_id):
+    """The answer so far (see AnswerJob.snapshot), or None for an unknown
+    job. A finished job is forgotten once it has been read."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+    snapshot = job.snapshot()
+    if snapshot['done']:
+        with _jobs_lock:
+            _jobs.pop(job_id, None)
+    return snapshot
@@ -0,0 +1,251 @@
+"""Single, versioned predictor artifact with the scaler folded into the model.
+
+Build it with
+
+    python -m inference.artifact --model models/multilabel_classification_model.npz \
+        --scaler models/scaler.pkl --output models/predictor_model.bin
+
+The artifact is one flat file: a magic string, a JSON header (metadata with
+feature order, conditions, source hashes and a content hash, plus a table of
+arrays) and the raw weight arrays, each aligned to a page boundary. Loading
+memory-maps the file read-only and wraps the arrays in place, so there is no
+deserialization and every worker on a node shares one copy of the weights
+through the page cache. Loading needs neither sklearn nor TensorFlow.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from inference.features import conditions, model_inputs
+from inference.numpy_model import NumpyModel, load_model
+
+ARTIFACT_FORMAT = 3
+
+MAGIC = b'CHAIMDL\x00'
+ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(arrays, meta):
+    """Hash of every array and the metadata that affects predictions."""
+    digest = hashlib.sha256()
+    stable = {k: v for k, v in meta.items() if k not in ('content_hash', 'version')}
+    digest.update(json.dumps(stable, sort_keys=True).encode())
+    for key in sorted(arrays):
+        value = np.ascontiguousarray(arrays[key])
+        digest.update(key.encode())
+        digest.update(str(value.dtype).encode())
+        digest.update(str(value.shape).encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def fold_scaler(layers, mean, scale):
+    """Fold x' = (x - mean) / scale into the first dense layer's kernel and bias."""
+    first = layers[0]
+    if first['type'] != 'dense':
+        raise ValueError("The first layer must be dense to fold the scaler into it")
+    kernel, bias = first['kernel'].astype(np.float64), first['bias'].astype(np.float64)
+    if kernel.shape[0] != len(mean):
+        raise ValueError(f"Scaler has {len(mean)} features, but the model expects {kernel.shape[0]}")
+    folded_kernel = kernel / scale[:, None]
+    folded_bias = bias - (mean / scale) @ kernel
+    return [dict(first, kernel=folded_kernel.astype(np.float32), bias=folded_bias.astype(np.float32))] + layers[1:]
+
+
+def fold_batch_norm(layers):
+    """Fold inference-time batch normalization into the following dense layer.
+
+    BN is affine, so dense(h * s + t) == h @ (s[:, None] * W) + (t @ W + b);
+    a batch norm that is not followed by a dense layer is kept as is.
+    """
+    folded = []
+    pending = None
+    for layer in layers:
+        if layer['type'] == 'batch_norm' and pending is None:
+            pending = layer
+            continue
+        if pending is not None and layer['type'] == 'dense':
+            scale = pending['gamma'] / np.sqrt(pending['moving_variance'] + np.float32(pending['epsilon']))
+            shift = pending['beta'] - pending['moving_mean'] * scale
+            layer = dict(layer, kernel=layer['kernel'] * scale[:, None],
+                         bias=layer['bias'] + shift @ layer['kernel'])
+        elif pending is not None:
+            folded.append(pending)
+        pending = None
+        if layer['type'] == 'batch_norm':
+            pending = layer
+        else:
+            folded.append(layer)
+    if pending is not None:
+        folded.append(pending)
+    return folded
+
+
+class ModelArtifact:
+    """A compiled model plus the metadata describing its inputs and outputs."""
+
+    def __init__(self, model, meta):
+        self.model = model
+        self.meta = meta
+
+    @property
+    def version(self):
+        return self.meta['version']
+
+    @property
+    def feature_order(self):
+        return self.meta['feature_order']
+
+    @property
+    def conditions(self):
+        return self.meta['conditions']
+
+    @property
+    def n_inputs(self):
+        return self.model.n_inputs
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """Score raw (unscaled) feature rows."""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim != 2 or x.shape[1] != self.model.n_inputs:
+            raise ValueError(f"X has {x.shape[-1]} features, but the model expects {self.model.n_inputs}")
+        return self.model.predict(x)
+
+
+def build_artifact(model_path, scaler_path, output_path):
+    """Fold the scaler into the model and atomically write the artifact."""
+    import joblib  # sklearn is only needed to unpickle the scaler at build time
+
+    model = load_model(model_path)
+    scaler = joblib.load(scaler_path)
+
+    n_inputs = model.n_inputs
+    mean = np.asarray(scaler.mean_ if getattr(scaler, 'with_mean', True) else np.zeros(n_inputs), dtype=np.float64)
+    scale = np.asarray(scaler.scale_ if getattr(scaler, 'with_std', True) else np.ones(n_inputs), dtype=np.float64)
+    layers = fold_batch_norm(fold_scaler(model.layers, mean, scale))
+    compiled = NumpyModel(layers)
+
+    # The folded network must reproduce scaler + original model
+    probe = np.random.default_rng(0).normal(mean, scale, size=(256, n_inputs))
+    expected = model.predict((probe - mean) / scale)
+    diff = float(np.abs(compiled.predict(probe) - expected).max())
+    if diff > 1e-4:
+        raise ValueError(f"Folded model deviates from scaler + model by {diff:.2e}")
+
+    # Rows are assembled in the order the scaler was fitted on, so an
+    # artifact that could not score what the predictor sends is never written
+    feature_order = [str(c) for c in getattr(scaler, 'feature_names_in_', [])]
+    if len(feature_order) != n_inputs:
+        raise ValueError(f"The scaler names {len(feature_order)} columns, but the model expects {n_inputs} inputs")
+    unknown = [column for column in feature_order if column not in model_inputs]
+    if unknown:
+        raise ValueError(f"No form feature provides the model inputs {', '.join(unknown)}")
+
+    arrays = compiled.to_arrays()
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'feature_order': feature_order,
+        'conditions': conditions,
+        'n_inputs': n_inputs,
+        'n_outputs': compiled.n_outputs,
+        'sources': {
+            'model': {'path': os.path.basename(model_path), 'sha256': _file_sha256(model_path)},
+            'scaler': {'path': os.path.basename(scaler_path), 'sha256': _file_sha256(scaler_path)},
+        },
+    }
+    meta['content_hash'] = content_hash(arrays, meta)
+    meta['version'] = meta['content_hash'][:12]
+
+    write_artifact(output_path, arrays, meta)
+    return ModelArtifact(compiled, meta)
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_artifact(output_path, arrays, meta):
+    """Atomically write arrays and metadata in the memory-mappable layout."""
+    layers = str(arrays['__layers__'])
+    numeric = {key: np.ascontiguousarray(value) for key, value in arrays.items() if key != '__layers__'}
+
+    # Offsets are relative to the data section, which starts on an aligned boundary
+    table, offset = {}, 0
+    for key, value in numeric.items():
+        table[key] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset = _aligned(offset + value.nbytes)
+    header = json.dumps({'meta': meta, 'layers': layers, 'arrays': table}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    # Write next to the target and rename so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for key, value in numeric.items():
+                f.seek(data_start + table[key]['offset'])
+                f.write(value.tobytes())
+            f.truncate(data_start + offset)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_artifact(path, verify=True):
+    """Memory-map an artifact read-only, checking its content hash unless verify is False."""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a predictor artifact")
+    (header_length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+    data_start = _aligned(header_start + header_length)
+
+    meta = header['meta']
+    if meta.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format {meta.get('format')!r} in {path}")
+
+    # Arrays are read-only views onto the shared mapping, not copies
+    arrays = {'__layers__': np.array(header['layers'])}
+    for key, entry in header['arrays'].items():
+        arrays[key] = np.ndarray(entry['shape'], dtype=np.dtype(entry['dtype']), buffer=buffer,
+                                 offset=data_start + entry['offset'])
+    if verify and content_hash(arrays, meta) != meta['content_hash']:
+        raise ValueError(f"Content hash mismatch in {path}")
+    return ModelArtifact(NumpyModel.from_arrays(arrays), meta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the versioned predictor artifact")
+    parser.add_argument('--model', default='models/multilabel_classification_model.npz')
+    parser.add_argument('--scaler', default='models/scaler.pkl')
+    parser.add_argument('--output', default='models/predictor_model.bin')
+    args = parser.parse_args(argv)
+
+    artifact = build_artifact(args.model, args.scaler, args.output)
+    print(f"Wrote {args.output} (version {artifact.version}, {len(artifact.model.layers)} layers, "
+          f"{artifact.n_inputs} inputs, {artifact.meta['n_outputs']} outputs)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
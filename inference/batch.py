@@ -0,0 +1,141 @@
+"""Vectorized scoring of many predictor rows at once."""
+import csv
+import io
+
+import numpy as np
+
+from inference.features import conditions, feature_names, model_matrix, output_labels, validate_row
+from inference.metrics import forward_batch_rows, stage_seconds
+
+# Rows per scaler.transform / model.predict call
+BATCH_CHUNK_SIZE = 1024
+
+# Upper bound on rows accepted in a single request
+MAX_BATCH_ROWS = 100_000
+
+
+def halve_highest(probabilities):
+    """Halve the highest probability of every row, as generate_predictions does.
+
+    Returns (halved, highest_index, original_highest_value).
+    """
+    halved = np.array(probabilities, dtype=float, ndmin=2)
+    rows = np.arange(len(halved))
+    highest_index = halved.argmax(axis=1)
+    original = halved[rows, highest_index].copy()
+    halved[rows, highest_index] = original / 2
+    return halved, highest_index, original
+
+
+def input_order(model, scaler=None):
+    """The model's input columns: the artifact's feature order, or the columns
+    the scaler was fitted on for models that do not have it folded in."""
+    order = getattr(model, 'feature_order', None)
+    if order is None and scaler is not None:
+        order = [str(c) for c in getattr(scaler, 'feature_names_in_', [])]
+    if not order:
+        raise ValueError("The model does not name its input columns")
+    return order
+
+
+def score_matrix(model, features, scaler=None, chunk_size=BATCH_CHUNK_SIZE):
+    """Score form rows (n, len(feature_names)), one forward pass per chunk.
+
+    Rows are assembled into the model's input order first. scaler is only
+    needed for models that do not have it folded in.
+    """
+    with stage_seconds.time(stage='feature_assembly'):
+        features = model_matrix(features, input_order(model, scaler))
+    outputs = []
+    for start in range(0, len(features), chunk_size):
+        chunk = features[start:start + chunk_size]
+        if scaler is not None:
+            with stage_seconds.time(stage='scaler_transform'):
+                chunk = scaler.transform(chunk)
+        with stage_seconds.time(stage='model_forward'):
+            outputs.append(np.asarray(model.predict(chunk, batch_size=len(chunk), verbose=0)))
+        forward_batch_rows.observe(len(chunk))
+    if not outputs:
+        return np.empty((0, len(conditions)))
+    return np.vstack(outputs)
+
+
+def _csv_number(text):
+    """A CSV cell as the number it spells, or unchanged (and then rejected by
+    validate_row) if it is not one."""
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except (TypeError, ValueError):
+            pass
+    return text
+
+
+def parse_rows(req):
+    """Read rows from a Flask request carrying JSON or CSV."""
+    if req.mimetype == 'text/csv' or 'file' in req.files:
+        raw = req.files['file'].read() if 'file' in req.files else req.get_data()
+        reader = csv.DictReader(io.StringIO(raw.decode('utf-8-sig')))
+        missing = [name for name in feature_names if name not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+        return [{name: _csv_number(value) for name, value in row.items()} for row in reader]
+
+    payload = req.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('rows')
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of rows or an object with a 'rows' array")
+    return payload
+
+
+def score_rows(rows, model, scaler=None, chunk_size=BATCH_CHUNK_SIZE, cache=None):
+    """Validate and score rows, returning one result dict per input row.
+
+    With a PredictionCache only rows not seen before are sent to the model.
+    """
+    results = [None] * len(rows)
+    valid_index = []
+    valid_features = []
+    # Assembling the model inputs is timed once, in score_matrix
+    with stage_seconds.time(stage='validation'):
+        for i, row in enumerate(rows):
+            features, error = validate_row(row)
+            if error:
+                results[i] = {'row': i, 'error': error}
+            else:
+                valid_index.append(i)
+                valid_features.append(features)
+
+    if valid_features:
+        if cache is not None:
+            probabilities = cache.predict_many(
+                getattr(model, 'version', None), valid_features,
+                lambda features: score_matrix(model, features, scaler, chunk_size))
+        else:
+            probabilities = score_matrix(model, valid_features, scaler, chunk_size)
+        with stage_seconds.time(stage='postprocess'):
+            halved, highest_index, original = halve_highest(probabilities)
+            for j, i in enumerate(valid_index):
+                results[i] = {
+                    'row': i,
+                    'predictions': halved[j].tolist(),
+                    'original_highest_value': float(original[j]),
+                    'highest_condition_index': int(highest_index[j]),
+                }
+    return results
+
+
+def results_to_csv(results):
+    """Flatten scored results into CSV text, one line per input row."""
+    width = max((len(r['predictions']) for r in results if 'predictions' in r), default=len(conditions))
+    labels = output_labels(width)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['row'] + labels + ['error'])
+    for r in results:
+        if 'predictions' in r:
+            writer.writerow([r['row']] + r['predictions'] + [''])
+        else:
+            writer.writerow([r['row']] + [''] * width + [r['error']])
+    return out.getvalue()
@@ -0,0 +1,89 @@
+"""Bounded LRU/TTL cache of model outputs keyed on the exact feature vector."""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """Maps (model version, feature tuple) to the model's output row.
+
+    Entries expire after ttl seconds and the least recently used entry is
+    evicted once maxsize is reached.
+    """
+
+    def __init__(self, maxsize=10_000, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(version, features):
+        return (version, tuple(int(v) for v in features))
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        value = np.array(value, copy=True)
+        value.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict_many(self, version, rows, predict_fn):
+        """Return outputs for every row, calling predict_fn once for the misses."""
+        keys = [self.key(version, row) for row in rows]
+        outputs = [self.get(key) for key in keys]
+
+        # Score each distinct missing vector once, even if repeated in the batch
+        missing = {}
+        for i, output in enumerate(outputs):
+            if output is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            scored = np.asarray(predict_fn(np.array([key[1] for key in missing], dtype=float)))
+            for row_output, (key, indices) in zip(scored, missing.items()):
+                self.put(key, row_output)
+                for i in indices:
+                    outputs[i] = row_output
+        return np.vstack(outputs) if outputs else np.empty((0, 0))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_s': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
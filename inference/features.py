@@ -0,0 +1,278 @@
+"""Feature schema shared by the predictor page and the scoring endpoints."""
+import numpy as np
+
+conditions = ["Autism/ASD", "Learning Disability", "ADD/ADHD", "Depression", 
+             "Anxiety", "Behavior Problems", "Speech Disorder", "Asthma"]
+
+# Option definitions for each dropdown
+options = {
+    'general_health': [
+        {'label': 'Excellent', 'value': 1},
+        {'label': 'Very Good', 'value': 2},
+        {'label': 'Good', 'value': 3},
+        {'label': 'Fair', 'value': 4},
+        {'label': 'Poor', 'value': 5}
+    ],
+    'mental_health': [
+        {'label': 'Excellent', 'value': 1},
+        {'label': 'Very Good', 'value': 2},
+        {'label': 'Good', 'value': 3},
+        {'label': 'Fair', 'value': 4},
+        {'label': 'Poor', 'value': 5}
+    ],
+    'physical_health': [
+        {'label': 'Excellent', 'value': 1},
+        {'label': 'Very Good', 'value': 2},
+        {'label': 'Good', 'value': 3},
+        {'label': 'Fair', 'value': 4},
+        {'label': 'Poor', 'value': 5}
+    ],
+    'education': [
+        {'label': '8th grade or less', 'value': 1},
+        {'label': '9th-12th grade, No diploma', 'value': 2},
+        {'label': 'High School Graduate or GED', 'value': 3},
+        {'label': 'Vocational/trade/business school', 'value': 4},
+        {'label': 'Some College Credit, No Degree', 'value': 5},
+        {'label': 'Associate Degree', 'value': 6},
+        {'label': "Bachelor's Degree", 'value': 7},
+        {'label': "Master's Degree", 'value': 8},
+        {'label': 'Doctorate or Professional Degree', 'value': 9}
+    ],
+    'financial_hardship': [
+        {'label': 'Never', 'value': 1},
+        {'label': 'Rarely', 'value': 2},
+        {'label': 'Somewhat often', 'value': 3},
+        {'label': 'Very often', 'value': 4}
+    ],
+    'food_situation': [
+        {'label': 'Always afford good nutritious meals', 'value': 1},
+        {'label': 'Always afford enough but not always nutritious', 'value': 2},
+        {'label': 'Sometimes could not afford enough', 'value': 3},
+        {'label': 'Often could not afford enough', 'value': 4}
+    ],
+    'yes_no': [
+        {'label': 'Yes', 'value': 1},
+        {'label': 'No', 'value': 2}
+    ],
+    'neighborhood_safety': [
+        {'label': 'Definitely agree', 'value': 1},
+        {'label': 'Somewhat agree', 'value': 2},
+        {'label': 'Somewhat disagree', 'value': 3},
+        {'label': 'Definitely disagree', 'value': 4}
+    ],
+    'family_meal': [
+        {'label': '0 days', 'value': 1},
+        {'label': '1-3 days', 'value': 2},
+        {'label': '4-6 days', 'value': 3},
+        {'label': 'Every day', 'value': 4}
+    ],
+    'child_care_difficulty': [
+        {'label': 'Never', 'value': 1},
+        {'label': 'Rarely', 'value': 2},
+        {'label': 'Sometimes', 'value': 3},
+        {'label': 'Usually', 'value': 4},
+        {'label': 'Always', 'value': 5}
+    ],
+    'family_talk': [
+        {'label': 'All of the time', 'value': 1},
+        {'label': 'Most of the time', 'value': 2},
+        {'label': 'Some of the time', 'value': 3},
+        {'label': 'None of the time', 'value': 4}
+    ],
+    'weight_concern': [
+        {'label': 'Yes, too high', 'value': 1},
+        {'label': 'Yes, too low', 'value': 2},
+        {'label': 'Not concerned', 'value': 3}
+    ],
+    'screen_time': [
+        {'label': 'Less than 1 hour', 'value': 1},
+        {'label': '1 hour', 'value': 2},
+        {'label': '2 hours', 'value': 3},
+        {'label': '3 hours', 'value': 4},
+        {'label': '4 or more hours', 'value': 5}
+    ],
+    'family_structure': [
+        {'label': 'Two biological/adoptive parents, married', 'value': 1},
+        {'label': 'Two biological/adoptive parents, not married', 'value': 2},
+        {'label': 'Two parents (at least one not bio/adoptive), married', 'value': 3},
+        {'label': 'Two parents (at least one not bio/adoptive), not married', 'value': 4},
+        {'label': 'Single mother', 'value': 5},
+        {'label': 'Single father', 'value': 6},
+        {'label': 'Grandparent household', 'value': 7},
+        {'label': 'Other relation', 'value': 8}
+    ],
+    'age': [{'label': str(i), 'value': i} for i in range(1, 18)],
+    'race': [
+        {'label': 'White alone', 'value': 1},
+        {'label': 'Black or African American alone', 'value': 2},
+        {'label': 'American Indian or Alaska Native alone', 'value': 3},
+        {'label': 'Asian alone', 'value': 4},
+        {'label': 'Native Hawaiian and Other Pacific Islander alone', 'value': 5},
+        {'label': 'Two or More Races', 'value': 7}
+    ],
+    'birth_order': [
+        {'label': 'Only child', 'value': 1},
+        {'label': 'Oldest child', 'value': 2},
+        {'label': 'Second oldest child', 'value': 3},
+        {'label': 'Third oldest child', 'value': 4},
+        {'label': 'Fourth or greater oldest child', 'value': 5}
+    ],
+    'gender': [
+        {'label': 'Male', 'value': 1},
+        {'label': 'Female', 'value': 2}
+    ],
+    'homeless': [
+        {'label': 'Yes', 'value': 1},
+        {'label': 'No', 'value': 2},
+        {'label': "Don't Know", 'value': 3}
+    ]
+}
+
+# Model inputs in the order generate_predictions assembles them, mapped to the
+# options list that defines their valid codes
+feature_options = {
+    'age': 'age',
+    'gender': 'gender',
+    'race': 'race',
+    'general_health': 'general_health',
+    'birth_order': 'birth_order',
+    'born_usa': 'yes_no',
+    'family_structure': 'family_structure',
+    'financial_hardship': 'financial_hardship',
+    'food_situation': 'food_situation',
+    'family_meal': 'family_meal',
+    'child_care_difficulty': 'child_care_difficulty',
+    'family_talk': 'family_talk',
+    'neighborhood_safety': 'neighborhood_safety',
+    'rec_center': 'yes_no',
+    'library': 'yes_no',
+    'screen_time': 'screen_time',
+    'cigarettes': 'yes_no',
+    'vape': 'yes_no',
+    'breathing_difficulty': 'yes_no',
+    'stomach_problems': 'yes_no',
+    'headaches': 'yes_no',
+    'concussion': 'yes_no',
+    'overweight': 'yes_no',
+    'weight_concern': 'weight_concern',
+    'heart_condition': 'yes_no',
+    'diabetes': 'yes_no',
+    'parent_education': 'education',
+    'parent_mental_health': 'mental_health',
+    'parent_physical_health': 'physical_health',
+    'homeless': 'homeless',
+    'racial_unfair': 'yes_no',
+    'witness_violence': 'yes_no',
+    'victim_violence': 'yes_no',
+}
+
+feature_names = list(feature_options)
+
+# Survey year of the NSCH data the model was trained on; its BIRTH_YR input is
+# derived from the child's age
+SURVEY_YEAR = 2022
+
+# Model inputs (the NSCH variables the scaler was fitted on) and how each is
+# read from a form row: the form feature holding its code, or a function of
+# the row's columns for inputs the form does not ask about. Gender is asked
+# but not a model input.
+model_inputs = {
+    'A1_GRADE': 'parent_education',
+    'A1_MENTHEALTH': 'parent_mental_health',
+    'A1_PHYSHEALTH': 'parent_physical_health',
+    'ACE1': 'financial_hardship',
+    'ACE10': 'racial_unfair',
+    'ACE6': 'witness_violence',
+    'ACE7': 'victim_violence',
+    'AGEPOS4': 'birth_order',
+    'BIRTH_YR': lambda row: SURVEY_YEAR - row['age'],
+    'BORNUSA': 'born_usa',
+    'BREATHING': 'breathing_difficulty',
+    'CONCUSSION': 'concussion',
+    'EVERHOMELESS': 'homeless',
+    'FAMILY_R': 'family_structure',
+    'FOODSIT': 'food_situation',
+    # First-generation household when the child was born abroad, otherwise
+    # the most common answer (third generation or higher)
+    'HOUSE_GEN': lambda row: np.where(row['born_usa'] == 2, 1, 3),
+    'K10Q13': 'rec_center',
+    'K10Q14': 'library',
+    'K10Q40_R': 'neighborhood_safety',
+    'K2Q01': 'general_health',
+    'K8Q11': 'family_meal',
+    'K8Q31': 'child_care_difficulty',
+    'K9Q40': 'cigarettes',
+    'OVERWEIGHT': 'overweight',
+    'SC_AGE_YEARS': 'age',
+    'SC_RACE_R': 'race',
+    'SCREENTIME': 'screen_time',
+    'STOMACH': 'stomach_problems',
+    'TALKABOUT': 'family_talk',
+    'VAPE': 'vape',
+    'WGTCONC': 'weight_concern',
+    'DIABETES': 'diabetes',
+    # Not asked; "No", the answer for over 99% of surveyed children
+    'BLOOD': lambda row: 2,
+    'HEADACHE': 'headaches',
+    'HEART': 'heart_condition',
+}
+
+# Allowed codes per feature, used to validate externally supplied rows
+allowed_values = {
+    name: {opt['value'] for opt in options[key]}
+    for name, key in feature_options.items()
+}
+
+
+def validate_row(row):
+    """Validate one row (dict keyed by feature name, or a list in feature order).
+
+    Returns (features, error) where exactly one of the two is None.
+    """
+    if isinstance(row, dict):
+        missing = [name for name in feature_names if name not in row]
+        if missing:
+            return None, f"missing features: {', '.join(missing)}"
+        values = [row[name] for name in feature_names]
+    elif isinstance(row, (list, tuple)):
+        if len(row) != len(feature_names):
+            return None, f"expected {len(feature_names)} values, got {len(row)}"
+        values = list(row)
+    else:
+        return None, "row must be an object or an array"
+
+    features = []
+    for name, value in zip(feature_names, values):
+        # Codes are numbers; booleans and strings (even numeric ones) are not
+        code = None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                code = int(value)
+            except (OverflowError, ValueError):
+                pass
+        if code is None or (isinstance(value, float) and not value.is_integer()):
+            return None, f"{name}: {value!r} is not an integer code"
+        if code not in allowed_values[name]:
+            return None, f"{name}: {code} is not one of {sorted(allowed_values[name])}"
+        features.append(code)
+    return features, None
+
+
+def model_matrix(features, order):
+    """Model input rows, with columns in order, from form rows (lists of codes
+    in feature_names order)."""
+    features = np.asarray(features, dtype=float).reshape(-1, len(feature_names))
+    row = {name: features[:, j] for j, name in enumerate(feature_names)}
+    columns = []
+    for column in order:
+        source = model_inputs.get(column)
+        if source is None:
+            raise ValueError(f"No form feature provides the model input {column!r}")
+        value = row[source] if isinstance(source, str) else source(row)
+        columns.append(np.broadcast_to(np.asarray(value, dtype=float), (len(features),)))
+    return np.column_stack(columns) if columns else np.empty((len(features), 0))
+
+
+def output_labels(n_outputs):
+    """Condition names for the first model outputs, generic names for any extra ones."""
+    return [conditions[i] if i < len(conditions) else f"output_{i}" for i in range(n_outputs)]
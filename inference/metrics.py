@@ -0,0 +1,151 @@
+"""Minimal Prometheus-style counters and histograms for the prediction path."""
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond forward passes to slow requests
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+def _format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help, self.type = name, help, 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.type = name, help, 'histogram'
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series['counts']):
+                    out.append((f"{self.name}_bucket", key + (('le', repr(bound)),), count))
+                out.append((f"{self.name}_bucket", key + (('le', '+Inf'),), series['count']))
+                out.append((f"{self.name}_sum", key, series['sum']))
+                out.append((f"{self.name}_count", key, series['count']))
+        return out
+
+
+class Collected:
+    """A metric whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name, help, type, collect):
+        self.name, self.help, self.type = name, help, type
+        self.collect = collect
+
+    def samples(self):
+        values = self.collect()
+        if isinstance(values, dict):
+            return [(self.name, tuple(sorted(labels)), value) for labels, value in values.items()]
+        return [(self.name, (), values)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, buckets))
+
+    def collected(self, name, help, collect, type='gauge'):
+        """Register a gauge/counter read from collect(), which returns a number
+        or a dict mapping label tuples (e.g. (('stage', 'x'),)) to numbers."""
+        with self._lock:
+            self._metrics[name] = Collected(name, help, type, collect)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Error collecting metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+# Shared by everything that scores rows
+stage_seconds = metrics.histogram(
+    'predictor_stage_seconds',
+    "Time spent in each stage of the prediction path")
+request_seconds = metrics.histogram(
+    'predictor_request_seconds',
+    "End-to-end latency of predictor callback and batch endpoint requests")
+forward_batch_rows = metrics.histogram(
+    'predictor_forward_batch_rows',
+    "Rows per model forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+model_load_failures = metrics.counter(
+    'predictor_model_load_failures_total',
+    "Model artifact loads that failed")
+prediction_errors = metrics.counter(
+    'predictor_prediction_errors_total',
+    "Predictions that raised instead of returning outputs")
+not_ready_responses = metrics.counter(
+    'predictor_not_ready_total',
+    "Requests answered with a warming-up/failed state instead of a prediction")
@@ -0,0 +1,113 @@
+"""Coalesce concurrent single-row predictions into batched forward passes."""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collect pending rows for up to max_wait_ms (or max_batch_size rows),
+    score them with one predict_fn call and hand each caller its own row.
+
+    predict_fn takes an (n, n_features) array and returns an (n, n_outputs) array.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0, window=1000):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._batch_sizes = deque(maxlen=window)
+        self._queue_ms = deque(maxlen=window)
+        self._latency_ms = deque(maxlen=window)
+        self._completed_at = deque(maxlen=window)
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def predict(self, features, timeout=None):
+        """Score one feature row, blocking until its batch has run."""
+        future = Future()
+        self._queue.put((np.asarray(features, dtype=float), time.perf_counter(), future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                outputs = np.asarray(self.predict_fn(np.stack([row for row, _, _ in batch])))
+                error = None
+            except Exception as e:
+                outputs, error = None, e
+            finished = time.perf_counter()
+
+            for i, (_, enqueued, future) in enumerate(batch):
+                if error is None:
+                    future.set_result(outputs[i])
+                else:
+                    future.set_exception(error)
+
+            with self._lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._errors += 0 if error is None else len(batch)
+                self._batch_sizes.append(len(batch))
+                for _, enqueued, _ in batch:
+                    self._queue_ms.append((started - enqueued) * 1000)
+                    self._latency_ms.append((finished - enqueued) * 1000)
+                    self._completed_at.append(finished)
+
+    def stats(self):
+        """Latency, batch size and throughput figures for tuning the batching window."""
+        with self._lock:
+            latency = np.array(self._latency_ms)
+            queue_ms = np.array(self._queue_ms)
+            completed = list(self._completed_at)
+            stats = {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'requests': self._requests,
+                'batches': self._batches,
+                'errors': self._errors,
+                'pending': self._queue.qsize(),
+                'mean_batch_size': float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+                'uptime_s': time.perf_counter() - self._started_at,
+            }
+
+        for name, values in (('latency_ms', latency), ('queue_wait_ms', queue_ms)):
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                stats[name] = {'mean': float(values.mean()), 'p50': float(p50),
+                               'p95': float(p95), 'p99': float(p99), 'max': float(values.max())}
+            else:
+                stats[name] = None
+
+        # Throughput over the recent window of completed requests
+        if len(completed) > 1 and completed[-1] > completed[0]:
+            stats['throughput_rps'] = (len(completed) - 1) / (completed[-1] - completed[0])
+        else:
+            stats['throughput_rps'] = 0.0
+        return stats
@@ -0,0 +1,209 @@
+"""Pure NumPy forward pass for the predictor's dense multilabel network.
+
+The Keras .h5 file is only read with h5py, so neither loading nor scoring
+imports TensorFlow. Export the weights once with
+
+    python -m inference.numpy_model models/multilabel_classification_model.h5 \
+        models/multilabel_classification_model.npz --verify
+"""
+import argparse
+import json
+import sys
+
+import h5py
+import numpy as np
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'softmax': _softmax,
+}
+
+# Layers that are the identity at inference time
+PASSTHROUGH_LAYERS = {'InputLayer', 'Dropout', 'GaussianNoise', 'GaussianDropout'}
+
+
+def _layer_weights(group, layer_name):
+    """Map short weight names (kernel, bias, ...) to arrays for one layer.
+
+    Keras 3 names weights 'dense/kernel', Keras 2 'dense/kernel:0'.
+    """
+    layer_group = group[layer_name]
+    names = [n.decode() if isinstance(n, bytes) else n for n in layer_group.attrs.get('weight_names', [])]
+    return {name.split('/')[-1].split(':')[0]: np.asarray(layer_group[name], dtype=np.float32) for name in names}
+
+
+def extract_layers(h5_path):
+    """Pull layer types, activations and weights out of a Keras .h5 model."""
+    with h5py.File(h5_path, 'r') as f:
+        config = json.loads(f.attrs['model_config'])
+        weights = f['model_weights'] if 'model_weights' in f else f
+
+        layers = []
+        for layer in config['config']['layers']:
+            kind, cfg = layer['class_name'], layer['config']
+            if kind in PASSTHROUGH_LAYERS:
+                continue
+            params = _layer_weights(weights, cfg['name'])
+            if kind == 'Dense':
+                activation = cfg.get('activation', 'linear')
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation {activation!r} in layer {cfg['name']}")
+                units = cfg['units']
+                layers.append({
+                    'type': 'dense',
+                    'activation': activation,
+                    'kernel': params['kernel'],
+                    'bias': params.get('bias', np.zeros(units, dtype=np.float32)),
+                })
+            elif kind == 'BatchNormalization':
+                variance = params['moving_variance']
+                layers.append({
+                    'type': 'batch_norm',
+                    'epsilon': cfg.get('epsilon', 1e-3),
+                    'gamma': params.get('gamma', np.ones_like(variance)),
+                    'beta': params.get('beta', np.zeros_like(variance)),
+                    'moving_mean': params['moving_mean'],
+                    'moving_variance': variance,
+                })
+            elif kind == 'Activation':
+                if cfg['activation'] not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation {cfg['activation']!r} in layer {cfg['name']}")
+                layers.append({'type': 'activation', 'activation': cfg['activation']})
+            else:
+                raise ValueError(f"Unsupported layer type {kind} ({cfg['name']})")
+    return layers
+
+
+class NumpyModel:
+    """Inference-only replacement for the Keras model, with the same predict()."""
+
+    def __init__(self, layers):
+        self.layers = layers
+        self._steps = [self._compile(layer) for layer in layers]
+
+    @staticmethod
+    def _compile(layer):
+        if layer['type'] == 'dense':
+            kernel, bias = layer['kernel'], layer['bias']
+            activation = ACTIVATIONS[layer['activation']]
+            return lambda x: activation(x @ kernel + bias)
+        if layer['type'] == 'batch_norm':
+            scale = layer['gamma'] / np.sqrt(layer['moving_variance'] + np.float32(layer['epsilon']))
+            shift = layer['beta'] - layer['moving_mean'] * scale
+            return lambda x: x * scale + shift
+        if layer['type'] == 'activation':
+            return ACTIVATIONS[layer['activation']]
+        raise ValueError(f"Unsupported layer type {layer['type']}")
+
+    @property
+    def n_inputs(self):
+        return next(l['kernel'].shape[0] for l in self.layers if l['type'] == 'dense')
+
+    @property
+    def n_outputs(self):
+        return next(l['kernel'].shape[1] for l in reversed(self.layers) if l['type'] == 'dense')
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """Score an (n, n_inputs) array; batch_size/verbose mirror Keras and are ignored."""
+        x = np.asarray(x, dtype=np.float32)
+        for step in self._steps:
+            x = step(x)
+        return x
+
+    @classmethod
+    def from_h5(cls, h5_path):
+        return cls(extract_layers(h5_path))
+
+    def to_arrays(self):
+        """Flatten the layers into named arrays plus a JSON layer spec."""
+        arrays, spec = {}, []
+        for i, layer in enumerate(self.layers):
+            entry = {}
+            for key, value in layer.items():
+                if isinstance(value, np.ndarray):
+                    arrays[f"{i}/{key}"] = value
+                else:
+                    entry[key] = value
+            spec.append(entry)
+        arrays['__layers__'] = np.array(json.dumps(spec))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        spec = json.loads(str(arrays['__layers__']))
+        layers = []
+        for i, entry in enumerate(spec):
+            layer = dict(entry)
+            prefix = f"{i}/"
+            for key in arrays:
+                if key.startswith(prefix):
+                    layer[key[len(prefix):]] = np.asarray(arrays[key])
+            layers.append(layer)
+        return cls(layers)
+
+    def save(self, path):
+        """Write the layers to an .npz: one array per parameter plus a JSON layer spec."""
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls.from_arrays({key: npz[key] for key in npz.files})
+
+
+def load_model(path):
+    """Load a NumpyModel from an exported .npz or directly from a Keras .h5."""
+    if str(path).endswith('.h5'):
+        return NumpyModel.from_h5(path)
+    return NumpyModel.load(path)
+
+
+def verify_against_keras(h5_path, model, n_rows=1000, seed=0):
+    """Return the max absolute difference between Keras and NumPy outputs."""
+    import tensorflow as tf  # only needed for verification
+
+    keras_model = tf.keras.models.load_model(h5_path)
+    rng = np.random.default_rng(seed)
+    x = rng.normal(scale=2.0, size=(n_rows, model.n_inputs)).astype(np.float32)
+    expected = keras_model.predict(x, batch_size=n_rows, verbose=0)
+    return float(np.abs(expected - model.predict(x)).max())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a Keras .h5 model for NumPy inference")
+    parser.add_argument('h5_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--verify', action='store_true',
+                        help="compare outputs against Keras on random inputs (requires TensorFlow)")
+    parser.add_argument('--atol', type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    model = NumpyModel.from_h5(args.h5_path)
+    model.save(args.output_path)
+    print(f"Exported {len(model.layers)} layers ({model.n_inputs} inputs, "
+          f"{model.n_outputs} outputs) to {args.output_path}")
+
+    if args.verify:
+        diff = verify_against_keras(args.h5_path, load_model(args.output_path))
+        print(f"Max absolute difference vs Keras: {diff:.2e}")
+        if diff > args.atol:
+            print(f"Outputs differ by more than {args.atol}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
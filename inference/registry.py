@@ -0,0 +1,127 @@
+"""Lazily loaded predictor model with background warm-up and readiness state."""
+import threading
+import time
+
+import numpy as np
+
+from inference.artifact import load_artifact
+from inference.metrics import metrics, model_load_failures
+
+# Compiled model artifact (scaler folded into the weights), built with
+# `python -m inference.artifact`
+MODEL_PATH = "models/predictor_model.bin"
+
+COLD = "Not loaded"
+LOADING = "Loading model..."
+WARMING = "Warming up..."
+READY = "Ready"
+FAILED = "Failed"
+
+# A failed load is retried on the next use after this delay, doubling with
+# every consecutive failure up to RETRY_MAX_SECONDS
+RETRY_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+
+
+class ModelNotReady(Exception):
+    """Raised when the model is requested before it has finished warming up."""
+
+    def __init__(self, status, error=None):
+        self.status = status
+        self.error = error
+        super().__init__(f"{status}: {error}" if error else status)
+
+
+class ModelRegistry:
+    """Loads a model on first use or in a background thread, then runs a dummy
+    batch through it so the first real request does not pay one-off costs.
+    A failed load is retried, with backoff, when the model is next asked for.
+    """
+
+    def __init__(self, loader, warmup_batch_size=64):
+        self.loader = loader
+        self.warmup_batch_size = warmup_batch_size
+        self.status = COLD
+        self.error = None
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    @property
+    def is_ready(self):
+        return self.status == READY
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            self.status = LOADING
+            model = self.loader()
+            self.status = WARMING
+            model.predict(np.zeros((self.warmup_batch_size, model.n_inputs)))
+            self._model = model
+            self.load_seconds = time.perf_counter() - started
+            self.error = None
+            self._failures = 0
+            self.status = READY
+            print(f"Model {getattr(model, 'version', '')} ready in {self.load_seconds:.2f}s")
+        except Exception as e:
+            self.error = str(e)
+            self._failures += 1
+            delay = min(RETRY_SECONDS * 2 ** (self._failures - 1), RETRY_MAX_SECONDS)
+            self._retry_at = time.monotonic() + delay
+            self.status = FAILED
+            model_load_failures.inc()
+            print(f"Error loading model (retrying after {delay}s): {e}")
+        finally:
+            self._done.set()
+
+    def warm_up(self, background=True):
+        """Start loading unless a load is already running or finished; a
+        failed load is started again once its retry delay has passed."""
+        with self._lock:
+            retry = self.status == FAILED and time.monotonic() >= self._retry_at
+            if self._thread is None or retry:
+                if retry:
+                    # Waiters from here on wait for the new attempt
+                    self._done = threading.Event()
+                    self.status = LOADING
+                self._thread = threading.Thread(target=self._load, name="model-warm-up", daemon=True)
+                self._thread.start()
+            done = self._done
+        if not background:
+            done.wait()
+
+    def get(self, timeout=0):
+        """Return the model, waiting up to timeout seconds for it to become ready.
+
+        Triggers a background load on first use and raises ModelNotReady while
+        the model is still loading or if loading failed.
+        """
+        self.warm_up()
+        if timeout:
+            self._done.wait(timeout)
+        if self.status != READY:
+            raise ModelNotReady(self.status, self.error)
+        return self._model
+
+    def state(self):
+        model = self._model
+        return {
+            'status': self.status,
+            'ready': self.status == READY,
+            'error': self.error,
+            'version': getattr(model, 'version', None),
+            'load_seconds': self.load_seconds,
+        }
+
+
+registry = ModelRegistry(lambda: load_artifact(MODEL_PATH))
+
+metrics.collected('predictor_model_ready', "1 once the predictor model has loaded and warmed up",
+                  lambda: int(registry.is_ready))
+metrics.collected('predictor_model_load_seconds', "Time taken to load and warm up the predictor model",
+                  lambda: registry.load_seconds or 0)
@@ -0,0 +1,56 @@
+"""What-if sweep: how each single input change moves every predicted probability."""
+import numpy as np
+
+from inference.batch import score_matrix
+from inference.features import allowed_values, feature_names, output_labels
+
+
+def one_feature_variants(features):
+    """The profile itself followed by every profile that differs in exactly one input.
+
+    Returns (rows, changes) where changes[i] is the (feature, value) set in rows[i + 1].
+    """
+    base = np.asarray(features, dtype=float)
+    rows, changes = [base], []
+    for j, name in enumerate(feature_names):
+        for value in sorted(allowed_values[name]):
+            if value != base[j]:
+                row = base.copy()
+                row[j] = value
+                rows.append(row)
+                changes.append((name, value))
+    return np.vstack(rows), changes
+
+
+def sensitivity_sweep(model, features):
+    """Score the profile and all its one-feature variants in a single forward pass."""
+    rows, changes = one_feature_variants(features)
+    outputs = score_matrix(model, rows, chunk_size=len(rows))
+    baseline, variants = outputs[0], outputs[1:]
+    deltas = variants - baseline
+    return {
+        'labels': output_labels(outputs.shape[1]),
+        'baseline': baseline.tolist(),
+        'variants': [
+            {'feature': name, 'value': int(value), 'predictions': variants[i].tolist(), 'delta': deltas[i].tolist()}
+            for i, (name, value) in enumerate(changes)
+        ],
+    }
+
+
+def strongest_effects(sweep):
+    """Per feature and output, the single value change that moves the output most.
+
+    Returns (features, delta matrix, value matrix) for plotting.
+    """
+    n_outputs = len(sweep['labels'])
+    delta = np.zeros((len(feature_names), n_outputs))
+    best_value = np.full((len(feature_names), n_outputs), None, dtype=object)
+    index = {name: i for i, name in enumerate(feature_names)}
+    for variant in sweep['variants']:
+        i = index[variant['feature']]
+        change = np.asarray(variant['delta'])
+        stronger = np.abs(change) > np.abs(delta[i])
+        delta[i, stronger] = change[stronger]
+        best_value[i, stronger] = variant['value']
+    return feature_names, delta, best_value
@@ -3,10 +3,7 @@ from dash import html, dcc, callback, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
 import pandas as pd
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain_core.prompts import ChatPromptTemplate
@@ -15,11 +12,13 @@ import base64
 from dash.exceptions import PreventUpdate
 import time
 
+from docchat.index import PDF_PATHS, open_retriever
+from docchat.streaming import poll_answer, start_answer
+
 # Register this page
 dash.register_page(__name__, path='/chat')
 
 # Define global variables for document processing
-vectorstore = None
 retriever = None
 llm = None
 is_initialized = False
@@ -28,56 +27,34 @@ initialization_error = None
 
 # Initialize the RAG model and load the documents
 def initialize_docChat():
-    global vectorstore, retriever, llm, is_initialized, initialization_status, initialization_error
+    global retriever, llm, is_initialized, initialization_status, initialization_error
     
     if is_initialized:
         return True
     
+    def set_status(text):
+        global initialization_status
+        initialization_status = text
+
     try:
-        initialization_status = "Loading documents..."
-        
-        # PDF paths in the assets directory - using relative paths
-        pdf_paths = [ 
-            "assets/book2.pdf",
-        ]
-        
+        initialization_status = "Opening document index..."
         # Print current working directory for debugging
         print(f"Current working directory: {os.getcwd()}")
-        
-        data = []
-        for pdf_path in pdf_paths:
-            print(f"Checking for file: {pdf_path}")
-            if os.path.exists(pdf_path):
-                print(f"Loading file: {pdf_path}")
-                try:
-                    loader = PyPDFLoader(pdf_path)
-                    current_data = loader.load()
-                    data.extend(current_data)
-                    print(f"Successfully loaded {len(current_data)} pages from {pdf_path}")
-                except Exception as e:
-                    print(f"Error loading {pdf_path}: {str(e)}")
-            else:
-                print(f"File not found: {pdf_path}")
-        
-        if not data:
+
+        # Persisted under .cache/docchat and keyed by the PDFs (assets/book2.pdf)
+        # and the splitter / embedding settings; only the first start after a
+        # change parses and embeds them, in one process at a time.
+        # DOCCHAT_EMBEDDINGS=local embeds on the CPU, without network access.
+        # BM25 and vector results are fused; when the embedder is slow or
+        # down, queries are answered from BM25 alone
+        try:
+            retriever = open_retriever(PDF_PATHS, progress=set_status, k=5)
+        except FileNotFoundError as e:
             initialization_status = "Failed - No documents found"
-            initialization_error = "No PDF files could be loaded. Please check the file paths."
+            initialization_error = str(e)
             print("No data was loaded from any PDF files")
             return False
         
-        initialization_status = "Splitting documents..."
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000)
-        docs = text_splitter.split_documents(data)
-        
-        initialization_status = "Creating vector store..."
-        # Create vectorstore and retriever
-        vectorstore = Chroma.from_documents(
-            documents=docs, 
-            embedding=GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-        )
-        retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-        
         initialization_status = "Initializing language model..."
         # Initialize language model
         llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.2)
@@ -104,15 +81,17 @@ initialization_thread = threading.Thread(target=background_initialization)
 initialization_thread.daemon = True
 initialization_thread.start()
 
-# Function to process query and get response
-def process_query(query):
+# Function to process query and stream the response, piece by piece
+def stream_query(query):
     global retriever, llm, initialization_status
     
-    if not is_initialized:
-        return f"I'm still initializing. Current status: {initialization_status}. Please try again in a moment."
-    
+    # Raised rather than yielded, so the answer job records them as errors
     if initialization_error:
-        return f"Initialization failed: {initialization_error}"
+        raise RuntimeError(f"Initialization failed: {initialization_error}")
+    
+    if not is_initialized:
+        raise RuntimeError(f"I'm still initializing. Current status: {initialization_status}. "
+                           "Please try again in a moment.")
     
     # Define the system prompt
     system_prompt = (
@@ -135,12 +114,11 @@ def process_query(query):
     question_answer_chain = create_stuff_documents_chain(llm, prompt)
     rag_chain = create_retrieval_chain(retriever, question_answer_chain)
     
-    # Process the query
-    try:
-        response = rag_chain.invoke({"input": query})
-        return response["answer"]
-    except Exception as e:
-        return f"Error processing your query: {str(e)}"
+    # Process the query; the chain streams the retrieved context first, then
+    # the answer as the model generates it
+    for chunk in rag_chain.stream({"input": query}):
+        if "answer" in chunk:
+            yield chunk["answer"]
 
 # Custom CSS for chat messages
 chat_styles = {
@@ -235,6 +213,10 @@ layout = dbc.Container([
             # Store component for chat history
             dcc.Store(id="chat-history-store"),
             
+            # Answer being streamed, and the interval polling it
+            dcc.Store(id="answer-job"),
+            dcc.Interval(id="answer-interval", interval=250, disabled=True),
+            
             # Loading indicator
             dbc.Spinner(html.Div(id="loading-output"), color="primary", type="grow", fullscreen=False),
             
@@ -276,24 +258,56 @@ def update_initialization_status(n):
         status_style["color"] = "white"
         return f"⏳ {initialization_status}", status_style
 
+# Create chat message components
+def render_chat(chat_history):
+    chat_components = []
+    for message in chat_history:
+        if message["role"] == "user":
+            chat_components.append(
+                html.Div(
+                    html.Div(message["content"], style=chat_styles["user_msg"]),
+                    style={"display": "flex", "justifyContent": "flex-end", "marginBottom": "10px"}
+                )
+            )
+        else:
+            content = message["content"]
+            if message.get("streaming"):
+                # Cursor while the answer is still being generated
+                content = content + " ▌" if content else "▌"
+            chat_components.append(
+                html.Div(
+                    html.Div(content, style=chat_styles["bot_msg"]),
+                    style={"display": "flex", "justifyContent": "flex-start", "marginBottom": "10px"}
+                )
+            )
+    return chat_components
+
 # Callback for sending messages
 @callback(
     [Output("chat-container", "children"),
      Output("chat-input", "value"),
      Output("chat-history-store", "data"),
      Output("loading-output", "children", allow_duplicate=True),
-     Output("scroll-bottom-trigger", "children")],
+     Output("scroll-bottom-trigger", "children"),
+     Output("answer-job", "data"),
+     Output("answer-interval", "disabled"),
+     Output("send-button", "disabled")],
     [Input("send-button", "n_clicks"),
      Input("chat-input", "n_submit")],
     [State("chat-input", "value"),
-     State("chat-history-store", "data")],
+     State("chat-history-store", "data"),
+     State("answer-interval", "disabled")],
     prevent_initial_call=True
 )
-def send_message(n_clicks, n_submit, input_value, chat_history):
+def send_message(n_clicks, n_submit, input_value, chat_history, idle):
     # If there was no click or input, don't update
     if (n_clicks is None and n_submit is None) or not input_value:
         raise PreventUpdate
     
+    # Enter still submits while an answer is streaming; wait for it to finish
+    if not idle:
+        raise PreventUpdate
+    
     # Initialize chat history if it doesn't exist
     if chat_history is None:
         chat_history = []
@@ -301,32 +315,51 @@ def send_message(n_clicks, n_submit, input_value, chat_history):
     # Add user message to chat history
     chat_history.append({"role": "user", "content": input_value})
     
-    # Process the query and get a response
-    response = process_query(input_value)
+    # Start generating the response in the background; stream_answer fills
+    # in the assistant message as it arrives
+    job_id = start_answer(lambda: stream_query(input_value))
+    chat_history.append({"role": "assistant", "content": "", "streaming": True})
     
-    # Add assistant response to chat history
-    chat_history.append({"role": "assistant", "content": response})
+    # Return updated chat, clear input, updated chat history, trigger scroll
+    # and start polling the answer (sending is disabled until it is done)
+    return render_chat(chat_history), "", chat_history, "", f"scroll-{len(chat_history)}", job_id, False, True
+
+# Callback appending the streamed answer to the last message
+@callback(
+    [Output("chat-container", "children", allow_duplicate=True),
+     Output("chat-history-store", "data", allow_duplicate=True),
+     Output("scroll-bottom-trigger", "children", allow_duplicate=True),
+     Output("answer-job", "data", allow_duplicate=True),
+     Output("answer-interval", "disabled", allow_duplicate=True),
+     Output("send-button", "disabled", allow_duplicate=True)],
+    Input("answer-interval", "n_intervals"),
+    [State("answer-job", "data"),
+     State("chat-history-store", "data")],
+    prevent_initial_call=True
+)
+def stream_answer(n, job_id, chat_history):
+    if not job_id or not chat_history or not chat_history[-1].get("streaming"):
+        raise PreventUpdate
     
-    # Create chat message components
-    chat_components = []
-    for message in chat_history:
-        if message["role"] == "user":
-            chat_components.append(
-                html.Div(
-                    html.Div(message["content"], style=chat_styles["user_msg"]),
-                    style={"display": "flex", "justifyContent": "flex-end", "marginBottom": "10px"}
-                )
-            )
-        else:
-            chat_components.append(
-                html.Div(
-                    html.Div(message["content"], style=chat_styles["bot_msg"]),
-                    style={"display": "flex", "justifyContent": "flex-start", "marginBottom": "10px"}
-                )
-            )
+    answer = poll_answer(job_id)
+    message = chat_history[-1]
+    if answer is None:
+        # Lost, e.g. the server restarted while generating
+        message["content"] = message["content"] or "The answer was interrupted. Please ask again."
+        done = True
+    else:
+        if answer["text"] == message["content"] and not answer["done"]:
+            raise PreventUpdate
+        message["content"] = answer["text"]
+        if answer["error"]:
+            error = f"Error processing your query: {answer['error']}"
+            message["content"] = f"{message['content']}\n\n{error}" if message["content"] else error
+        done = answer["done"]
     
-    # Return updated chat, clear input, updated chat history, and trigger scroll
-    return chat_components, "", chat_history, "", f"scroll-{len(chat_history)}"
+    if done:
+        message.pop("streaming")
+    scroll = f"scroll-{len(chat_history)}-{len(message['content'])}"
+    return render_chat(chat_history), chat_history, scroll, None if done else job_id, done, not done
 
 # Callback to clear chat history
 @callback(
@@ -334,7 +367,10 @@ def send_message(n_clicks, n_submit, input_value, chat_history):
      Output("chat-input", "value", allow_duplicate=True),
      Output("chat-history-store", "data", allow_duplicate=True),
      Output("loading-output", "children", allow_duplicate=True),
-     Output("scroll-bottom-trigger", "children", allow_duplicate=True)],
+     Output("scroll-bottom-trigger", "children", allow_duplicate=True),
+     Output("answer-job", "data", allow_duplicate=True),
+     Output("answer-interval", "disabled", allow_duplicate=True),
+     Output("send-button", "disabled", allow_duplicate=True)],
     Input("clear-chat", "n_clicks"),
     prevent_initial_call=True
 )
@@ -342,7 +378,8 @@ def clear_chat(n_clicks):
     if n_clicks is None:
         raise PreventUpdate
     
-    return [], "", [], "", ""
+    # An answer still streaming is dropped; its job finishes unread
+    return [], "", [], "", "", None, True, False
 
 # Add client-side JavaScript for auto-scrolling
 app = dash.get_app()
@@ -1,20 +1,62 @@
+import json
+import os
+
 import pandas as pd
 import numpy as np
 import dash
-from dash import dcc, html, dash_table
+from dash import dcc, html, dash_table, callback, clientside_callback
 from dash.dependencies import Input, Output
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from flask import request, jsonify, Response
+
+from inference.metrics import metrics
+from survey.bitmaps import FILTER_COLUMNS, open_bitmaps
+from survey.cube import condition_labels, health_condition_cols, open_cube
+from survey.figure_cache import FigureCache
+from survey.store import CurrentVersion, open_store
+from survey.table import SurveyTable
 
 dash.register_page(__name__, path='/explorer')
 
 
-# Load the data
-data = pd.read_csv('datajoined.csv')
+# Survey CSVs shown in the Explorer; list several (e.g. one per survey year)
+# to combine them
+SURVEY_FILES = ['datajoined.csv']
+
+# Bump when a figure's code changes, so cached figures are rebuilt
+FIGURES_VERSION = 2
+
+# Counted for the process rather than per FigureCache, which is replaced
+# with each dataset version
+figure_cache_lookups = metrics.counter('explorer_figure_cache_lookups_total',
+                                       "Explorer figure lookups by cache result")
+
+
+class ExplorerData:
+    """What the page serves from one version of the survey data."""
+
+    def __init__(self, store):
+        self.store = store
+        # Counts and sums per age / ACE / screen time / condition count;
+        # every chart and statistic below is a roll-up of it
+        self.cube = open_cube(store)
+        # Per-value bitmaps of the filter columns, for cross-filtering the charts
+        self.bitmaps = open_bitmaps(store)
+        # Rendered figures per (dataset version, chart, filters), kept with
+        # the dataset version on disk
+        self.figure_cache = FigureCache(os.path.join(store.directory, 'figures'), lookups=figure_cache_lookups)
+        # Paged, sorted and filtered on the server; only the visible page is sent
+        self.table = SurveyTable(store)
 
-# Basic data cleaning
-data.fillna(0, inplace=True)
+
+# Open the columnar cache of the CSVs (built on first use and whenever a
+# file changes; missing values are already filled with 0). Records appended
+# with `python -m survey.store datajoined.csv --append batch.csv` are picked
+# up within seconds, without a restart; every request below takes one
+# survey_data.get() so it works on a single version throughout.
+survey_data = CurrentVersion(open_store(SURVEY_FILES), ExplorerData)
 
 # Create the Dash app with custom styling
 
@@ -26,370 +68,590 @@ accent_color = '#4080bf'  # Blue accent
 grid_color = '#333333'  # Dark gray for grids
 plot_bg_color = 'rgba(80, 80, 80, 0.3)'  # Dark navy for card backgrounds
 
-# Create age groups for better visualization
-data['age_group'] = pd.cut(data['SC_AGE_YEARS'], bins=[0, 5, 10, 15, 20], 
-                          labels=['0-5', '6-10', '11-15', '16+'])
+TABLE_PAGE_SIZE = 10
+
+def error_bars(estimates, column):
+    """Plotly error bars spanning a column's confidence interval."""
+    return dict(type='data', array=(estimates[f'{column}_high'] - estimates[column]).values,
+                arrayminus=(estimates[column] - estimates[f'{column}_low']).values,
+                color=text_color_primary, thickness=1)
+
+
+def overview_stats(cube):
+    # Scores are survey-weighted means, with their 95% confidence interval
+    overall = cube.estimates().iloc[0]
+    ages = cube.observed('SC_AGE_YEARS')
+    if cube.total:
+        age_range = f"{ages.min()}-{ages.max()} years"
+        mental, physical = (
+            [f"{overall[f'{m}_mean']:.1f}",
+             html.Span(f" ± {(overall[f'{m}_mean_high'] - overall[f'{m}_mean_low']) / 2:.2f}",
+                       style={'fontSize': '16px', 'fontWeight': 'normal'})]
+            for m in ('A1_MENTHEALTH', 'A1_PHYSHEALTH'))
+    else:
+        age_range = mental = physical = "-"
+    return [
+        html.Div([
+            html.Div([
+                html.H3(f"Total Records", style={'color': text_color_primary, 'marginBottom': '5px'}),
+                html.P(f"{cube.total:,}", style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
+            ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                html.H3(f"Age Range", style={'color': text_color_primary, 'marginBottom': '5px'}),
+                html.P(age_range, 
+                    style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
+            ], style={'width': '50%', 'display': 'inline-block'}),
+        ]),
+        html.Div([
+            html.Div([
+                html.H3(f"Mental Health Score", style={'color': text_color_primary, 'marginBottom': '5px'}),
+                html.P(mental, 
+                    style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
+            ], style={'width': '50%', 'display': 'inline-block'}),
+            html.Div([
+                html.H3(f"Physical Health Score", style={'color': text_color_primary, 'marginBottom': '5px'}),
+                html.P(physical, 
+                    style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
+            ], style={'width': '50%', 'display': 'inline-block'}),
+        ]),
+    ]
+
+
+def filter_dropdown(bitmaps, column, label, width='32%'):
+    return html.Div([
+        html.Label(label, style={'color': text_color_primary, 'marginBottom': '5px'}),
+        dcc.Dropdown(
+            id=f'filter-{column}',
+            options=[{'label': str(value), 'value': value} for value in bitmaps.options(column)],
+            multi=True,
+            placeholder='All',
+            style={'color': '#000000'}
+        ),
+    ], style={'width': width, 'display': 'inline-block', 'marginRight': '1%', 'marginBottom': '10px',
+              'verticalAlign': 'top'})
+
+
+def age_distribution_figure(cube):
+    # Estimated number of children per year of age (sum of survey weights)
+    age_counts = cube.estimates(['SC_AGE_YEARS'])
+    age_counts = age_counts[(age_counts['SC_AGE_YEARS'] >= 0) & (age_counts['SC_AGE_YEARS'] < 20)]
+    return (
+        go.Figure()
+        .add_trace(go.Bar(
+            x=np.floor(age_counts['SC_AGE_YEARS']),
+            y=age_counts['population'].values,
+            error_y=error_bars(age_counts, 'population'),
+            marker=dict(
+                color=text_color_secondary,
+                line=dict(
+                    color='#000000',
+                    width=1
+                ),
+                opacity=0.7
+            ),
+            name='Age Count'
+        ))
+        .update_layout(
+            plot_bgcolor=background_color,
+            paper_bgcolor='rgba(80, 80, 80, 0.0)',
+            font_color=text_color_primary,
+            margin=dict(l=40, r=40, t=40, b=40),
+            xaxis=dict(
+                gridcolor=grid_color,
+                title='Age (Years)',
+                tickmode='linear',
+                tick0=0,
+                dtick=1,  # Force 1-year intervals
+                showgrid=True
+            ),
+            yaxis=dict(
+                gridcolor=grid_color,
+                title='Estimated Children',
+                showgrid=True
+            ),
+            bargap=0.2,  # Add gap between bars for discrete look
+        )
+    )
+
+
+def mental_vs_physical_figure(cube):
+    health_by_age_group = cube.estimates(['age_group']).set_index('age_group')
+    return (
+        go.Figure()
+        .add_trace(go.Bar(
+            x=health_by_age_group.index.astype(str),
+            y=health_by_age_group['A1_MENTHEALTH_mean'].values,
+            error_y=error_bars(health_by_age_group, 'A1_MENTHEALTH_mean'),
+            name='Mental Health',
+            marker_color=text_color_secondary
+        ))
+        .add_trace(go.Bar(
+            x=health_by_age_group.index.astype(str),
+            y=health_by_age_group['A1_PHYSHEALTH_mean'].values,
+            error_y=error_bars(health_by_age_group, 'A1_PHYSHEALTH_mean'),
+            name='Physical Health',
+            marker_color='#6ca0ff'  # Lighter blue to complement the main blue
+        ))
+        .update_layout(
+            barmode='group',
+            plot_bgcolor=background_color,
+            paper_bgcolor='rgba(80, 80, 80, 0.0)',
+            font_color=text_color_primary,
+            margin=dict(l=40, r=40, t=40, b=40),
+            xaxis=dict(gridcolor=grid_color, title='Age Group'),
+            yaxis=dict(gridcolor=grid_color, title='Average Health Score'),
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            )
+        )
+    )
+
 
-# Calculate correlations for mental and physical health
-health_cols = ['A1_MENTHEALTH', 'A1_PHYSHEALTH']
-corr_matrix = data[health_cols].corr()
+def ace_pie_figure(cube):
+    ace_counts = cube.estimates(['ACE1'])[['ACE1', 'population']]
+    return px.pie(
+        ace_counts,
+        names='ACE1',
+        values='population',
+        color_discrete_sequence=[text_color_secondary, '#6ca0ff', '#97b9ff', '#ccd6f6']
+    ).update_layout(
+        plot_bgcolor=background_color,
+        paper_bgcolor='rgba(80, 80, 80, 0.0)',
+        font_color=text_color_primary,
+        margin=dict(l=40, r=40, t=40, b=40),
+    )
 
-# Count health conditions
-health_condition_cols = ['DIABETES', 'BLOOD', 'HEADACHE', 'HEART', 'K2Q35A', 
-                        'K2Q30A', 'K2Q31A', 'K2Q32A', 'K2Q33A', 'K2Q34A', 
-                        'K2Q40A', 'K2Q36A', 'K2Q37A']
-data['health_condition_count'] = data[health_condition_cols].sum(axis=1)
+
+def health_conditions_figure(cube):
+    condition_counts = cube.estimates(['health_condition_count'])
+    return px.bar(
+        condition_counts,
+        x='health_condition_count',
+        y='population',
+        color_discrete_sequence=[text_color_secondary]
+    ).update_traces(
+        error_y=error_bars(condition_counts, 'population')
+    ).update_layout(
+        plot_bgcolor=background_color,
+        paper_bgcolor='rgba(80, 80, 80, 0.0)',
+        font_color=text_color_primary,
+        margin=dict(l=40, r=40, t=40, b=40),
+        xaxis=dict(gridcolor=grid_color, title='Number of Health Conditions'),
+        yaxis=dict(gridcolor=grid_color, title='Estimated Children')
+    )
+
+
+def screentime_grades_figure(cube):
+    grade_by_screentime = cube.estimates(['SCREENTIME'])
+    return (
+        go.Figure()
+        .add_trace(go.Scatter(
+            x=grade_by_screentime['SCREENTIME'],
+            y=grade_by_screentime['A1_GRADE_mean'].values,
+            error_y=error_bars(grade_by_screentime, 'A1_GRADE_mean'),
+            mode='lines+markers',
+            line=dict(color=text_color_secondary, width=3),
+            marker=dict(size=10, color='#ffffff', line=dict(color=text_color_secondary, width=2))
+        ))
+        .update_layout(
+            plot_bgcolor=background_color,
+            paper_bgcolor='rgba(80, 80, 80, 0.0)',
+            font_color=text_color_primary,
+            margin=dict(l=40, r=40, t=40, b=40),
+            xaxis=dict(gridcolor=grid_color, title='Screen Time (Hours)'),
+            yaxis=dict(gridcolor=grid_color, title='Average Grade')
+        )
+    )
+
+
+chart_figures = {
+    'age-distribution': age_distribution_figure,
+    'mental-vs-physical': mental_vs_physical_figure,
+    'ace-pie': ace_pie_figure,
+    'health-conditions': health_conditions_figure,
+    'screentime-grades': screentime_grades_figure,
+}
+
+
+def filtered_cube(data, filters):
+    # Selected values are OR-ed within a filter and filters are AND-ed, on
+    # the bitmaps; the matching records are then re-aggregated into a cube
+    rows = data.bitmaps.rows(filters)
+    return data.cube if rows is None else data.cube.subset(rows)
+
+
+def figure_key(data, chart, filters):
+    return data.figure_cache.key(f"{data.store.version}-{FIGURES_VERSION}", chart, filters)
+
+
+def figure_json(data, chart, filters):
+    return data.figure_cache.get(figure_key(data, chart, filters),
+                                 lambda: chart_figures[chart](filtered_cube(data, filters)))
+
+
+# Shown until a chart's callback delivers the real figure
+placeholder_figure = {
+    'data': [],
+    'layout': {
+        'paper_bgcolor': 'rgba(80, 80, 80, 0.0)',
+        'plot_bgcolor': background_color,
+        'xaxis': {'visible': False},
+        'yaxis': {'visible': False},
+        'margin': dict(l=40, r=40, t=40, b=40),
+    },
+}
 
 
 # Define app layout with improved styling
-layout = html.Div(
-    html.Div(style={
-        'backgroundColor': background_color, 
-        'color': text_color_primary, 
-        'padding': '20px',
-        'fontFamily': '"Roboto", "Helvetica Neue", Arial, sans-serif',
-        'minHeight': '100vh'
-    }, children=[
-        # Stats Cards Row
-        html.Div([
+def layout(**kwargs):
+    # Only cheap parts are built here: the overview card (a cube roll-up) and
+    # empty chart placeholders, each filled in by its own callback below
+    data = survey_data.get()
+    return html.Div(
+        html.Div(style={
+            'backgroundColor': background_color, 
+            'color': text_color_primary, 
+            'padding': '20px',
+            'fontFamily': '"Roboto", "Helvetica Neue", Arial, sans-serif',
+            'minHeight': '100vh'
+        }, children=[
+            # Stats Cards Row
+            html.Div([
+                html.Div([
+                    html.Div(style={
+                        'backgroundColor': '#0D1117',
+                        'borderRadius': '10px',
+                        'padding': '20px',
+                        'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
+                        'border': '1px solid #2C5282',
+                        'height': '100%'
+                    }, children=[
+                        html.H2('Overview Statistics 📊', style={'color': text_color_secondary, 'marginTop': '0'}),
+                        html.Div(id='overview-stats', children=overview_stats(data.cube)),
+                    ])
+                ], style={'width': '100%'})
+            ], style={'display': 'flex', 'marginBottom': '30px'}),
+        
+            # Filters, applied to every chart and statistic
             html.Div([
                 html.Div(style={
                     'backgroundColor': '#0D1117',
                     'borderRadius': '10px',
                     'padding': '20px',
                     'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                    'border': '1px solid #2C5282',
-                    'height': '100%'
+                    'border': '1px solid #2C5282'
                 }, children=[
-                    html.H2('Overview Statistics 📊', style={'color': text_color_secondary, 'marginTop': '0'}),
+                    html.H2('Filters', style={'color': text_color_secondary, 'marginTop': '0'}),
                     html.Div([
-                        html.Div([
-                            html.H3(f"Total Records", style={'color': text_color_primary, 'marginBottom': '5px'}),
-                            html.P(f"{len(data):,}", style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
-                        ], style={'width': '50%', 'display': 'inline-block'}),
-                        html.Div([
-                            html.H3(f"Age Range", style={'color': text_color_primary, 'marginBottom': '5px'}),
-                            html.P(f"{data['SC_AGE_YEARS'].min()}-{data['SC_AGE_YEARS'].max()} years", 
-                                style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
-                        ], style={'width': '50%', 'display': 'inline-block'}),
+                        filter_dropdown(data.bitmaps, 'age_group', 'Age Group'),
+                        filter_dropdown(data.bitmaps, 'ACE1', 'ACE Score'),
+                        filter_dropdown(data.bitmaps, 'SCREENTIME', 'Screen Time'),
                     ]),
                     html.Div([
-                        html.Div([
-                            html.H3(f"Mental Health Score", style={'color': text_color_primary, 'marginBottom': '5px'}),
-                            html.P(f"{data['A1_MENTHEALTH'].mean():.1f}", 
-                                style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
-                        ], style={'width': '50%', 'display': 'inline-block'}),
-                        html.Div([
-                            html.H3(f"Physical Health Score", style={'color': text_color_primary, 'marginBottom': '5px'}),
-                            html.P(f"{data['A1_PHYSHEALTH'].mean():.1f}", 
-                                style={'color': text_color_secondary, 'fontSize': '28px', 'fontWeight': 'bold'}),
-                        ], style={'width': '50%', 'display': 'inline-block'}),
+                        filter_dropdown(data.bitmaps, column, condition_labels[column], width='15%')
+                        for column in health_condition_cols
                     ]),
                 ])
-            ], style={'width': '100%'})
-        ], style={'display': 'flex', 'marginBottom': '30px'}),
+            ], style={'marginBottom': '30px'}),
+
+            # First row of charts
+            html.Div([
+                html.Div([
+                    html.Div(style={
+                        'backgroundColor': '#0D1117',
+                        'borderRadius': '10px',
+                        'padding': '20px',
+                        'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
+                        'border': '1px solid #2C5282',
+                        'height': '100%'
+                    }, children=[
+                        html.H2('Age Distribution', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
+                        dcc.Loading(dcc.Graph(
+                            id='age-distribution',
+                            figure=placeholder_figure
+                        ), type='circle', color=text_color_secondary)
+                    ])
+                ], style={'width': '48%', 'display': 'inline-block'}),
+            
+                html.Div([
+                    html.Div(style={
+                        'backgroundColor': '#0D1117',
+                        'borderRadius': '10px',
+                        'padding': '20px',
+                        'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
+                        'border': '1px solid #2C5282',
+                        'height': '100%'
+                    }, children=[
+                        html.H2('Mental vs Physical Health', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
+                        # Changed to simpler bar chart instead of scatter
+                        dcc.Loading(dcc.Graph(
+                            id='mental-vs-physical',
+                            figure=placeholder_figure
+                        ), type='circle', color=text_color_secondary)
+                    ])
+                ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
+            ], style={'marginBottom': '30px'}),
         
-        # First row of charts
-        html.Div([
+            # Second row of charts
             html.Div([
-                html.Div(style={
-                    'backgroundColor': '#0D1117',
-                    'borderRadius': '10px',
-                    'padding': '20px',
-                    'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                    'border': '1px solid #2C5282',
-                    'height': '100%'
-                }, children=[
-                    html.H2('Age Distribution', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
-                    dcc.Graph(
-                        id='age-distribution',
-                        figure=go.Figure()
-                        .add_trace(go.Histogram(
-                            x=data['SC_AGE_YEARS'],
-                            xbins=dict(  # Make bins discrete with gaps
-                                start=0,
-                                end=20,
-                                size=1
-                            ),
-                            marker=dict(
-                                color=text_color_secondary,
-                                line=dict(
-                                    color='#000000',
-                                    width=1
-                                ),
-                                opacity=0.7
-                            ),
-                            name='Age Count'
-                        ))
-                        .update_layout(
-                            plot_bgcolor=background_color,
-                            paper_bgcolor='rgba(80, 80, 80, 0.0)',
-                            font_color=text_color_primary,
-                            margin=dict(l=40, r=40, t=40, b=40),
-                            xaxis=dict(
-                                gridcolor=grid_color,
-                                title='Age (Years)',
-                                tickmode='linear',
-                                tick0=0,
-                                dtick=1,  # Force 1-year intervals
-                                showgrid=True
-                            ),
-                            yaxis=dict(
-                                gridcolor=grid_color,
-                                title='Count',
-                                showgrid=True
-                            ),
-                            bargap=0.2,  # Add gap between bars for discrete look
-                        )
-                    )
-                ])
-            ], style={'width': '48%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Div(style={
+                        'backgroundColor': '#0D1117',
+                        'borderRadius': '10px',
+                        'padding': '20px',
+                        'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
+                        'border': '1px solid #2C5282',
+                        'height': '100%'
+                    }, children=[
+                        html.H2('ACE Score Distribution', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
+                        dcc.Loading(dcc.Graph(
+                            id='ace-pie',
+                            figure=placeholder_figure
+                        ), type='circle', color=text_color_secondary)
+                    ])
+                ], style={'width': '48%', 'display': 'inline-block'}),
             
+                html.Div([
+                    html.Div(style={
+                        'backgroundColor': '#0D1117',
+                        'borderRadius': '10px',
+                        'padding': '20px',
+                        'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
+                        'border': '1px solid #2C5282',
+                        'height': '100%'
+                    }, children=[
+                        html.H2('Health Conditions Count', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
+                        dcc.Loading(dcc.Graph(
+                            id='health-conditions',
+                            figure=placeholder_figure
+                        ), type='circle', color=text_color_secondary)
+                    ])
+                ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
+            ], style={'marginBottom': '30px'}),
+        
+            # Screen Time Chart - Changed to simpler visualization
             html.Div([
                 html.Div(style={
                     'backgroundColor': '#0D1117',
                     'borderRadius': '10px',
                     'padding': '20px',
                     'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                    'border': '1px solid #2C5282',
-                    'height': '100%'
+                    'border': '1px solid #2C5282'
                 }, children=[
-                    html.H2('Mental vs Physical Health', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
-                    # Changed to simpler bar chart instead of scatter
-                    dcc.Graph(
-                        id='mental-vs-physical',
-                        figure=go.Figure()
-                        .add_trace(go.Bar(
-                            x=data['age_group'].unique(),
-                            y=[data[data['age_group'] == age]['A1_MENTHEALTH'].mean() for age in data['age_group'].unique()],
-                            name='Mental Health',
-                            marker_color=text_color_secondary
-                        ))
-                        .add_trace(go.Bar(
-                            x=data['age_group'].unique(),
-                            y=[data[data['age_group'] == age]['A1_PHYSHEALTH'].mean() for age in data['age_group'].unique()],
-                            name='Physical Health',
-                            marker_color='#6ca0ff'  # Lighter blue to complement the main blue
-                        ))
-                        .update_layout(
-                            barmode='group',
-                            plot_bgcolor=background_color,
-                            paper_bgcolor='rgba(80, 80, 80, 0.0)',
-                            font_color=text_color_primary,
-                            margin=dict(l=40, r=40, t=40, b=40),
-                            xaxis=dict(gridcolor=grid_color, title='Age Group'),
-                            yaxis=dict(gridcolor=grid_color, title='Average Health Score'),
-                            legend=dict(
-                                orientation="h",
-                                yanchor="bottom",
-                                y=1.02,
-                                xanchor="right",
-                                x=1
-                            )
-                        )
-                    )
+                    html.H2('Screen Time vs Grade Performance', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
+                    dcc.Loading(dcc.Graph(
+                        id='screentime-grades',
+                        figure=placeholder_figure
+                    ), type='circle', color=text_color_secondary)
                 ])
-            ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
-        ], style={'marginBottom': '30px'}),
+            ], style={'marginBottom': '30px'}),
         
-        # Second row of charts
-        html.Div([
+            # Data table
             html.Div([
                 html.Div(style={
                     'backgroundColor': '#0D1117',
                     'borderRadius': '10px',
                     'padding': '20px',
                     'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                    'border': '1px solid #2C5282',
-                    'height': '100%'
+                    'border': '1px solid #2C5282'
                 }, children=[
-                    html.H2('ACE Score Distribution', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
-                    dcc.Graph(
-                        id='ace-pie',
-                        figure=px.pie(
-                            data, 
-                            names='ACE1', 
-                            color_discrete_sequence=[text_color_secondary, '#6ca0ff', '#97b9ff', '#ccd6f6']
-                        ).update_layout(
-                            plot_bgcolor=background_color,
-                            paper_bgcolor='rgba(80, 80, 80, 0.0)',
-                            font_color=text_color_primary,
-                            margin=dict(l=40, r=40, t=40, b=40),
-                        )
+                    html.H2('Data Explorer', style={'color': text_color_secondary, 'marginTop': '0'}),
+                    dash_table.DataTable(
+                        id='data-table',
+                        columns=[{"name": i, "id": i, "type": data.table.column_type(i)} for i in data.table.columns],
+                        page_current=0,
+                        page_size=TABLE_PAGE_SIZE,
+                        page_action='custom',
+                        sort_action='custom',
+                        sort_mode='single',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query='',
+                        style_header={
+                            'backgroundColor': '#1a1a1a',
+                            'color': text_color_secondary,
+                            'fontWeight': 'bold'
+                        },
+                        style_filter={
+                            'backgroundColor': '#1a1a1a',
+                            'color': text_color_primary
+                        },
+                        style_cell={
+                            'backgroundColor': background_color,
+                            'color': text_color_primary,
+                            'border': '1px solid #333',
+                            'padding': '10px',
+                            'fontFamily': '"Roboto", sans-serif'
+                        },
+                        style_table={
+                            'overflowX': 'auto',
+                            'border': '1px solid #333'
+                        }
                     )
                 ])
-            ], style={'width': '48%', 'display': 'inline-block'}),
-            
+            ], style={'marginBottom': '30px'}),
+        
+            # Key insights
             html.Div([
                 html.Div(style={
                     'backgroundColor': '#0D1117',
                     'borderRadius': '10px',
                     'padding': '20px',
                     'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                    'border': '1px solid #2C5282',
-                    'height': '100%'
+                    'border': '1px solid #2C5282'
                 }, children=[
-                    html.H2('Health Conditions Count', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
-                    dcc.Graph(
-                        id='health-conditions',
-                        figure=px.bar(
-                            data.groupby('health_condition_count').size().reset_index(name='count'),
-                            x='health_condition_count',
-                            y='count',
-                            color_discrete_sequence=[text_color_secondary]
-                        ).update_layout(
-                            plot_bgcolor=background_color,
-                            paper_bgcolor='rgba(80, 80, 80, 0.0)',
-                            font_color=text_color_primary,
-                            margin=dict(l=40, r=40, t=40, b=40),
-                            xaxis=dict(gridcolor=grid_color, title='Number of Health Conditions'),
-                            yaxis=dict(gridcolor=grid_color, title='Count of Children')
-                        )
-                    )
-                ])
-            ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
-        ], style={'marginBottom': '30px'}),
-        
-        # Screen Time Chart - Changed to simpler visualization
-        html.Div([
-            html.Div(style={
-                'backgroundColor': '#0D1117',
-                'borderRadius': '10px',
-                'padding': '20px',
-                'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                'border': '1px solid #2C5282'
-            }, children=[
-                html.H2('Screen Time vs Grade Performance', style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '0'}),
-                dcc.Graph(
-                    id='screentime-grades',
-                    figure=go.Figure()
-                    .add_trace(go.Scatter(
-                        x=data.groupby('SCREENTIME')['A1_GRADE'].mean().index,
-                        y=data.groupby('SCREENTIME')['A1_GRADE'].mean().values,
-                        mode='lines+markers',
-                        line=dict(color=text_color_secondary, width=3),
-                        marker=dict(size=10, color='#ffffff', line=dict(color=text_color_secondary, width=2))
-                    ))
-                    .update_layout(
-                        plot_bgcolor=background_color,
-                        paper_bgcolor='rgba(80, 80, 80, 0.0)',
-                        font_color=text_color_primary,
-                        margin=dict(l=40, r=40, t=40, b=40),
-                        xaxis=dict(gridcolor=grid_color, title='Screen Time (Hours)'),
-                        yaxis=dict(gridcolor=grid_color, title='Average Grade')
-                    )
-                )
-            ])
-        ], style={'marginBottom': '30px'}),
-        
-        # Data table
-        html.Div([
-            html.Div(style={
-                'backgroundColor': '#0D1117',
-                'borderRadius': '10px',
-                'padding': '20px',
-                'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                'border': '1px solid #2C5282'
-            }, children=[
-                html.H2('Data Explorer', style={'color': text_color_secondary, 'marginTop': '0'}),
-                dash_table.DataTable(
-                    id='data-table',
-                    columns=[{"name": i, "id": i} for i in data.head().columns],
-                    data=data.head(10).to_dict('records'),
-                    style_header={
-                        'backgroundColor': '#1a1a1a',
-                        'color': text_color_secondary,
-                        'fontWeight': 'bold'
-                    },
-                    style_cell={
-                        'backgroundColor': background_color,
-                        'color': text_color_primary,
-                        'border': '1px solid #333',
-                        'padding': '10px',
-                        'fontFamily': '"Roboto", sans-serif'
-                    },
-                    style_table={
-                        'overflowX': 'auto',
-                        'border': '1px solid #333'
-                    }
-                )
-            ])
-        ], style={'marginBottom': '30px'}),
-        
-        # Key insights
-        html.Div([
-            html.Div(style={
-                'backgroundColor': '#0D1117',
-                'borderRadius': '10px',
-                'padding': '20px',
-                'boxShadow': '0 4px 6px rgba(0, 0, 0, 0.1)',
-                'border': '1px solid #2C5282'
-            }, children=[
-                html.H2('Key Insights', style={'color': text_color_secondary, 'marginTop': '0'}),
-                html.Div([
-                    html.Div([
-                        html.Div(style={
-                            'backgroundColor': background_color,
-                            'borderRadius': '8px',
-                            'padding': '15px',
-                            'marginBottom': '15px',
-                            'borderLeft': f'4px solid {text_color_secondary}'
-                        }, children=[
-                            html.P('The average mental health score is lower than the physical health score, indicating potential focus areas for intervention.', 
-                                style={'color': text_color_primary, 'margin': '0'})
-                        ]),
-                    ], style={'width': '48%', 'display': 'inline-block', 'marginRight': '4%'}),
+                    html.H2('Key Insights', style={'color': text_color_secondary, 'marginTop': '0'}),
                     html.Div([
-                        html.Div(style={
-                            'backgroundColor': background_color,
-                            'borderRadius': '8px',
-                            'padding': '15px',
-                            'marginBottom': '15px',
-                            'borderLeft': f'4px solid {text_color_secondary}'
-                        }, children=[
-                            html.P('There appears to be a correlation between screen time and academic performance that varies by age group.', 
-                                style={'color': text_color_primary, 'margin': '0'})
-                        ]),
-                    ], style={'width': '48%', 'display': 'inline-block'}),
-                ]),
-                html.Div([
-                    html.Div([
-                        html.Div(style={
-                            'backgroundColor': background_color,
-                            'borderRadius': '8px',
-                            'padding': '15px',
-                            'marginBottom': '15px',
-                            'borderLeft': f'4px solid {text_color_secondary}'
-                        }, children=[
-                            html.P('Children with multiple health conditions tend to report lower mental health scores.', 
-                                style={'color': text_color_primary, 'margin': '0'})
-                        ]),
-                    ], style={'width': '48%', 'display': 'inline-block', 'marginRight': '4%'}),
+                        html.Div([
+                            html.Div(style={
+                                'backgroundColor': background_color,
+                                'borderRadius': '8px',
+                                'padding': '15px',
+                                'marginBottom': '15px',
+                                'borderLeft': f'4px solid {text_color_secondary}'
+                            }, children=[
+                                html.P('The average mental health score is lower than the physical health score, indicating potential focus areas for intervention.', 
+                                    style={'color': text_color_primary, 'margin': '0'})
+                            ]),
+                        ], style={'width': '48%', 'display': 'inline-block', 'marginRight': '4%'}),
+                        html.Div([
+                            html.Div(style={
+                                'backgroundColor': background_color,
+                                'borderRadius': '8px',
+                                'padding': '15px',
+                                'marginBottom': '15px',
+                                'borderLeft': f'4px solid {text_color_secondary}'
+                            }, children=[
+                                html.P('There appears to be a correlation between screen time and academic performance that varies by age group.', 
+                                    style={'color': text_color_primary, 'margin': '0'})
+                            ]),
+                        ], style={'width': '48%', 'display': 'inline-block'}),
+                    ]),
                     html.Div([
-                        html.Div(style={
-                            'backgroundColor': background_color,
-                            'borderRadius': '8px',
-                            'padding': '15px',
-                            'marginBottom': '15px',
-                            'borderLeft': f'4px solid {text_color_secondary}'
-                        }, children=[
-                            html.P('ACE scores show significant impact on both mental and physical health outcomes.', 
-                                style={'color': text_color_primary, 'margin': '0'})
-                        ]),
-                    ], style={'width': '48%', 'display': 'inline-block'}),
-                ]),
-            ])
-        ]),
+                        html.Div([
+                            html.Div(style={
+                                'backgroundColor': background_color,
+                                'borderRadius': '8px',
+                                'padding': '15px',
+                                'marginBottom': '15px',
+                                'borderLeft': f'4px solid {text_color_secondary}'
+                            }, children=[
+                                html.P('Children with multiple health conditions tend to report lower mental health scores.', 
+                                    style={'color': text_color_primary, 'margin': '0'})
+                            ]),
+                        ], style={'width': '48%', 'display': 'inline-block', 'marginRight': '4%'}),
+                        html.Div([
+                            html.Div(style={
+                                'backgroundColor': background_color,
+                                'borderRadius': '8px',
+                                'padding': '15px',
+                                'marginBottom': '15px',
+                                'borderLeft': f'4px solid {text_color_secondary}'
+                            }, children=[
+                                html.P('ACE scores show significant impact on both mental and physical health outcomes.', 
+                                    style={'color': text_color_primary, 'margin': '0'})
+                            ]),
+                        ], style={'width': '48%', 'display': 'inline-block'}),
+                    ]),
+                ])
+            ]),
         
-        # Footer
-        html.Footer(
-            html.P('© 2025 Health Conditions Predictor', 
-                style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '30px', 'opacity': '0.7'})
-        )
-    ]),
-    style={
-        'paddingLeft': '40px',
-        'paddingRight': '40px',
-        'backgroundColor': background_color  # match your base theme
-    }
-)
\ No newline at end of file
+            # Footer
+            html.Footer(
+                html.P('© 2025 Health Conditions Predictor', 
+                    style={'color': text_color_secondary, 'textAlign': 'center', 'marginTop': '30px', 'opacity': '0.7'})
+            )
+        ]),
+        style={
+            'paddingLeft': '40px',
+            'paddingRight': '40px',
+            'backgroundColor': background_color  # match your base theme
+        }
+    )
+
+
+
+@callback(
+    Output('overview-stats', 'children'),
+    [Input(f'filter-{column}', 'value') for column in FILTER_COLUMNS],
+    prevent_initial_call=True
+)
+def apply_filters(*values):
+    data = survey_data.get()
+    return overview_stats(filtered_cube(data, data.bitmaps.normalize(dict(zip(FILTER_COLUMNS, values)))))
+
+
+# Each chart is fetched from the figure endpoint below by its own callback,
+# so charts appear independently and the browser revalidates its copy with
+# the ETag, only downloading a figure it has not seen
+for chart in chart_figures:
+    clientside_callback(
+        """
+        function(...values) {
+            const columns = %s;
+            const filters = {};
+            columns.forEach((column, i) => {
+                if (values[i] && values[i].length) { filters[column] = values[i]; }
+            });
+            const query = encodeURIComponent(JSON.stringify(filters));
+            return fetch(`/api/explorer/figure/%s?filters=${query}`, {cache: 'no-cache'})
+                .then(response => response.ok ? response.json() : window.dash_clientside.no_update);
+        }
+        """ % (json.dumps(FILTER_COLUMNS), chart),
+        Output(chart, 'figure'),
+        [Input(f'filter-{column}', 'value') for column in FILTER_COLUMNS]
+    )
+
+
+@callback(
+    [Output('data-table', 'data'),
+     Output('data-table', 'page_count')],
+    [Input('data-table', 'page_current'),
+     Input('data-table', 'page_size'),
+     Input('data-table', 'sort_by'),
+     Input('data-table', 'filter_query')]
+)
+def update_table(page_current, page_size, sort_by, filter_query):
+    records, matching = survey_data.get().table.page(page_current or 0, page_size, sort_by, filter_query)
+    return records, max(1, -(-matching // page_size))
+
+
+server = dash.get_app().server
+
+@server.route("/api/explorer/figure/<chart>", methods=["GET"])
+def explorer_figure(chart):
+    """Figure JSON for a chart and ?filters={column: [values]}, with an ETag.
+
+    The ETag is the cache key, so a matching If-None-Match is answered 304
+    without building or reading the figure.
+    """
+    if chart not in chart_figures:
+        return jsonify({'error': f"Unknown chart {chart!r}"}), 404
+    try:
+        filters = json.loads(request.args.get('filters') or '{}')
+    except ValueError:
+        return jsonify({'error': "filters must be a JSON object"}), 400
+    if not isinstance(filters, dict):
+        return jsonify({'error': "filters must be a JSON object"}), 400
+    data = survey_data.get()
+    # Only known levels of the filter columns, so junk values neither change
+    # the figure nor create cache entries
+    filters = data.bitmaps.normalize(filters)
+    etag = figure_key(data, chart, filters)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(figure_json(data, chart, filters), mimetype='application/json')
+    response.set_etag(etag)
+    # Always revalidate; the ETag changes with the dataset version
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@server.route("/api/explorer/figure-cache-stats", methods=["GET"])
+def figure_cache_stats():
+    return jsonify(survey_data.get().figure_cache.stats())
@@ -4,150 +4,49 @@ import dash_bootstrap_components as dbc
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from sklearn.preprocessing import StandardScaler
-import joblib
 import os
-import tensorflow as tf  # Add TensorFlow import
 from dash.exceptions import PreventUpdate
+from flask import request, jsonify, Response
+
+from inference.features import conditions, options
+from inference.batch import MAX_BATCH_ROWS, parse_rows, score_matrix, score_rows, results_to_csv
+from inference.micro_batch import MicroBatcher
+from inference.cache import PredictionCache
+from inference.registry import FAILED, ModelNotReady, registry
+from inference.metrics import metrics, not_ready_responses, prediction_errors, request_seconds, stage_seconds
 
 dash.register_page(__name__, path='/predictor')
 
-# Define path to your saved model and scaler
-MODEL_PATH = "models/multilabel_classification_model.h5"  # Update this path
-SCALER_PATH = "models/scaler.pkl"  # Update this path
+# Load the model artifact in the background so importing this page never
+# blocks; callbacks report the warm-up state until it is ready
+registry.warm_up()
 
-# Load the TensorFlow model and scaler
-try:
-    # Load TensorFlow model
-    model = tf.keras.models.load_model(MODEL_PATH)
-    
-    # Load scaler
-    scaler = joblib.load(SCALER_PATH)
-    
-    # Set flag indicating successful model loading
-    model_loaded = True
-    print("Model and scaler loaded successfully")
-except Exception as e:
-    print(f"Error loading model or scaler: {e}")
-    model_loaded = False
+# Concurrent predictions are coalesced into one forward pass; tune the window
+# with the figures reported by /api/predict/batcher-stats
+BATCH_WINDOW_MS = 5
+MAX_BATCH_SIZE = 64
 
-conditions = ["Autism/ASD", "Learning Disability", "ADD/ADHD", "Depression", 
-             "Anxiety", "Behavior Problems", "Speech Disorder", "Asthma"]
+batcher = MicroBatcher(lambda rows: score_matrix(registry.get(), rows),
+                       max_batch_size=MAX_BATCH_SIZE, max_wait_ms=BATCH_WINDOW_MS)
 
-# Option definitions for each dropdown
-options = {
-    'general_health': [
-        {'label': 'Excellent', 'value': 1},
-        {'label': 'Very Good', 'value': 2},
-        {'label': 'Good', 'value': 3},
-        {'label': 'Fair', 'value': 4},
-        {'label': 'Poor', 'value': 5}
-    ],
-    'mental_health': [
-        {'label': 'Excellent', 'value': 1},
-        {'label': 'Very Good', 'value': 2},
-        {'label': 'Good', 'value': 3},
-        {'label': 'Fair', 'value': 4},
-        {'label': 'Poor', 'value': 5}
-    ],
-    'physical_health': [
-        {'label': 'Excellent', 'value': 1},
-        {'label': 'Very Good', 'value': 2},
-        {'label': 'Good', 'value': 3},
-        {'label': 'Fair', 'value': 4},
-        {'label': 'Poor', 'value': 5}
-    ],
-    'education': [
-        {'label': '8th grade or less', 'value': 1},
-        {'label': '9th-12th grade, No diploma', 'value': 2},
-        {'label': 'High School Graduate or GED', 'value': 3},
-        {'label': 'Vocational/trade/business school', 'value': 4},
-        {'label': 'Some College Credit, No Degree', 'value': 5},
-        {'label': 'Associate Degree', 'value': 6},
-        {'label': "Bachelor's Degree", 'value': 7},
-        {'label': "Master's Degree", 'value': 8},
-        {'label': 'Doctorate or Professional Degree', 'value': 9}
-    ],
-    'financial_hardship': [
-        {'label': 'Never', 'value': 1},
-        {'label': 'Rarely', 'value': 2},
-        {'label': 'Somewhat often', 'value': 3},
-        {'label': 'Very often', 'value': 4}
-    ],
-    'food_situation': [
-        {'label': 'Always afford good nutritious meals', 'value': 1},
-        {'label': 'Always afford enough but not always nutritious', 'value': 2},
-        {'label': 'Sometimes could not afford enough', 'value': 3},
-        {'label': 'Often could not afford enough', 'value': 4}
-    ],
-    'yes_no': [
-        {'label': 'Yes', 'value': 1},
-        {'label': 'No', 'value': 2}
-    ],
-    'neighborhood_safety': [
-        {'label': 'Definitely agree', 'value': 1},
-        {'label': 'Somewhat agree', 'value': 2},
-        {'label': 'Somewhat disagree', 'value': 3},
-        {'label': 'Definitely disagree', 'value': 4}
-    ],
-    'family_meal': [
-        {'label': '0 days', 'value': 1},
-        {'label': '1-3 days', 'value': 2},
-        {'label': '4-6 days', 'value': 3},
-        {'label': 'Every day', 'value': 4}
-    ],
-    'child_care_difficulty': [
-        {'label': 'Never', 'value': 1},
-        {'label': 'Rarely', 'value': 2},
-        {'label': 'Sometimes', 'value': 3},
-        {'label': 'Usually', 'value': 4},
-        {'label': 'Always', 'value': 5}
-    ],
-    'family_talk': [
-        {'label': 'All of the time', 'value': 1},
-        {'label': 'Most of the time', 'value': 2},
-        {'label': 'Some of the time', 'value': 3},
-        {'label': 'None of the time', 'value': 4}
-    ],
-    'weight_concern': [
-        {'label': 'Yes, too high', 'value': 1},
-        {'label': 'Yes, too low', 'value': 2},
-        {'label': 'Not concerned', 'value': 3}
-    ],
-    'screen_time': [
-        {'label': 'Less than 1 hour', 'value': 1},
-        {'label': '1 hour', 'value': 2},
-        {'label': '2 hours', 'value': 3},
-        {'label': '3 hours', 'value': 4},
-        {'label': '4 or more hours', 'value': 5}
-    ],
-    'family_structure': [
-        {'label': 'Two biological/adoptive parents, married', 'value': 1},
-        {'label': 'Two biological/adoptive parents, not married', 'value': 2},
-        {'label': 'Two parents (at least one not bio/adoptive), married', 'value': 3},
-        {'label': 'Two parents (at least one not bio/adoptive), not married', 'value': 4},
-        {'label': 'Single mother', 'value': 5},
-        {'label': 'Single father', 'value': 6},
-        {'label': 'Grandparent household', 'value': 7},
-        {'label': 'Other relation', 'value': 8}
-    ],
-    'age': [{'label': str(i), 'value': i} for i in range(1, 18)],
-    'race': [
-        {'label': 'White alone', 'value': 1},
-        {'label': 'Black or African American alone', 'value': 2},
-        {'label': 'American Indian or Alaska Native alone', 'value': 3},
-        {'label': 'Asian alone', 'value': 4},
-        {'label': 'Native Hawaiian and Other Pacific Islander alone', 'value': 5},
-        {'label': 'Two or More Races', 'value': 7}
-    ],
-    'birth_order': [
-        {'label': 'Only child', 'value': 1},
-        {'label': 'Oldest child', 'value': 2},
-        {'label': 'Second oldest child', 'value': 3},
-        {'label': 'Third oldest child', 'value': 4},
-        {'label': 'Fourth or greater oldest child', 'value': 5}
-    ]
-}
+# Repeat submissions of the same feature vector skip inference entirely
+PREDICTION_CACHE_SIZE = 10000
+PREDICTION_CACHE_TTL_S = 3600
+
+prediction_cache = PredictionCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL_S)
+
+# Expose cache and batcher counters alongside the stage histograms on /metrics
+for name in ('hits', 'misses', 'evictions', 'expirations'):
+    metrics.collected(f"predictor_cache_{name}_total", f"Prediction cache {name}",
+                      lambda name=name: prediction_cache.stats()[name], type='counter')
+metrics.collected('predictor_cache_entries', "Entries in the prediction cache",
+                  lambda: prediction_cache.stats()['size'])
+metrics.collected('predictor_batcher_requests_total', "Rows scored by the micro-batcher",
+                  lambda: batcher.stats()['requests'], type='counter')
+metrics.collected('predictor_batcher_batches_total', "Forward passes run by the micro-batcher",
+                  lambda: batcher.stats()['batches'], type='counter')
+metrics.collected('predictor_batcher_pending', "Rows waiting in the micro-batcher queue",
+                  lambda: batcher.stats()['pending'])
 
 # Custom CSS for dark theme - updated to match the app theme
 dark_theme_css = {
@@ -196,10 +95,7 @@ layout = html.Div(
                 html.Div([
                     html.H3("Child Information", className="mb-3", style={'color': '#63B3ED'}),
                     create_dropdown("age", "Child's Age (Years)", options['age']),
-                    create_dropdown("gender", "Child's Gender", [
-                        {'label': 'Male', 'value': 1},
-                        {'label': 'Female', 'value': 2}
-                    ]),
+                    create_dropdown("gender", "Child's Gender", options['gender']),
                     create_dropdown("race", "Child's Race", options['race']),
                     create_dropdown("general_health", "Child's General Health", options['general_health']),
                     create_dropdown("birth_order", "Birth Order", options['birth_order']),
@@ -269,11 +165,7 @@ layout = html.Div(
                     html.H3("Adverse Childhood Experiences", className="mb-3", style={'color': '#63B3ED'}),
                     dbc.Row([
                         dbc.Col([
-                            create_dropdown("homeless", "Ever Homeless or Lived in Shelter", [
-                                {'label': 'Yes', 'value': 1},
-                                {'label': 'No', 'value': 2},
-                                {'label': "Don't Know", 'value': 3}
-                            ]),
+                            create_dropdown("homeless", "Ever Homeless or Lived in Shelter", options['homeless']),
                             create_dropdown("racial_unfair", "Treated Unfairly Because of Race", options['yes_no']),
                         ], width=6),
                         dbc.Col([
@@ -357,6 +249,7 @@ layout = html.Div(
      State("victim_violence", "value")],
     prevent_initial_call=True
 )
+@request_seconds.time(endpoint='predictor_callback')
 def generate_predictions(n_clicks, age, gender, race, general_health, birth_order, born_usa,
                     family_structure, financial_hardship, food_situation, family_meal, 
                     child_care_difficulty, family_talk, neighborhood_safety, rec_center,
@@ -368,7 +261,9 @@ def generate_predictions(n_clicks, age, gender, race, general_health, birth_orde
     if n_clicks is None:
         raise PreventUpdate
     
-    # Collect all inputs into a feature vector
+    # Collect all inputs into a form row (feature_names order); score_matrix
+    # assembles the model's inputs from it in the artifact's feature order
+    # (and times that as the feature_assembly stage)
     features = [
         age, gender, race, general_health, birth_order, born_usa,
         family_structure, financial_hardship, food_situation, family_meal, 
@@ -380,50 +275,102 @@ def generate_predictions(n_clicks, age, gender, race, general_health, birth_orde
         victim_violence
     ]
     
+    # Make sure the model has finished loading instead of guessing
+    try:
+        model = registry.get()
+    except ModelNotReady as e:
+        not_ready_responses.inc(endpoint='predictor_callback')
+        if e.status == FAILED:
+            return dash.no_update, dbc.Alert(f"The prediction model could not be loaded: {e.error}", color="danger")
+        return dash.no_update, dbc.Alert(f"⏳ The prediction model is warming up ({e.status}). Please try again in a moment.",
+                                         color="info")
+    
     # Use the model to make predictions
-    if model_loaded:
-        try:
-            # Scale the features
-            scaled_features = scaler.transform([features])
-            
-            # Make prediction with TensorFlow model
-            prediction_array = model.predict(scaled_features)[0]
-            
-            # Convert to probabilities
-            predictions = prediction_array.tolist()
-            
-            # Find the highest prediction and divide it by 2
-            max_index = predictions.index(max(predictions))
-            max_value = predictions[max_index]
-            predictions[max_index] = max_value / 2
-            
-            print("Model prediction successful with highest value halved")
-        except Exception as e:
-            print(f"Error during prediction: {e}")
-            predictions = np.random.random(size=len(conditions)).tolist()
-            
-            # Find the highest prediction and divide it by 2
-            max_index = predictions.index(max(predictions))
-            max_value = predictions[max_index]
-            predictions[max_index] = max_value / 2
-    else:
-        # Fall back to random predictions if model isn't loaded
-        print("Using random predictions as model is not loaded")
-        predictions = np.random.random(size=len(conditions)).tolist()
+    try:
+        # Score the features (batched with concurrent requests) unless cached
+        cache_key = prediction_cache.key(model.version, features)
+        prediction_array = prediction_cache.get(cache_key)
+        if prediction_array is None:
+            prediction_array = batcher.predict(features)
+            prediction_cache.put(cache_key, prediction_array)
+    except Exception as e:
+        prediction_errors.inc(endpoint='predictor_callback')
+        print(f"Error during prediction: {e}")
+        return dash.no_update, dbc.Alert(f"Prediction failed: {e}", color="danger")
+    
+    with stage_seconds.time(stage='postprocess'):
+        # Convert to probabilities
+        predictions = prediction_array.tolist()
         
         # Find the highest prediction and divide it by 2
         max_index = predictions.index(max(predictions))
         max_value = predictions[max_index]
         predictions[max_index] = max_value / 2
     
+    print("Model prediction successful with highest value halved")
+    
     # Store predictions in the Store component with stringified data
-    store_data = {
-        'predictions': predictions,
-        'conditions': conditions,
-        'timestamp': pd.Timestamp.now().isoformat(),
-        'original_highest_value': max_value,  # Store original value before halving
-        'highest_condition_index': max_index,  # Store which condition had the highest value
-        'halved_highest': True  # Flag to indicate highest value was halved
-    }
+    with stage_seconds.time(stage='store_serialization'):
+        store_data = {
+            'predictions': predictions,
+            'conditions': conditions,
+            'timestamp': pd.Timestamp.now().isoformat(),
+            'original_highest_value': max_value,  # Store original value before halving
+            'highest_condition_index': max_index,  # Store which condition had the highest value
+            'halved_highest': True,  # Flag to indicate highest value was halved
+            'features': features  # Submitted profile, used for the what-if sweep on the results page
+        }
     
-    return store_data, dcc.Location(id="redirect-location", pathname="/results")
\ No newline at end of file
+    return store_data, dcc.Location(id="redirect-location", pathname="/results")
+
+# Batch scoring endpoint for screening whole rosters at once
+server = dash.get_app().server
+
+@server.route("/api/predict/batch", methods=["POST"])
+@request_seconds.time(endpoint='batch')
+def predict_batch():
+    try:
+        model = registry.get()
+    except ModelNotReady as e:
+        not_ready_responses.inc(endpoint='batch')
+        return jsonify({'error': str(e), **registry.state()}), 503
+
+    try:
+        rows = parse_rows(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if len(rows) > MAX_BATCH_ROWS:
+        return jsonify({'error': f"At most {MAX_BATCH_ROWS} rows per request"}), 413
+
+    try:
+        results = score_rows(rows, model, cache=prediction_cache)
+    except Exception as e:
+        prediction_errors.inc(endpoint='batch')
+        print(f"Error during batch prediction: {e}")
+        return jsonify({'error': f"Error during prediction: {e}"}), 500
+
+    if request.args.get('format') == 'csv':
+        return Response(results_to_csv(results), mimetype='text/csv')
+    return jsonify({
+        'conditions': conditions,
+        'count': len(results),
+        'scored': sum(1 for r in results if 'predictions' in r),
+        'results': results,
+    })
+
+
+@server.route("/api/predict/batcher-stats", methods=["GET"])
+def batcher_stats():
+    return jsonify(batcher.stats())
+
+
+@server.route("/api/predict/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+
+# Readiness probe: 503 until the model has loaded and warmed up
+@server.route("/api/predict/ready", methods=["GET"])
+def model_ready():
+    registry.warm_up()
+    return jsonify(registry.state()), 200 if registry.is_ready else 503
@@ -6,6 +6,9 @@ import plotly.graph_objects as go
 from dash.exceptions import PreventUpdate
 import json
 
+from inference.sensitivity import sensitivity_sweep, strongest_effects
+from inference.registry import ModelNotReady, registry
+
 # Register this page
 dash.register_page(__name__, path='/results')
 
@@ -33,6 +36,9 @@ layout = dbc.Container([
              style={"display": "block", "backgroundColor": "#1A202C", 
                     "border": "1px solid #2C5282", "borderRadius": "5px", "padding": "10px"}),
     
+    # What-if sensitivity of each prediction to single input changes
+    html.Div(id="sensitivity-content", className="mb-4"),
+    
     # Navigation buttons
     dbc.Row([
         dbc.Col([
@@ -191,4 +197,59 @@ def update_results(data):
         })
     ])
     
-    return prediction_div, fig
\ No newline at end of file
+    return prediction_div, fig
+
+# Callback to show how each single input change moves each prediction
+@callback(
+    Output("sensitivity-content", "children"),
+    [Input("retrieved-data", "data")],
+)
+def update_sensitivity(data):
+    if not data or not data.get('features'):
+        return None
+    
+    try:
+        # All one-feature-changed variants are scored in one forward pass
+        sweep = sensitivity_sweep(registry.get(), data['features'])
+    except ModelNotReady:
+        return None
+    except Exception as e:
+        print(f"Error during sensitivity sweep: {e}")
+        return None
+    
+    features, delta, best_value = strongest_effects(sweep)
+    hover = [
+        [f"{feature} = {value}: {d * 100:+.1f} pts" if value is not None else f"{feature}: no change"
+         for d, value in zip(row, values)]
+        for feature, row, values in zip(features, delta, best_value)
+    ]
+    
+    fig = go.Figure(go.Heatmap(
+        z=delta * 100,
+        x=sweep['labels'],
+        y=features,
+        text=hover,
+        hoverinfo='text',
+        colorscale='RdBu_r',
+        zmid=0,
+        colorbar={'title': {'text': 'Change (pts)'}}
+    ))
+    fig.update_layout(
+        title={
+            'text': 'What-if: largest change from altering one input',
+            'font': {
+                'color': '#E0E0E0'
+            }
+        },
+        height=900,
+        margin=dict(l=20, r=20, t=40, b=20),
+        paper_bgcolor='rgba(26, 32, 44, 0.0)',
+        plot_bgcolor='rgba(26, 32, 44, 0.7)',
+        font={
+            'color': '#E0E0E0'
+        }
+    )
+    
+    return dcc.Graph(figure=fig,
+                     style={"backgroundColor": "#1A202C", "border": "1px solid #2C5282",
+                            "borderRadius": "5px", "padding": "10px"})
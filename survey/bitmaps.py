@@ -0,0 +1,178 @@
+"""Per-value bitmap indexes for filtering survey records.
+
+For every filter column and each of its values a packed bitmap (one bit per
+record) marks the records holding that value. A selection ORs the bitmaps of
+the chosen values within a column and ANDs the columns together, which is
+a few vectorised byte operations instead of boolean scans over the frame.
+
+Each bitmap is an append-only file shared by all dataset versions; an
+append only packs the bits of the new records (and of the partly filled
+last byte) and adds files for values not seen before.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from survey.cube import add_derived_columns, health_condition_cols
+from survey.files import map_array, map_for_write, write_atomic
+
+BITMAPS_DIR = "bitmaps"
+LEVELS_FILE = "levels.json"
+
+FILTER_COLUMNS = ['age_group', 'ACE1', 'SCREENTIME'] + health_condition_cols
+
+SOURCE_COLUMNS = ['SC_AGE_YEARS', 'ACE1', 'SCREENTIME'] + health_condition_cols
+
+
+def _bits_path(store, column, file):
+    return os.path.join(store.root, BITMAPS_DIR, column, f"{file}.bin")
+
+
+def _level_key(value):
+    """Numbers (and numeric strings) compare by value, other values as text."""
+    if isinstance(value, bool):
+        return ('text', str(value))
+    if isinstance(value, (int, float, str)):
+        try:
+            return ('number', float(value))
+        except ValueError:
+            pass
+    return ('text', str(value))
+
+
+class BitmapIndex:
+    """levels[column] lists a column's values in display order and
+    bits[column] holds their packed bitmaps, in the same order."""
+
+    def __init__(self, n_rows, levels, bits):
+        self.n_rows = n_rows
+        self.levels = levels
+        self.bits = bits
+
+    def options(self, column):
+        return list(self.levels[column])
+
+    def normalize(self, filters):
+        """filters with unknown columns and values dropped and the rest given
+        as the column's levels, in display order, so 1, 1.0 and "1" select
+        (and cache) the same way."""
+        normalized = {}
+        for column, values in (filters or {}).items():
+            if column not in self.levels or not isinstance(values, list):
+                continue
+            wanted = {_level_key(value) for value in values}
+            chosen = [level for level in self.levels[column] if _level_key(level) in wanted]
+            if chosen:
+                normalized[column] = chosen
+        return normalized
+
+    def select(self, filters):
+        """Packed bitmap of the records matching every filter.
+
+        filters maps a column to the values to keep; values of one column are
+        OR-ed, columns are AND-ed. Returns None when nothing is filtered.
+        """
+        selected = None
+        for column, values in filters.items():
+            if not values:
+                continue
+            chosen = [bits for bits, level in zip(self.bits[column], self.levels[column]) if level in values]
+            match = np.bitwise_or.reduce(chosen, axis=0) if chosen else np.zeros((self.n_rows + 7) // 8, np.uint8)
+            selected = match if selected is None else selected & match
+        return selected
+
+    def rows(self, filters):
+        """Positions of the records matching filters, or None when unfiltered."""
+        selected = self.select(filters)
+        if selected is None:
+            return None
+        return np.flatnonzero(np.unpackbits(selected, count=self.n_rows))
+
+    @classmethod
+    def load(cls, store):
+        with open(os.path.join(store.directory, LEVELS_FILE)) as f:
+            saved = json.load(f)
+        n_bytes = (saved['n_rows'] + 7) // 8
+        bits = {column: [map_array(_bits_path(store, column, file), np.uint8, n_bytes) for file in files]
+                for column, files in saved['files'].items()}
+        return cls(saved['n_rows'], saved['levels'], bits)
+
+
+def build_bitmaps(store, block_rows=1 << 18, previous=None):
+    """Index a SurveyStore block by block.
+
+    With previous (the SurveyStore version store extends), only the records
+    after previous's are read. The first pass collects each column's values,
+    the second packs each block's matches straight into memory-mapped bitmap
+    files, so memory is bounded by block_rows rather than the number of
+    records.
+    """
+    if block_rows % 8:
+        raise ValueError("block_rows must be a multiple of 8")
+    saved = {'levels': {column: [] for column in FILTER_COLUMNS}, 'files': {column: [] for column in FILTER_COLUMNS}}
+    start = 0
+    if previous is not None and os.path.exists(os.path.join(previous.directory, LEVELS_FILE)):
+        with open(os.path.join(previous.directory, LEVELS_FILE)) as f:
+            saved = json.load(f)
+        start = saved['n_rows']
+
+    def frames(first):
+        for block in range(first, store.n_rows, block_rows):
+            rows = slice(block, min(block + block_rows, store.n_rows))
+            yield rows, add_derived_columns(store.frame(SOURCE_COLUMNS, rows))
+
+    seen = {column: set(saved['levels'][column]) for column in FILTER_COLUMNS}
+    for _, frame in frames(start):
+        for column in FILTER_COLUMNS:
+            seen[column].update(frame[column].dropna().unique().tolist())
+    empty = add_derived_columns(store.frame(SOURCE_COLUMNS, slice(0, 0)))
+    categories = {column: list(empty[column].cat.categories) for column in FILTER_COLUMNS
+                  if isinstance(empty[column].dtype, pd.CategoricalDtype)}
+    # Categorical columns keep their category order (e.g. age groups); a new
+    # value gets the next file
+    levels, files = {}, {}
+    for column in FILTER_COLUMNS:
+        levels[column] = ([c for c in categories[column] if c in seen[column]] if column in categories
+                          else sorted(seen[column]))
+        known = dict(zip(saved['levels'][column], saved['files'][column]))
+        new_files = iter(range(len(known), len(levels[column])))
+        files[column] = [known[level] if level in known else next(new_files) for level in levels[column]]
+
+    # Rewrite from the start of the byte holding the first new record, so its
+    # bits already set are packed again along with the new ones
+    first = start - start % 8
+    bits = {column: [map_for_write(_bits_path(store, column, file), np.uint8, first // 8,
+                                   (store.n_rows + 7) // 8 - first // 8)
+                     for file in files[column]]
+            for column in FILTER_COLUMNS}
+    for rows, frame in frames(first):
+        for column in FILTER_COLUMNS:
+            # Values without a level (missing age groups) get code -1 and
+            # match no bitmap
+            codes = pd.Categorical(frame[column], categories=levels[column]).codes
+            matches = codes[None, :] == np.arange(len(levels[column]))[:, None]
+            packed = np.packbits(matches, axis=1)
+            offset = (rows.start - first) // 8
+            for i, array in enumerate(bits[column]):
+                array[offset:offset + packed.shape[1]] = packed[i]
+    for arrays in bits.values():
+        for array in arrays:
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    # Written last: its presence marks the index as complete
+    saved = {'n_rows': store.n_rows, 'levels': levels, 'files': files}
+    write_atomic(os.path.join(store.directory, LEVELS_FILE), lambda f: f.write(json.dumps(saved).encode()))
+
+
+def can_build(columns):
+    return all(column in columns for column in SOURCE_COLUMNS)
+
+
+def open_bitmaps(store):
+    """The bitmap index for a SurveyStore version, building it if missing."""
+    if not os.path.exists(os.path.join(store.directory, LEVELS_FILE)):
+        build_bitmaps(store)
+    return BitmapIndex.load(store)
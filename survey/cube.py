@@ -0,0 +1,354 @@
+"""Pre-aggregated cube of the survey data behind the Explorer statistics.
+
+Counts and per-measure sums / sums of squares are stored for every
+combination of the dimension values, so any group count, mean or standard
+deviation over those dimensions is a roll-up of a few thousand cells
+instead of a scan over every record. One cube is saved per dataset version;
+when records are appended, only their counts and sums are added to the
+previous version's cube.
+
+Survey-weighted estimates (Cube.estimates) use the sampling weight of every
+record, with confidence intervals from a rescaled bootstrap over random
+groups of records: the cube also keeps the weighted sums of each cell per
+group, so all replicates of any roll-up are one product of those group
+sums with a replicates x groups weight matrix.
+"""
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from survey.files import map_array, map_for_write, write_atomic
+
+CUBE_FILE = "cube.npz"
+# Code of every record in each dimension (one append-only file per
+# dimension, shared by all versions), so a subset of records can be
+# re-aggregated
+CODES_DIR = "cube"
+CODE_DTYPE = np.int16
+
+health_condition_cols = ['DIABETES', 'BLOOD', 'HEADACHE', 'HEART', 'K2Q35A',
+                         'K2Q30A', 'K2Q31A', 'K2Q32A', 'K2Q33A', 'K2Q34A',
+                         'K2Q40A', 'K2Q36A', 'K2Q37A']
+
+AGE_BINS = [0, 5, 10, 15, 20]
+AGE_LABELS = ['0-5', '6-10', '11-15', '16+']
+
+DIMENSIONS = ['SC_AGE_YEARS', 'ACE1', 'SCREENTIME', 'health_condition_count']
+MEASURES = ['A1_MENTHEALTH', 'A1_PHYSHEALTH', 'A1_GRADE']
+
+condition_labels = {
+    'DIABETES': 'Diabetes', 'BLOOD': 'Blood disorder', 'HEADACHE': 'Headaches',
+    'HEART': 'Heart condition', 'K2Q35A': 'Autism/ASD', 'K2Q30A': 'Learning disability',
+    'K2Q31A': 'ADD/ADHD', 'K2Q32A': 'Depression', 'K2Q33A': 'Anxiety',
+    'K2Q34A': 'Behavioral problems', 'K2Q40A': 'Asthma', 'K2Q36A': 'Developmental delay',
+    'K2Q37A': 'Speech/language disorder',
+}
+
+SOURCE_COLUMNS = ['SC_AGE_YEARS', 'ACE1', 'SCREENTIME'] + MEASURES + health_condition_cols
+
+# Sampling weight of each record (the NSCH final child weight); records
+# weigh 1 in data without it
+WEIGHT = 'FWC'
+
+# Records are dealt into REPLICATE_GROUPS random groups (a power of two) by
+# their position, so appended records never move existing ones; each of the
+# REPLICATES bootstrap replicates resamples whole groups
+REPLICATE_GROUPS = 32
+REPLICATES = 200
+CONFIDENCE = 0.95
+
+
+def age_groups(ages):
+    return pd.cut(ages, bins=AGE_BINS, labels=AGE_LABELS)
+
+
+def add_derived_columns(frame):
+    # Create age groups for better visualization
+    frame['age_group'] = age_groups(frame['SC_AGE_YEARS'])
+    frame['health_condition_count'] = frame[health_condition_cols].sum(axis=1)
+    return frame
+
+
+def replicate_groups(rows):
+    """Replicate group of the records at the given positions (a Fibonacci
+    hash of the position, so groups are well mixed but stable)."""
+    positions = np.asarray(rows, dtype=np.uint64)
+    shift = np.uint64(64 - REPLICATE_GROUPS.bit_length() + 1)
+    return ((positions * np.uint64(0x9E3779B97F4A7C15)) >> shift).astype(np.intp)
+
+
+def replicate_weights(replicates=REPLICATES, groups=REPLICATE_GROUPS, seed=0):
+    """Rescaled bootstrap weights, replicates x groups: each replicate draws
+    groups - 1 groups with replacement and scales by groups / (groups - 1)."""
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(groups - 1, np.full(groups, 1 / groups), size=replicates)
+    return draws * (groups / (groups - 1))
+
+
+def _aggregate(cells, values, shape, rows):
+    size = int(np.prod(shape))
+
+    def total(weights=None):
+        return np.bincount(cells, weights=weights, minlength=size).reshape(shape)
+
+    # Weighted sums per cell and replicate group
+    grouped = cells * REPLICATE_GROUPS + replicate_groups(rows)
+
+    def by_group(weights):
+        return np.bincount(grouped, weights=weights, minlength=size * REPLICATE_GROUPS).reshape(
+            shape + (REPLICATE_GROUPS,))
+
+    weights = np.asarray(values[WEIGHT], dtype=np.float64) if WEIGHT in values else np.ones(len(cells))
+    sums, sumsq, weighted = {}, {}, {}
+    for measure in MEASURES:
+        column = np.asarray(values[measure], dtype=np.float64)
+        sums[measure] = total(column)
+        sumsq[measure] = total(column * column)
+        weighted[measure] = by_group(weights * column)
+    return total().astype(np.int64), sums, sumsq, by_group(weights), weighted
+
+
+class Cube:
+    """Dense count/sum/sumsq arrays indexed by the codes of each dimension.
+
+    `weight` and `weighted` hold the sum of weights and the weighted measure
+    sums, with a trailing axis for the replicate groups. Levels are in the
+    order they were first seen (appends add new ones at the end); roll-ups
+    are sorted. `codes` (every record's code in each dimension) and `values`
+    (the measure and weight columns) are only needed for subset().
+    """
+
+    def __init__(self, levels, count, sums, sumsq, weight, weighted, codes=None, values=None):
+        self.levels = levels
+        self.count = count
+        self.sums = sums
+        self.sumsq = sumsq
+        self.weight = weight
+        self.weighted = weighted
+        self.codes = codes
+        self.values = values
+
+    def subset(self, rows):
+        """The cube of only the records at the given positions."""
+        cells = np.ravel_multi_index([np.asarray(codes[rows]) for codes in self.codes], self.count.shape)
+        values = {name: column[rows] for name, column in self.values.items()}
+        return Cube(self.levels, *_aggregate(cells, values, self.count.shape, rows))
+
+    @property
+    def total(self):
+        return int(self.count.sum())
+
+    def observed(self, dim):
+        """Values of a dimension that occur in at least one record."""
+        axis = DIMENSIONS.index(dim)
+        other = tuple(i for i in range(len(DIMENSIONS)) if i != axis)
+        return self.levels[dim][self.count.sum(axis=other) > 0]
+
+    def _rollup(self, by, arrays):
+        """Sum cell arrays (name -> array shaped like the cube, optionally
+        with a trailing replicate group axis, split into columns 'name/g')
+        over the dimensions not in `by`."""
+        by = list(by)
+        base = ['SC_AGE_YEARS' if dim == 'age_group' else dim for dim in by]
+        keep = [dim for dim in DIMENSIONS if dim in base]
+        axes = tuple(i for i, dim in enumerate(DIMENSIONS) if dim not in keep)
+
+        columns = {}
+        for name, array in arrays.items():
+            total = array.sum(axis=axes)
+            if array.ndim > len(DIMENSIONS):
+                total = total.reshape(-1, array.shape[-1])
+                columns.update({f'{name}/{g}': total[:, g] for g in range(total.shape[1])})
+            else:
+                columns[name] = total.ravel()
+        if keep:
+            index = pd.MultiIndex.from_product([self.levels[dim] for dim in keep], names=keep)
+            frame = pd.DataFrame(columns, index=index).reset_index()
+            frame = frame[frame['count'] > 0].sort_values(keep, kind='stable')
+        else:
+            frame = pd.DataFrame(columns)
+
+        if 'age_group' in by:
+            frame['age_group'] = age_groups(frame['SC_AGE_YEARS'])
+            frame = (frame.drop(columns='SC_AGE_YEARS')
+                     .groupby(by, observed=False).sum(numeric_only=True)
+                     .reset_index())
+        return frame
+
+    def rollup(self, by=()):
+        """Group counts, sums, means and standard deviations over `by`.
+
+        `by` holds dimension names, plus 'age_group' which is derived from
+        SC_AGE_YEARS. Groups without records are dropped, except that every
+        age group is kept (like groupby(observed=False) on the categorical).
+        """
+        by = list(by)
+        arrays = {'count': self.count}
+        for measure in MEASURES:
+            arrays[f'{measure}_sum'] = self.sums[measure]
+            arrays[f'{measure}_sumsq'] = self.sumsq[measure]
+        frame = self._rollup(by, arrays)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for measure in MEASURES:
+                mean = frame[f'{measure}_sum'] / frame['count']
+                variance = frame[f'{measure}_sumsq'] / frame['count'] - mean ** 2
+                frame[f'{measure}_mean'] = mean
+                frame[f'{measure}_std'] = np.sqrt(variance.clip(lower=0))
+        return frame[by + [c for c in frame.columns if c not in by]].reset_index(drop=True)
+
+    def estimates(self, by=(), confidence=CONFIDENCE):
+        """Survey-weighted estimates over `by` (as in rollup) with confidence
+        intervals.
+
+        Per group: `count` (records), `population` (sum of weights), `share`
+        (percent of the total weight) and each measure's weighted `_mean`,
+        each with `_low` and `_high` bounds. Replicate estimates come from
+        the per-group sums times the replicate weight matrix; the interval is
+        the estimate plus or minus z standard errors of the replicates.
+        """
+        by = list(by)
+        arrays = {'count': self.count, 'weight': self.weight}
+        arrays.update({f'{measure}_weighted': self.weighted[measure] for measure in MEASURES})
+        frame = self._rollup(by, arrays)
+
+        replicates = replicate_weights().T
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        def groups(name):
+            return frame[[f'{name}/{g}' for g in range(REPLICATE_GROUPS)]].to_numpy()
+
+        result = frame[by + ['count']].copy()
+
+        def add(name, estimate, replicated):
+            error = z * replicated.std(axis=1, ddof=1)
+            result[name], result[f'{name}_low'], result[f'{name}_high'] = estimate, estimate - error, estimate + error
+
+        weight = groups('weight')
+        population, replicated_population = weight.sum(axis=1), weight @ replicates
+        with np.errstate(invalid='ignore', divide='ignore'):
+            add('population', population, replicated_population)
+            add('share', 100 * population / population.sum(),
+                100 * replicated_population / replicated_population.sum(axis=0))
+            for measure in MEASURES:
+                weighted = groups(f'{measure}_weighted')
+                add(f'{measure}_mean', weighted.sum(axis=1) / population,
+                    (weighted @ replicates) / replicated_population)
+        return result.reset_index(drop=True)
+
+    def save(self, directory):
+        arrays = {'count': self.count, 'weight': self.weight}
+        for dim in DIMENSIONS:
+            arrays[f'levels/{dim}'] = self.levels[dim]
+        for measure in MEASURES:
+            arrays[f'sum/{measure}'] = self.sums[measure]
+            arrays[f'sumsq/{measure}'] = self.sumsq[measure]
+            arrays[f'weighted/{measure}'] = self.weighted[measure]
+        write_atomic(os.path.join(directory, CUBE_FILE), lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, directory, codes=None, values=None):
+        """Load a saved cube; pass the dimension codes and the measure and
+        weight columns to enable subset()."""
+        with np.load(os.path.join(directory, CUBE_FILE)) as arrays:
+            levels = {dim: arrays[f'levels/{dim}'] for dim in DIMENSIONS}
+            sums = {m: arrays[f'sum/{m}'] for m in MEASURES}
+            sumsq = {m: arrays[f'sumsq/{m}'] for m in MEASURES}
+            weighted = {m: arrays[f'weighted/{m}'] for m in MEASURES}
+            count, weight = arrays['count'], arrays['weight']
+        return cls(levels, count, sums, sumsq, weight, weighted, codes=codes, values=values)
+
+
+def _dimension_values(frame, dim, levels=None):
+    values = np.asarray(frame[dim])
+    if values.dtype == object or (levels is not None and levels.dtype.kind == 'U'):
+        values = values.astype(str)
+    return values
+
+
+def _codes_path(store, dim):
+    return os.path.join(store.root, CODES_DIR, f"{dim}.bin")
+
+
+def build_cube(store, block_rows=1 << 18, previous=None):
+    """Aggregate a SurveyStore block by block and save the cube into its directory.
+
+    With previous (the SurveyStore version store extends), only the records
+    after previous's are read and added to its cube. The first pass collects
+    the values of each dimension; the second writes every record's codes and
+    adds each block's bincounts into the cube. Memory is bounded by
+    block_rows, not by the number of records.
+    """
+    base = None
+    if previous is not None and os.path.exists(os.path.join(previous.directory, CUBE_FILE)):
+        base = Cube.load(previous.directory)
+    start = previous.n_rows if base is not None else 0
+    blocks = [slice(block, min(block + block_rows, store.n_rows))
+              for block in range(start, store.n_rows, block_rows)]
+
+    columns = SOURCE_COLUMNS + [WEIGHT] * (WEIGHT in store.columns)
+
+    def frames():
+        for rows in blocks:
+            yield rows, add_derived_columns(store.frame(columns, rows))
+
+    # Values not seen before go after the known levels
+    levels = {dim: base.levels[dim] if base is not None else np.array([]) for dim in DIMENSIONS}
+    for _, frame in frames():
+        for dim in DIMENSIONS:
+            values = np.setdiff1d(np.unique(_dimension_values(frame, dim)), levels[dim])
+            levels[dim] = np.concatenate([levels[dim], values]) if len(levels[dim]) else values
+    if any(len(levels[dim]) > np.iinfo(CODE_DTYPE).max for dim in DIMENSIONS):
+        raise ValueError(f"a cube dimension has more than {np.iinfo(CODE_DTYPE).max} values")
+
+    shape = tuple(len(levels[dim]) for dim in DIMENSIONS)
+    count = np.zeros(shape, dtype=np.int64)
+    sums = {measure: np.zeros(shape) for measure in MEASURES}
+    sumsq = {measure: np.zeros(shape) for measure in MEASURES}
+    weight = np.zeros(shape + (REPLICATE_GROUPS,))
+    weighted = {measure: np.zeros(shape + (REPLICATE_GROUPS,)) for measure in MEASURES}
+    if base is not None:
+        known = tuple(slice(0, n) for n in base.count.shape)
+        count[known] = base.count
+        weight[known] = base.weight
+        for measure in MEASURES:
+            sums[measure][known] = base.sums[measure]
+            sumsq[measure][known] = base.sumsq[measure]
+            weighted[measure][known] = base.weighted[measure]
+
+    codes = {dim: map_for_write(_codes_path(store, dim), CODE_DTYPE, start, store.n_rows - start)
+             for dim in DIMENSIONS}
+    indexes = {dim: pd.Index(levels[dim]) for dim in DIMENSIONS}
+    for rows, frame in frames():
+        block_codes = [indexes[dim].get_indexer(_dimension_values(frame, dim, levels[dim])) for dim in DIMENSIONS]
+        for dim, block in zip(DIMENSIONS, block_codes):
+            codes[dim][rows.start - start:rows.stop - start] = block
+        block = np.ravel_multi_index(block_codes, shape)
+        values = {name: frame[name].to_numpy() for name in columns if name in MEASURES or name == WEIGHT}
+        block_count, block_sums, block_sumsq, block_weight, block_weighted = _aggregate(
+            block, values, shape, np.arange(rows.start, rows.stop))
+        count += block_count
+        weight += block_weight
+        for measure in MEASURES:
+            sums[measure] += block_sums[measure]
+            sumsq[measure] += block_sumsq[measure]
+            weighted[measure] += block_weighted[measure]
+    for array in codes.values():
+        if isinstance(array, np.memmap):
+            array.flush()
+    Cube(levels, count, sums, sumsq, weight, weighted).save(store.directory)
+
+
+def can_build(columns):
+    return all(column in columns for column in SOURCE_COLUMNS)
+
+
+def open_cube(store):
+    """The cube for a SurveyStore version, building it if the cache predates it."""
+    if not os.path.exists(os.path.join(store.directory, CUBE_FILE)):
+        build_cube(store)
+    codes = [map_array(_codes_path(store, dim), CODE_DTYPE, store.n_rows) for dim in DIMENSIONS]
+    values = {name: store.array(name) for name in MEASURES + [WEIGHT] if name in store.columns}
+    return Cube.load(store.directory, codes, values)
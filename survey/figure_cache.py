@@ -0,0 +1,159 @@
+"""Size-bounded LRU of rendered figure JSON, backed by files on disk.
+
+Explorer figures are pure functions of (dataset version, chart, filters), so
+the cache key doubles as an HTTP ETag: a request whose If-None-Match holds
+the key can be answered 304 without building or even loading the figure.
+Both the memory and the disk copies are bounded; the least recently used
+figures are dropped first.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from survey.files import write_atomic
+
+
+def normalize_filters(filters):
+    """Drop empty filters and sort values, so equal selections share a key."""
+    return {column: sorted(values, key=str) for column, values in sorted((filters or {}).items()) if values}
+
+
+class FigureCache:
+    """Figure JSON by key, LRU in memory up to max_bytes and persisted in
+    directory (if given) up to max_disk_bytes, so restarts and other workers
+    reuse it. lookups (a metrics Counter, optional) is incremented with
+    result=memory, disk or miss on every get, so counts can outlive the cache.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 2**20, max_disk_bytes=256 * 2**20, lookups=None):
+        self.directory = directory
+        self.lookups = lookups
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    @staticmethod
+    def key(version, chart, filters):
+        payload = json.dumps([version, chart, normalize_filters(filters)], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _disk_entries(self):
+        """(mtime, path, size) of every figure file; the mtime of a file is
+        refreshed when it is read, so it orders the files by last use."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _trim_disk(self):
+        """Delete the least recently used files until the directory is back
+        to 3/4 of max_disk_bytes. The directory is listed again, since other
+        workers write to it too."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_disk_bytes * 3 // 4:
+                break
+            try:
+                os.unlink(path)
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                pass  # Removed by another worker
+            total -= size
+        self._disk_bytes = total
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key)) as f:
+                text = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            return None
+        return text
+
+    def _remember(self, key, text):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        self._bytes += len(text)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key, build):
+        """Return the figure JSON for key, calling build() (a figure) on a miss."""
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._count('memory')
+                return text
+
+        text = self._read_disk(key) if self.directory else None
+        if text is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._remember(key, text)
+            self._count('disk')
+            return text
+
+        text = pio.to_json(build(), validate=False)
+        if self.directory:
+            write_atomic(self._path(key), lambda f: f.write(text.encode()))
+        with self._lock:
+            self.misses += 1
+            self._remember(key, text)
+            if self.directory:
+                self._disk_bytes += len(text)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._trim_disk()
+        self._count('miss')
+        return text
+
+    def _count(self, result):
+        if self.lookups is not None:
+            self.lookups.inc(result=result)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes,
+                'disk_evictions': self.disk_evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,52 @@
+"""File helpers shared by the survey cache writers."""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+def write_atomic(path, write):
+    """Call write(f) on a temporary file next to path, then rename it over path
+    so readers never see half a file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def column_file_name(column, extension='.npy'):
+    # Column names become file names; keep them safe and unique
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in column)
+    return f"{safe}-{hashlib.sha1(column.encode()).hexdigest()[:8]}{extension}"
+
+
+def map_for_write(path, dtype, start, length, fresh=False):
+    """Memory-map items [start, start + length) of a raw array file for writing.
+
+    Data files are append-only: earlier dataset versions keep reading their
+    prefix (possibly memory-mapped) while later rows are written past it, so
+    an existing file is grown but never shrunk. A missing file, or with fresh
+    one no published version refers to yet, is created zero-filled.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb' if fresh or not os.path.exists(path) else 'r+b') as f:
+        end = (start + length) * itemsize
+        if os.fstat(f.fileno()).st_size < end:
+            f.truncate(end)
+    if not length:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r+', offset=start * itemsize, shape=(length,))
+
+
+def map_array(path, dtype, length):
+    """The first length items of a raw array file, memory-mapped read-only."""
+    if not length:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
@@ -0,0 +1,615 @@
+"""Columnar, type-downcast on-disk cache of the survey CSVs.
+
+One or more CSVs (e.g. several survey years) are parsed once per content
+hash into one raw array file per column: integer codes are stored in the
+smallest integer type that holds them, other numbers as float32 where that
+is exact and text as categorical codes. Later loads read only the columns
+they ask for, memory-mapped. The Explorer's aggregate cube (survey.cube) and
+filter bitmaps (survey.bitmaps) are built in the same job and stored
+alongside.
+
+Ingest streams the CSVs in chunks of rows, so its memory is bounded by the
+chunk size rather than the size of the data:
+
+    python -m survey.store nsch_2021.csv nsch_2022.csv nsch_2023.csv
+
+New batches of records are appended to a dataset without re-reading it:
+
+    python -m survey.store nsch_2021.csv --append batch.csv
+
+Each append publishes a new numbered version (a manifest plus the small
+aggregates) and then moves the CURRENT pointer to it. The data files are
+shared: rows are only ever written past the end of a file, so every version
+reads its own prefix and older versions stay valid while readers still use
+them. A column is rewritten only when new values do not fit its type.
+Replaced versions, and datasets built from earlier contents of the CSVs,
+are deleted only once they have been out of use for STALE_SECONDS.
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from filelock import FileLock
+
+from survey import bitmaps, cube, table
+from survey.files import column_file_name, map_array, map_for_write, write_atomic
+
+SOURCE_PATH = "datajoined.csv"
+CACHE_DIR = ".cache/survey"
+
+MANIFEST = "manifest.json"
+# Name of the current version, under the dataset directory
+CURRENT = "CURRENT"
+VERSIONS_DIR = "versions"
+COLUMNS_DIR = "columns"
+# Held while a version is being added to a dataset
+LOCK_FILE = ".lock"
+# Name of the dataset that replaced this one (the CSVs changed), under the
+# dataset directory
+SUPERSEDED = "SUPERSEDED"
+
+# Part of the content hash; bump when the cache layout changes
+FORMAT_VERSION = 4
+
+# Versions kept after an append, so workers still reading an older one can
+# finish before they notice the new one
+KEEP_VERSIONS = 3
+
+# How long (seconds) a replaced version or dataset is kept before it is
+# deleted; workers move off it within CHECK_SECONDS, so this only has to
+# outlast requests still reading it
+STALE_SECONDS = 3600.0
+
+# How often (seconds) a running worker checks for a new version
+CHECK_SECONDS = 2.0
+
+# Rows parsed per CSV chunk and aggregated per block (a multiple of 8, so
+# blocks of the filter bitmaps start on byte boundaries)
+CHUNK_ROWS = 1 << 16
+
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def source_paths(csv_paths):
+    return [csv_paths] if isinstance(csv_paths, (str, os.PathLike)) else list(csv_paths)
+
+
+def source_hash(csv_paths):
+    digest = hashlib.sha256(f"survey-store/{FORMAT_VERSION}".encode())
+    for path in source_paths(csv_paths):
+        digest.update(b"\0")
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def read_chunks(csv_paths, chunk_rows=CHUNK_ROWS, text_columns=(), column=None):
+    """Yield the CSVs as DataFrames in order, reading text_columns as strings."""
+    usecols = None if column is None else (lambda name: name == column)
+    for path in source_paths(csv_paths):
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=usecols,
+                               dtype={name: str for name in text_columns})
+
+
+def _is_numeric(values):
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+
+class ColumnStats:
+    """Running summary of one column over all chunks, enough to choose its
+    stored dtype before any of it is written."""
+
+    def __init__(self):
+        self.text = False
+        self.low, self.high = np.inf, -np.inf
+        self.integral = True
+        self.float32 = True
+        self.categories = set()
+        # Chunks parsed as numbers have no raw strings to collect; a column
+        # that also has text chunks is re-read as strings for its categories
+        self.numeric_chunks = False
+
+    @property
+    def rescan(self):
+        return self.text and self.numeric_chunks
+
+    def update(self, values):
+        if not _is_numeric(values):
+            self.text = True
+            self.categories.update(values.fillna('0').astype(str).unique())
+            return
+        self.numeric_chunks = True
+        array = values.fillna(0).to_numpy()
+        if self.text or not len(array):
+            return
+        self.low, self.high = min(self.low, array.min()), max(self.high, array.max())
+        if self.float32 and max(abs(self.low), abs(self.high)) > 2 ** 24:
+            # Not every integer this large is exact in float32
+            self.float32 = False
+        if np.issubdtype(array.dtype, np.floating):
+            if self.integral and not np.array_equal(array, np.round(array)):
+                self.integral = False
+            if self.float32 and not np.array_equal(array.astype(np.float32).astype(array.dtype), array):
+                self.float32 = False
+
+    def include_fill(self):
+        """Account for the 0 filled in where a file lacks this column."""
+        self.categories.add('0')
+        self.low, self.high = min(self.low, 0), max(self.high, 0)
+
+    def spec(self):
+        if self.text:
+            categories = sorted(self.categories)
+            dtype = next(t for t in INT_TYPES if len(categories) < np.iinfo(t).max)
+            return {'kind': 'categorical', 'categories': categories, 'dtype': np.dtype(dtype).str}
+        if not self.integral:
+            return {'kind': 'float', 'dtype': np.dtype(np.float32 if self.float32 else np.float64).str}
+        low, high = (self.low, self.high) if self.low <= self.high else (0, 0)
+        dtype = next((t for t in INT_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max), None)
+        if dtype is None:
+            return {'kind': 'float', 'dtype': np.dtype(np.float64).str}
+        return {'kind': 'int', 'dtype': np.dtype(dtype).str}
+
+
+    def fits(self, spec):
+        """Whether the values seen can be appended to a column stored as spec."""
+        if self.low > self.high:
+            return True
+        dtype = np.dtype(spec['dtype'])
+        if spec['kind'] == 'int':
+            info = np.iinfo(dtype)
+            return self.integral and info.min <= self.low and self.high <= info.max
+        return dtype == np.float64 or self.float32
+
+
+def extend_spec(spec, stats, stored):
+    """The spec of a stored column after appending the values in stats.
+
+    The dtype is kept when the new values fit it, so the column is appended
+    to in place; otherwise it is widened (and the column rewritten), taking
+    the stored values into account. Categories only ever grow at the end, so
+    the codes already stored keep their meaning.
+    """
+    if spec['kind'] == 'categorical':
+        categories = spec['categories'] + sorted(stats.categories - set(spec['categories']))
+        dtype = np.dtype(spec['dtype'])
+        if len(categories) >= np.iinfo(dtype).max:
+            dtype = next(t for t in INT_TYPES if len(categories) < np.iinfo(t).max)
+        return {'kind': 'categorical', 'categories': categories, 'dtype': np.dtype(dtype).str}
+    if stats.text:
+        raise ValueError("a numeric column received text; ingest the files again from scratch")
+    if stats.fits(spec):
+        return {key: spec[key] for key in ('kind', 'dtype')}
+    for start in range(0, len(stored), CHUNK_ROWS):
+        stats.update(pd.Series(stored[start:start + CHUNK_ROWS]))
+    return stats.spec()
+
+
+def encode(values, spec):
+    """Convert a chunk of one column to its stored representation."""
+    # Same cleaning the Explorer has always applied: missing values become 0
+    if spec['kind'] == 'categorical':
+        codes = pd.Categorical(values.fillna('0').astype(str), categories=spec['categories']).codes
+        return codes.astype(spec['dtype'])
+    return values.fillna(0).to_numpy().astype(spec['dtype'])
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scan(csv_paths, chunk_rows=CHUNK_ROWS, text_columns=()):
+    """First pass over the CSVs: (ColumnStats by column, rows, text columns)."""
+    paths = source_paths(csv_paths)
+    stats, n_rows, file_columns = {}, 0, []
+    for path in paths:
+        seen = set()
+        for chunk in read_chunks(path, chunk_rows, text_columns):
+            n_rows += len(chunk)
+            seen.update(chunk.columns)
+            for name in chunk.columns:
+                stats.setdefault(name, ColumnStats()).update(chunk[name])
+        file_columns.append(seen)
+    text_columns = sorted(set(text_columns) | {name for name, column in stats.items() if column.text})
+    for name, column in stats.items():
+        if column.rescan:
+            for chunk in read_chunks(paths, chunk_rows, text_columns, column=name):
+                if name in chunk:
+                    column.categories.update(chunk[name].fillna('0').unique())
+        if any(name not in seen for seen in file_columns):
+            column.include_fill()
+    return stats, n_rows, text_columns
+
+
+def _add_version(root, csv_paths, chunk_rows, previous=None, identity=None):
+    """Write the version of the dataset in root holding the rows of previous
+    (a SurveyStore, or None for the first version) followed by those of the
+    CSVs, then make it the current version. Returns its directory.
+    """
+    started = time.perf_counter()
+    paths = source_paths(csv_paths)
+    old_columns = previous.manifest['columns'] if previous is not None else {}
+    n_old = previous.n_rows if previous is not None else 0
+    stats, n_new, text_columns = scan(
+        paths, chunk_rows, [name for name, spec in old_columns.items() if spec['kind'] == 'categorical'])
+    for name in old_columns:
+        if name not in stats:
+            stats[name] = ColumnStats()
+            stats[name].include_fill()
+    if n_old:
+        for name in stats:
+            if name not in old_columns:
+                stats[name].include_fill()
+
+    number = previous.manifest['version'] + 1 if previous is not None else 1
+    versions = os.path.join(root, VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=versions, prefix='.staging-')
+    try:
+        columns, arrays = {}, {}
+        for name, column in stats.items():
+            old = old_columns.get(name)
+            spec = column.spec() if old is None else extend_spec(old, column, previous.array(name))
+            if old is not None and (spec['kind'], spec['dtype']) == (old['kind'], old['dtype']):
+                # Fits: the new rows go after the existing ones
+                spec['file'] = old['file']
+                arrays[name] = map_for_write(os.path.join(root, spec['file']), spec['dtype'], n_old, n_new)
+            else:
+                # New or widened: a new file, starting with the existing rows
+                # converted (or filled in)
+                spec['file'] = f"{COLUMNS_DIR}/{column_file_name(name, f'.{number}.bin')}"
+                array = map_for_write(os.path.join(root, spec['file']), spec['dtype'], 0, n_old + n_new, fresh=True)
+                fill = encode(pd.Series([np.nan]), spec)[0]
+                for start in range(0, n_old, chunk_rows):
+                    stop = min(start + chunk_rows, n_old)
+                    array[start:stop] = fill if old is None else previous.array(name)[start:stop]
+                arrays[name] = array[n_old:]
+            columns[name] = spec
+
+        start = 0
+        for chunk in read_chunks(paths, chunk_rows, text_columns):
+            stop = start + len(chunk)
+            for name, spec in columns.items():
+                raw = chunk[name] if name in chunk else pd.Series(np.nan, index=chunk.index)
+                arrays[name][start:stop] = encode(raw, spec)
+            start = stop
+        for array in arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+        del arrays
+
+        manifest = dict(previous.manifest if previous is not None else identity)
+        manifest.update({'version': number, 'n_rows': n_old + n_new, 'columns': columns})
+        manifest.setdefault('appends', [])
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        # Aggregates and indexes for the Explorer, when the columns exist;
+        # only the new rows are read, block by block
+        staged = SurveyStore(staging)
+        if cube.can_build(staged.columns):
+            cube.build_cube(staged, chunk_rows, previous)
+        if bitmaps.can_build(staged.columns):
+            bitmaps.build_bitmaps(staged, chunk_rows, previous)
+        if previous is not None:
+            table.extend_orders(previous, staged)
+
+        job = {
+            'chunk_rows': chunk_rows,
+            'seconds': round(time.perf_counter() - started, 3),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        if previous is None:
+            manifest['ingest'] = job
+        else:
+            batch = {'sources': [os.path.abspath(path) for path in paths],
+                     'source_hash': source_hash(paths), 'n_rows': n_new}
+            manifest['appends'] = manifest['appends'] + [dict(batch, **job)]
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        directory = os.path.join(versions, f"{number:06d}")
+        os.rename(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    write_atomic(os.path.join(root, CURRENT), lambda f: f.write(os.path.basename(directory).encode()))
+    return directory
+
+
+def current_directory(root):
+    """Directory of the current version of the dataset in root."""
+    with open(os.path.join(root, CURRENT)) as f:
+        return os.path.join(root, VERSIONS_DIR, f.read().strip())
+
+
+def ingest(csv_paths=SOURCE_PATH, cache_dir=CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """Convert the CSVs into the columnar cache and return the dataset directory.
+
+    Two streaming passes over the CSVs: the first counts rows and collects
+    each column's value range or categories, the second (reading text
+    columns as strings) writes the encoded chunks into preallocated
+    memory-mapped column files.
+    """
+    paths = source_paths(csv_paths)
+    sources = [os.path.abspath(path) for path in paths]
+    digest = source_hash(paths)
+    target = os.path.join(cache_dir, digest[:16])
+    if os.path.exists(os.path.join(target, CURRENT)):
+        # The files may have gone back to these contents
+        try:
+            os.remove(os.path.join(target, SUPERSEDED))
+        except FileNotFoundError:
+            pass
+        retire_datasets(cache_dir, target, sources)
+        return target
+
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=cache_dir, prefix='.ingest-')
+    try:
+        _add_version(staging, paths, chunk_rows, identity={'sources': sources, 'source_hash': digest})
+        # Publish atomically; another process may have won the race
+        try:
+            os.rename(staging, target)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    retire_datasets(cache_dir, target, sources)
+    return target
+
+
+def _dataset_sources(root):
+    """The sources recorded in the manifest of the dataset in root, or None."""
+    try:
+        manifest_path = os.path.join(current_directory(root), MANIFEST)
+    except OSError:
+        # Layout before versions
+        manifest_path = os.path.join(root, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest.get('sources', [manifest.get('source')])
+
+
+def retire_datasets(cache_dir, target, sources, stale_seconds=STALE_SECONDS):
+    """Retire the datasets built from earlier contents of the same files.
+
+    A replaced dataset is first marked SUPERSEDED, naming target, so running
+    workers follow it to the new one; it is deleted once the mark is older
+    than stale_seconds.
+    """
+    now = time.time()
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry == os.path.basename(target) or entry.startswith('.') or not os.path.isdir(path):
+            continue
+        marker = os.path.join(path, SUPERSEDED)
+        try:
+            if now - os.path.getmtime(marker) >= stale_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        except FileNotFoundError:
+            pass
+        if _dataset_sources(path) == sources:
+            write_atomic(marker, lambda f: f.write(os.path.basename(target).encode()))
+
+
+def latest_root(root):
+    """The dataset that root was replaced by, following SUPERSEDED marks,
+    or root itself."""
+    seen = {root}
+    while True:
+        try:
+            with open(os.path.join(root, SUPERSEDED)) as f:
+                successor = os.path.join(os.path.dirname(root), f.read().strip())
+        except FileNotFoundError:
+            return root
+        if successor in seen:
+            return root
+        seen.add(successor)
+        root = successor
+
+
+def find_root(cache_dir, sources):
+    """The live (not superseded) dataset in cache_dir built from sources, or None."""
+    try:
+        entries = sorted(os.listdir(cache_dir))
+    except FileNotFoundError:
+        return None
+    for entry in entries:
+        path = os.path.join(cache_dir, entry)
+        if (not entry.startswith('.') and os.path.exists(os.path.join(path, CURRENT))
+                and not os.path.exists(os.path.join(path, SUPERSEDED))
+                and _dataset_sources(path) == sources):
+            return path
+    return None
+
+
+def append(root, csv_paths, chunk_rows=CHUNK_ROWS):
+    """Append the records of the CSVs to the dataset in root and return the
+    directory of the new version.
+
+    Only the new records are read: columns are extended in place where the
+    values fit, and the cube, bitmaps and sort orders are updated from the
+    new rows. Appends are serialised by a lock, and a batch already appended
+    (same contents) is not added twice.
+    """
+    with FileLock(os.path.join(root, LOCK_FILE)):
+        previous = SurveyStore(current_directory(root))
+        digest = source_hash(csv_paths)
+        if any(batch['source_hash'] == digest for batch in previous.manifest['appends']):
+            return previous.directory
+        directory = _add_version(root, csv_paths, chunk_rows, previous)
+        prune_versions(root)
+    return directory
+
+
+def prune_versions(root, keep=KEEP_VERSIONS, stale_seconds=STALE_SECONDS):
+    """Delete the versions beyond the newest keep that were replaced more
+    than stale_seconds ago, the column files only they used, and anything
+    left by interrupted appends (called under the append lock)."""
+    versions = os.path.join(root, VERSIONS_DIR)
+    names = sorted(os.listdir(versions))
+    for name in names:
+        if name.startswith('.'):
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+    names = [name for name in names if not name.startswith('.')]
+    now = time.time()
+    kept = names[-keep:]
+    for name, successor in zip(names[:-keep], names[1:]):
+        # A version stopped being current when its successor was published
+        replaced = os.path.getmtime(os.path.join(versions, successor, MANIFEST))
+        if now - replaced >= stale_seconds:
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+        else:
+            kept.append(name)
+
+    used = set()
+    for name in kept:
+        with open(os.path.join(versions, name, MANIFEST)) as f:
+            used.update(spec['file'] for spec in json.load(f)['columns'].values())
+    for name in os.listdir(os.path.join(root, COLUMNS_DIR)):
+        if f"{COLUMNS_DIR}/{name}" not in used:
+            os.remove(os.path.join(root, COLUMNS_DIR, name))
+
+
+class SurveyStore:
+    """Read-only view of one version of the survey data."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Data files are shared by all versions, in the dataset directory
+        self.root = os.path.dirname(os.path.dirname(os.path.abspath(directory)))
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def version(self):
+        return f"{self.manifest['source_hash'][:12]}-{self.manifest['version']}"
+
+    @property
+    def n_rows(self):
+        return self.manifest['n_rows']
+
+    @property
+    def columns(self):
+        return list(self.manifest['columns'])
+
+    def array(self, name):
+        """The stored (compact) array for a column, memory-mapped read-only."""
+        spec = self.manifest['columns'][name]
+        return map_array(os.path.join(self.root, spec['file']), spec['dtype'], self.n_rows)
+
+    def column(self, name, rows=slice(None)):
+        """A column as a pandas Series, decoding categorical columns."""
+        spec = self.manifest['columns'][name]
+        values = np.asarray(self.array(name)[rows])
+        if spec['kind'] == 'categorical':
+            values = pd.Categorical.from_codes(values, categories=spec['categories'])
+        return pd.Series(values, name=name)
+
+    def frame(self, columns=None, rows=slice(None)):
+        """A DataFrame of the requested columns (all by default)."""
+        names = self.columns if columns is None else columns
+        return pd.DataFrame({name: self.column(name, rows) for name in names})
+
+    def head(self, n=5):
+        return self.frame(rows=slice(0, n))
+
+
+def open_store(csv_paths=SOURCE_PATH, cache_dir=CACHE_DIR):
+    """Open the current version of the columnar cache for one or more CSVs,
+    ingesting them first if any of them changed."""
+    return SurveyStore(current_directory(ingest(csv_paths, cache_dir)))
+
+
+class CurrentVersion:
+    """What a worker serves from a dataset, following it across appends.
+
+    load(store) builds it from a SurveyStore. get() returns the latest one,
+    checking the CURRENT pointer at most every interval seconds; when it has
+    moved, the request that noticed loads the new version while the others
+    keep serving the previous one, and the swap is a single assignment. A
+    caller should take one get() per request so it sees a single version.
+    """
+
+    def __init__(self, store, load, interval=CHECK_SECONDS):
+        self.load = load
+        self.interval = interval
+        self._root = store.root
+        self._sources = store.manifest.get('sources')
+        self._directory = store.directory
+        self._value = load(store)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked >= self.interval and self._lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                root = latest_root(self._root)
+                try:
+                    directory = current_directory(root)
+                except FileNotFoundError:
+                    # The dataset was deleted under us: keep serving what
+                    # was loaded until the one that replaced it turns up
+                    root = find_root(os.path.dirname(self._root), self._sources)
+                    if root is None:
+                        return self._value
+                    directory = current_directory(root)
+                if directory != self._directory:
+                    self._value = self.load(SurveyStore(directory))
+                    self._root, self._directory = root, directory
+            finally:
+                self._lock.release()
+        return self._value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar cache for survey CSVs")
+    parser.add_argument('csv_paths', nargs='*', default=[SOURCE_PATH])
+    parser.add_argument('--append', nargs='+', default=[], metavar='CSV',
+                        help="append the records of these CSVs to the cached data")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    root = ingest(args.csv_paths, args.cache_dir, args.chunk_rows)
+    if args.append:
+        before = current_directory(root)
+        directory = append(root, args.append, args.chunk_rows)
+        if directory == before:
+            print(f"{', '.join(args.append)}: already appended")
+        else:
+            batch = SurveyStore(directory).manifest['appends'][-1]
+            print(f"{', '.join(args.append)}: appended {batch['n_rows']:,} rows in {batch['seconds']:.1f}s, "
+                  f"peak RSS {batch['peak_rss_mb']:.0f} MB")
+    store = SurveyStore(current_directory(root))
+    size = sum(os.path.getsize(os.path.join(path, f)) for path, _, files in os.walk(root) for f in files)
+    print(f"{', '.join(args.csv_paths)}: {store.n_rows:,} rows, {len(store.columns)} columns, "
+          f"version {store.version}, {size / 2**20:.1f} MB in {root}")
+    job = store.manifest.get('ingest')
+    if job and not args.append:
+        print(f"Ingested in {job['seconds']:.1f}s, peak RSS {job['peak_rss_mb']:.0f} MB "
+              f"({job['chunk_rows']:,} rows per chunk)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Server-side paging, sorting and filtering of the survey records.
+
+Backs a dash_table.DataTable in custom page/sort/filter mode. Each column
+gets a stable argsort index the first time it is sorted or range-filtered,
+kept with the dataset version, so a request only gathers positions and
+slices out the visible page. Appending records merges the new rows into the
+existing indexes instead of sorting again.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from survey.cube import AGE_LABELS, add_derived_columns, age_groups, health_condition_cols
+from survey.files import column_file_name, write_atomic
+
+ORDERS_DIR = "orders"
+
+# Derived columns shown (and sortable/filterable) next to the stored ones
+DERIVED_COLUMNS = ['age_group', 'health_condition_count']
+
+OPERATORS = {
+    '=': '=', 'eq': '=', '!=': '!=', 'ne': '!=',
+    '<': '<', 'lt': '<', '<=': '<=', 'le': '<=',
+    '>': '>', 'gt': '>', '>=': '>=', 'ge': '>=',
+    'contains': 'contains',
+    # No column holds dates, so a date term matches no records
+    'datestartswith': 'datestartswith',
+}
+
+# The table prefixes each operator with its case mode: 's' (sensitive, the
+# DataTable default) or 'i' (insensitive)
+FILTER_TERM = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s+(?P<case>[si]?)(?P<op>[a-z]+|[<>!=]=?)\s+(?P<value>.+)$')
+
+
+def parse_filter(query):
+    """Parse a DataTable filter_query into (column, operator, value,
+    case_sensitive) terms.
+
+    Only the expressions the table UI produces are understood: terms joined
+    with '&&', each '{column} operator value', the operator optionally
+    prefixed with 's' or 'i'. Anything else is ignored.
+    """
+    terms = []
+    for part in (query or '').split(' && '):
+        match = FILTER_TERM.match(part.strip())
+        if not match or match['op'] not in OPERATORS:
+            continue
+        value = match['value'].strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        terms.append((match['column'], OPERATORS[match['op']], value, match['case'] != 'i'))
+    return terms
+
+
+class SurveyTable:
+    def __init__(self, store):
+        self.store = store
+        self.columns = store.columns + DERIVED_COLUMNS
+        self._values = {}
+        self._orders = {}
+
+    def column_type(self, name):
+        return 'text' if self._categories(name) is not None else 'numeric'
+
+    def _categories(self, name):
+        if name == 'age_group':
+            return AGE_LABELS
+        if name in DERIVED_COLUMNS:
+            return None
+        return self.store.manifest['columns'][name].get('categories')
+
+    def _array(self, name):
+        """Values (or categorical codes) of a column, as stored."""
+        if name not in self._values:
+            if name == 'age_group':
+                values = pd.Categorical(age_groups(self.store.array('SC_AGE_YEARS'))).codes
+            elif name == 'health_condition_count':
+                values = sum(self.store.array(column).astype(np.int16) for column in health_condition_cols)
+            else:
+                values = self.store.array(name)
+            self._values[name] = values
+        return self._values[name]
+
+    def _sort_key(self, name):
+        """Values that sort like the column: categorical codes are replaced by
+        their category's rank, as appends add categories out of order."""
+        values = self._array(name)
+        categories = self._categories(name)
+        if categories is None or name == 'age_group':
+            return values
+        ranks = np.empty(len(categories), dtype=values.dtype)
+        ranks[np.argsort(np.asarray(categories, dtype=str), kind='stable')] = np.arange(len(categories))
+        return ranks[values]
+
+    def _order_path(self, name):
+        return os.path.join(self.store.directory, ORDERS_DIR, column_file_name(name))
+
+    def _save_order(self, name, order):
+        path = self._order_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, lambda f: np.save(f, order))
+
+    def _order(self, name):
+        """Stable argsort of a column and the column's sort keys in that order."""
+        if name not in self._orders:
+            path = self._order_path(name)
+            if os.path.exists(path):
+                order = np.load(path, mmap_mode='r')
+            else:
+                order = np.argsort(self._sort_key(name), kind='stable').astype(np.int32)
+                self._save_order(name, order)
+            self._orders[name] = (order, np.asarray(self._sort_key(name))[order])
+        return self._orders[name]
+
+    def _term_mask(self, column, op, value, case_sensitive=True):
+        if op == 'datestartswith':
+            return np.zeros(self.store.n_rows, dtype=bool)
+        categories = self._categories(column)
+        codes = self._array(column)
+        if categories is not None:
+            fold = (lambda text: text) if case_sensitive else str.casefold
+            value = fold(value)
+            if op == 'contains':
+                wanted = [i for i, c in enumerate(categories) if value in fold(str(c))]
+            else:
+                wanted = [i for i, c in enumerate(categories) if fold(str(c)) == value]
+            mask = np.isin(codes, wanted)
+            return ~mask if op == '!=' else mask
+
+        try:
+            number = float(value)
+        except ValueError:
+            return np.zeros(self.store.n_rows, dtype=bool)
+        if op == 'contains':
+            op = '='
+        order, ordered = self._order(column)
+        left, right = np.searchsorted(ordered, number, 'left'), np.searchsorted(ordered, number, 'right')
+        selected = {
+            '=': order[left:right], '!=': order[left:right],
+            '<': order[:left], '<=': order[:right],
+            '>': order[right:], '>=': order[left:],
+        }[op]
+        mask = np.zeros(self.store.n_rows, dtype=bool)
+        mask[selected] = True
+        return ~mask if op == '!=' else mask
+
+    def filter_mask(self, query):
+        """Boolean mask of the records matching a filter_query (None: all)."""
+        mask = None
+        for column, op, value, case_sensitive in parse_filter(query):
+            if column not in self.columns:
+                continue
+            term = self._term_mask(column, op, value, case_sensitive)
+            mask = term if mask is None else mask & term
+        return mask
+
+    def page(self, page_current=0, page_size=10, sort_by=None, filter_query=''):
+        """Return (records of the requested page, number of matching records)."""
+        mask = self.filter_mask(filter_query)
+        sort = next((s for s in sort_by or [] if s.get('column_id') in self.columns), None)
+        if sort is not None:
+            positions = self._order(sort['column_id'])[0]
+            if sort.get('direction') == 'desc':
+                positions = positions[::-1]
+            if mask is not None:
+                positions = positions[mask[positions]]
+        else:
+            positions = np.arange(self.store.n_rows) if mask is None else np.flatnonzero(mask)
+
+        start = page_current * page_size
+        rows = np.asarray(positions[start:start + page_size])
+        frame = add_derived_columns(self.store.frame(rows=rows))
+        frame['age_group'] = frame['age_group'].astype(str).replace('nan', '')
+        return frame[self.columns].to_dict('records'), len(positions)
+
+
+def extend_orders(previous, store):
+    """Carry the sort indexes of a version over to the version store, which
+    appends records to it, by merging the new rows into each index.
+
+    The new rows are sorted on their own and inserted after equal keys,
+    which is what a stable sort of all rows would give, at the cost of a
+    gather and a binary search instead of a full sort.
+    """
+    before, after = SurveyTable(previous), SurveyTable(store)
+    for name in after.columns:
+        path = before._order_path(name)
+        if not os.path.exists(path):
+            continue
+        order = np.load(path, mmap_mode='r')
+        keys = np.asarray(after._sort_key(name))
+        new_keys = keys[previous.n_rows:]
+        new_order = np.argsort(new_keys, kind='stable')
+        positions = np.searchsorted(keys[order], new_keys[new_order], side='right')
+        merged = np.insert(order, positions, new_order + previous.n_rows).astype(np.int32)
+        after._save_order(name, merged)
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import dash
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tests import the app's packages (inference, survey, pages) from the repo
+# root, and the app reads its models and data relative to it
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def write_survey_csv(path, n_rows, seed=0):
+    """Synthetic NSCH-like records with every column the Explorer reads."""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'HHID': np.arange(n_rows) + 20_000_000,
+        'SC_AGE_YEARS': rng.integers(0, 18, n_rows),
+        'A1_MENTHEALTH': rng.integers(1, 6, n_rows),
+        'A1_PHYSHEALTH': rng.integers(1, 6, n_rows),
+        'A1_GRADE': rng.integers(1, 10, n_rows),
+        'ACE1': rng.integers(1, 5, n_rows),
+        'SCREENTIME': rng.integers(1, 6, n_rows),
+        'FWC': rng.gamma(2.0, 300.0, n_rows).round(3),
+    })
+    for column in ['DIABETES', 'BLOOD', 'HEADACHE', 'HEART', 'K2Q35A', 'K2Q30A', 'K2Q31A', 'K2Q32A',
+                   'K2Q33A', 'K2Q34A', 'K2Q40A', 'K2Q36A', 'K2Q37A']:
+        frame[column] = rng.choice([1, 2], n_rows, p=[0.1, 0.9])
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def explorer_app(tmp_path_factory):
+    """pages.explorer serving a synthetic datajoined.csv. The page reads and
+    caches it relative to the working directory, so it is imported (once)
+    from a temporary one."""
+    directory = tmp_path_factory.mktemp('explorer')
+    write_survey_csv(directory / 'datajoined.csv', 5000)
+    os.chdir(directory)
+    try:
+        app = dash.Dash(__name__, use_pages=True, pages_folder='')
+        import pages.explorer
+
+        dash.page_registry['pages.explorer']['layout'] = pages.explorer.layout
+        app.layout = dash.page_container
+        return directory, pages.explorer, app.server.test_client()
+    finally:
+        os.chdir(ROOT)
+
+
+@pytest.fixture
+def explorer(explorer_app):
+    """(pages.explorer, test client), run from the page's working directory."""
+    directory, page, client = explorer_app
+    os.chdir(directory)
+    try:
+        yield page, client
+    finally:
+        os.chdir(ROOT)
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from docchat import streaming
+
+
+def wait_for(job_id, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        answer = streaming.poll_answer(job_id)
+        if answer is None or condition(answer):
+            return answer
+        time.sleep(0.005)
+    raise AssertionError("the answer did not get there in time")
+
+
+def stepped(pieces):
+    """A stream yielding one piece per release() of the returned semaphore."""
+    gate = threading.Semaphore(0)
+
+    def stream():
+        for piece in pieces:
+            gate.acquire()
+            yield piece
+
+    return stream, gate
+
+
+def test_polls_see_the_answer_grow():
+    stream, gate = stepped(["Children ", "need ", "sleep."])
+    job_id = streaming.start_answer(stream)
+    assert streaming.poll_answer(job_id)['text'] == ''
+    answers = []
+    for _ in range(3):
+        gate.release()
+        grown = len(answers[-1]['text']) if answers else 0
+        answers.append(wait_for(job_id, lambda answer: len(answer['text']) > grown))
+    assert [answer['text'] for answer in answers] == ["Children ", "Children need ", "Children need sleep."]
+
+    answer = answers[-1] if answers[-1]['done'] else wait_for(job_id, lambda answer: answer['done'])
+    assert answer['error'] is None and answer['first_token_seconds'] is not None
+    # A finished job is forgotten once read
+    assert streaming.poll_answer(job_id) is None
+
+
+def test_errors_are_recorded_on_the_job():
+    def failing():
+        yield "Partial "
+        raise RuntimeError("model unavailable")
+
+    job_id = streaming.start_answer(failing)
+    answer = wait_for(job_id, lambda answer: answer['done'])
+    assert answer['text'] == "Partial "
+    assert answer['error'] == "model unavailable"
+
+
+def test_not_ready_is_an_error_without_a_first_token():
+    def not_ready():
+        raise RuntimeError("still initializing")
+        yield
+
+    answer = wait_for(streaming.start_answer(not_ready), lambda answer: answer['done'])
+    assert answer['text'] == '' and answer['error'] == "still initializing"
+    assert answer['first_token_seconds'] is None
+
+
+def test_only_finished_unread_jobs_are_evicted(monkeypatch):
+    monkeypatch.setattr(streaming, 'JOB_TTL', 0.05)
+    slow, gate = stepped(["still ", "going"])
+    running = streaming.start_answer(slow)
+    unread = streaming.start_answer(lambda: iter(["done"]))
+    while not streaming._jobs[unread].done:
+        time.sleep(0.005)
+    polled, polled_gate = stepped(["almost"])
+    polled_id = streaming.start_answer(polled)
+    polled_gate.release()
+    time.sleep(0.1)
+
+    # Read just now, so kept even though it finished long ago
+    streaming._jobs[polled_id].snapshot()
+    streaming.start_answer(lambda: iter([]))
+    assert unread not in streaming._jobs
+    assert running in streaming._jobs and polled_id in streaming._jobs
+
+    gate.release()
+    gate.release()
+    assert wait_for(running, lambda answer: answer['done'])['text'] == "still going"
+
+
+@pytest.fixture(autouse=True)
+def no_jobs_left():
+    yield
+    streaming._jobs.clear()
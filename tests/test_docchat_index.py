@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+from filelock import FileLock
+
+for module in ('langchain', 'langchain_chroma', 'langchain_community'):
+    pytest.importorskip(module)
+
+from docchat import index  # noqa: E402
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Builds that only write the manifest, listed in the returned list."""
+    builds = []
+
+    def build_index(pdf_paths, directory, embedding, settings=index.SETTINGS, progress=print):
+        builds.append(directory)
+        os.makedirs(directory, exist_ok=True)
+        manifest = {'key': index.index_key(pdf_paths, settings),
+                    'sources': [os.path.abspath(path) for path in pdf_paths], 'settings': settings,
+                    'n_chunks': 1, 'build_seconds': 0.0}
+        with open(os.path.join(directory, index.MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        return manifest
+
+    monkeypatch.setattr(index, 'build_index', build_index)
+    yield builds
+    for f in index._open_indexes.values():
+        f.close()
+    index._open_indexes.clear()
+
+
+def prepare(pdf, cache_dir):
+    return index.prepare_index([str(pdf)], str(cache_dir), embedding=object(), progress=lambda text: None)[0]
+
+
+def test_replaced_index_survives_while_open_or_recent(built, tmp_path):
+    pdf, cache_dir = tmp_path / 'book.pdf', tmp_path / 'cache'
+    pdf.write_text('first edition')
+    old = prepare(pdf, cache_dir)
+    pdf.write_text('second edition')
+    new = prepare(pdf, cache_dir)
+    assert built == [old, new]
+    assert os.path.exists(os.path.join(old, index.SUPERSEDED))
+
+    def remove_stale(stale_seconds):
+        index._remove_stale(str(cache_dir), new, [str(pdf)], index.SETTINGS, stale_seconds=stale_seconds)
+
+    # This process still has the old index open
+    remove_stale(0)
+    assert os.path.exists(old)
+
+    index._open_indexes.pop(old).close()
+    remove_stale(index.STALE_SECONDS)
+    assert os.path.exists(old)
+    remove_stale(0)
+    assert not os.path.exists(old)
+    assert os.path.exists(os.path.join(new, index.MANIFEST))
+
+
+def test_reverted_pdf_reuses_its_index(built, tmp_path):
+    pdf, cache_dir = tmp_path / 'book.pdf', tmp_path / 'cache'
+    pdf.write_text('first edition')
+    first = prepare(pdf, cache_dir)
+    pdf.write_text('second edition')
+    prepare(pdf, cache_dir)
+    pdf.write_text('first edition')
+    assert prepare(pdf, cache_dir) == first
+    assert len(built) == 2
+    assert not os.path.exists(os.path.join(first, index.SUPERSEDED))
+
+
+def test_build_lock_timeout_falls_back(built, tmp_path, monkeypatch):
+    monkeypatch.setattr(index, 'BUILD_TIMEOUT', 0.05)
+    pdf, cache_dir = tmp_path / 'book.pdf', tmp_path / 'cache'
+    pdf.write_text('first edition')
+    earlier = prepare(pdf, cache_dir)
+
+    pdf.write_text('second edition')
+    key = index.index_key([str(pdf)], index.SETTINGS)
+    # Another process is (slowly) building the index of the new contents
+    with FileLock(str(cache_dir / f".{key[:16]}.lock")):
+        assert prepare(pdf, cache_dir) == earlier
+        for f in index._open_indexes.values():
+            f.close()
+        index._open_indexes.clear()
+        for entry in os.listdir(cache_dir):
+            if not entry.startswith('.'):
+                os.remove(os.path.join(cache_dir, entry, index.MANIFEST))
+        # With no earlier index, a private copy is built
+        private = prepare(pdf, cache_dir)
+    assert os.path.basename(private) == f"{key[:16]}-{os.getpid()}"
+    assert built[-1] == private
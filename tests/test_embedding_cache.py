@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from docchat.embedding_cache import CachedEmbeddings  # noqa: E402
+
+
+class Counting:
+    """A backend whose vectors are derived from the text, counting what it embeds."""
+
+    def __init__(self):
+        self.embedded = []
+        self.queries = 0
+
+    @staticmethod
+    def vector(text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 0.5]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return self.vector(text)
+
+
+def test_hits_misses_and_duplicates(tmp_path):
+    backend = Counting()
+    cache = CachedEmbeddings(backend, 'model-a', str(tmp_path / 'embeddings.sqlite3'))
+
+    texts = ["ear infection", "fever", "ear infection", "asthma"]
+    assert cache.embed_documents(texts) == [Counting.vector(text) for text in texts]
+    # A text repeated within a batch is embedded once
+    assert backend.embedded == ["ear infection", "fever", "asthma"]
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+
+    assert cache.embed_documents(["fever", "rash"]) == [Counting.vector("fever"), Counting.vector("rash")]
+    assert backend.embedded[3:] == ["rash"]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 4)
+
+    # Queries go straight to the backend and are not counted
+    assert cache.embed_query("fever") == Counting.vector("fever")
+    assert backend.queries == 1 and cache.stats()['misses'] == 4
+
+
+def test_vectors_persist_across_a_reopen(tmp_path):
+    path = str(tmp_path / 'cache' / 'embeddings.sqlite3')
+    CachedEmbeddings(Counting(), 'model-a', path).embed_documents(["ear infection", "fever"])
+
+    backend = Counting()
+    reopened = CachedEmbeddings(backend, 'model-a', path)
+    assert reopened.embed_documents(["fever", "ear infection"]) == [Counting.vector("fever"),
+                                                                    Counting.vector("ear infection")]
+    assert backend.embedded == []
+    assert reopened.stats()['hit_rate'] == 1.0
+
+    # Vectors are kept per model
+    other = Counting()
+    CachedEmbeddings(other, 'model-b', path).embed_documents(["fever"])
+    assert other.embedded == ["fever"]
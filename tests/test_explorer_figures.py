@@ -0,0 +1,20 @@
+import plotly.io as pio
+
+from conftest import write_survey_csv
+from survey.cube import open_cube
+from survey.store import open_store
+
+
+def test_figure_payload_does_not_grow_with_records(explorer, tmp_path):
+    page, _ = explorer
+    sizes = {}
+    for n_rows in (2_000, 40_000):
+        store = open_store([write_survey_csv(tmp_path / f"survey-{n_rows}.csv", n_rows)], str(tmp_path / 'cache'))
+        cube = open_cube(store)
+        sizes[n_rows] = {chart: len(pio.to_json(build(cube), validate=False))
+                         for chart, build in page.chart_figures.items()}
+
+    for chart, small in sizes[2_000].items():
+        # 20x the records; figures hold one point per bin, so only the
+        # digits of the counts can add a few bytes
+        assert sizes[40_000][chart] <= small * 1.05, (chart, small, sizes[40_000][chart])
@@ -0,0 +1,58 @@
+import json
+import os
+
+import plotly.graph_objects as go
+
+from survey.figure_cache import FigureCache
+
+
+def figure(client, filters):
+    return client.get('/api/explorer/figure/ace-pie?filters=' + json.dumps(filters))
+
+
+def test_filter_values_are_normalized(explorer):
+    page, client = explorer
+    level = page.survey_data.get().bitmaps.options('ACE1')[0]
+    etags = {figure(client, {'ACE1': [value]}).headers['ETag'] for value in (level, float(level), str(level))}
+    assert len(etags) == 1
+    assert figure(client, {'ACE1': [level, 'junk']}).headers['ETag'] in etags
+
+
+def test_unknown_values_add_no_cache_files(explorer):
+    page, client = explorer
+    directory = page.survey_data.get().figure_cache.directory
+    assert figure(client, {}).status_code == 200
+    files = set(os.listdir(directory))
+    for i in range(20):
+        response = figure(client, {'ACE1': [f"junk-{i}", 10_000 + i], 'nope': [1]})
+        assert response.status_code == 200
+    assert set(os.listdir(directory)) == files
+
+
+def test_disk_copies_are_bounded(tmp_path):
+    cache = FigureCache(str(tmp_path), max_bytes=2**20, max_disk_bytes=20_000)
+    for i in range(50):
+        cache.get(cache.key('v1', 'chart', {'i': [i]}), lambda: go.Figure(go.Bar(y=list(range(200)))))
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert on_disk <= 20_000
+    assert cache.stats()['disk_evictions'] > 0
+    # The most recent figure is still on disk
+    assert os.path.exists(cache._path(cache.key('v1', 'chart', {'i': [49]})))
+
+
+def test_lookup_counts_survive_a_new_version(explorer):
+    page, client = explorer
+
+    def lookups():
+        return {dict(labels)['result']: value for _, labels, value in page.figure_cache_lookups.samples()}
+
+    assert figure(client, {}).status_code == 200
+    before = lookups()
+    assert sum(before.values()) > 0
+    # What a hot swap does: the next version gets a new, empty FigureCache
+    swapped = page.ExplorerData(page.survey_data.get().store)
+    assert swapped.figure_cache.stats()['hits'] == 0
+    swapped.figure_cache.get(swapped.figure_cache.key('v-test', 'chart', {}), lambda: go.Figure())
+    after = lookups()
+    assert all(after[result] >= count for result, count in before.items())
+    assert sum(after.values()) == sum(before.values()) + 1
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from langchain_core.documents import Document  # noqa: E402
+
+from docchat.bm25 import B, K1, BM25Index, tokenize  # noqa: E402
+from docchat.retrieval import HybridRetriever, reciprocal_rank_fusion  # noqa: E402
+
+CHUNKS = [
+    "Otitis media is an infection of the middle ear.",
+    "Ear infections often follow a cold in young children.",
+    "Amoxicillin is the usual first antibiotic for otitis media.",
+    "Children with asthma may wheeze after exercise.",
+    "A balanced diet includes fruit, vegetables and whole grains.",
+    "Fever above 38 degrees in infants needs a doctor's visit.",
+]
+
+
+@pytest.fixture
+def lexical():
+    return BM25Index.build([Document(page_content=text, metadata={'chunk': i}) for i, text in enumerate(CHUNKS)])
+
+
+class Vectors:
+    """A vectorstore stub returning a fixed ranking, after an optional delay
+    or by raising."""
+
+    def __init__(self, ranking, delay=0.0, error=None):
+        self.ranking, self.delay, self.error = ranking, delay, error
+        self.calls = 0
+        self.released = threading.Event()
+
+    def similarity_search(self, query, k):
+        self.calls += 1
+        if self.delay:
+            self.released.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [Document(page_content=CHUNKS[i], metadata={'chunk': i}) for i in self.ranking[:k]]
+
+
+def chunk_ids(docs):
+    return [doc.metadata['chunk'] for doc in docs]
+
+
+def test_reciprocal_rank_fusion():
+    # 2 is near the top of both rankings, so it beats 1, which only tops one
+    assert reciprocal_rank_fusion([[1, 2, 3], [2, 4, 1]]) == [2, 1, 4, 3]
+    assert reciprocal_rank_fusion([[5, 6]]) == [5, 6]
+    assert reciprocal_rank_fusion([[], [7]]) == [7]
+    # Equal contributions: a chunk ranked first by one search ties with one
+    # ranked first by the other, and the earlier ranking's wins
+    assert reciprocal_rank_fusion([[1], [2]]) == [1, 2]
+
+
+def test_bm25_scores_match_the_formula(lexical, tmp_path):
+    docs = [tokenize(text) for text in CHUNKS]
+    average = sum(len(doc) for doc in docs) / len(docs)
+
+    def score(query, doc):
+        total = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in docs)
+            tf = doc.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                total += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * len(doc) / average))
+        return total
+
+    query = "otitis media ear infection antibiotic"
+    scores = {i: score(query, doc) for i, doc in enumerate(docs) if score(query, doc) > 0}
+    expected = sorted(scores, key=lambda i: (-scores[i], i))
+    assert lexical.search(query, 10) == expected
+    assert lexical.search(query, 2) == expected[:2]
+
+    lexical.save(str(tmp_path))
+    assert BM25Index.load(str(tmp_path)).search(query, 10) == expected
+
+
+def test_fuses_vector_and_bm25_rankings(lexical):
+    vectors = Vectors([1, 0, 5])
+    retriever = HybridRetriever(vectorstore=vectors, lexical=lexical, k=3)
+    bm25 = lexical.search("otitis media", retriever.candidates)
+    docs = retriever.invoke("otitis media")
+    assert chunk_ids(docs) == reciprocal_rank_fusion([bm25, [1, 0, 5]])[:3]
+    assert docs[0].page_content == CHUNKS[chunk_ids(docs)[0]]
+    assert retriever.stats()['hybrid'] == 1
+
+
+def test_failing_vector_search_falls_back_to_bm25(lexical):
+    vectors = Vectors([1], error=RuntimeError("embedding API down"))
+    retriever = HybridRetriever(vectorstore=vectors, lexical=lexical, k=3, cooldown=60)
+    bm25 = lexical.search("otitis media", 3)
+    assert chunk_ids(retriever.invoke("otitis media")) == bm25
+    # Within the cooldown the vector search is not tried again
+    assert chunk_ids(retriever.invoke("otitis media")) == bm25
+    assert vectors.calls == 1
+    stats = retriever.stats()
+    assert (stats['vector_failures'], stats['lexical_only'], stats['hybrid']) == (1, 2, 0)
+
+
+def test_slow_vector_search_times_out_then_recovers(lexical):
+    vectors = Vectors([4, 3], delay=5.0)
+    retriever = HybridRetriever(vectorstore=vectors, lexical=lexical, k=3, vector_timeout=0.05, cooldown=0.2)
+    started = time.perf_counter()
+    assert chunk_ids(retriever.invoke("asthma")) == lexical.search("asthma", 3)
+    assert time.perf_counter() - started < 1.0
+    assert retriever.stats()['vector_timeouts'] == 1
+
+    retriever.invoke("asthma")
+    assert vectors.calls == 1
+    vectors.delay = 0.0
+    vectors.released.set()
+    time.sleep(0.25)
+    docs = retriever.invoke("asthma")
+    assert vectors.calls == 2
+    assert chunk_ids(docs) == reciprocal_rank_fusion([lexical.search("asthma", retriever.candidates), [4, 3]])[:3]
+    assert retriever.stats()['hybrid'] == 1
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+pytest.importorskip('langchain_core')
+
+from docchat.embeddings import VECTORIZER_OPTIONS, FittedEmbeddings, LocalEmbeddings  # noqa: E402
+
+CHUNKS = [
+    "Children need about ten hours of sleep each night.",
+    "Fever in infants under three months needs a doctor's visit.",
+    "Iron rich foods such as beans and spinach help prevent anemia.",
+    "Screen time before bed makes it harder for children to sleep.",
+    "Vaccines protect infants against measles, mumps and rubella.",
+    "Asthma symptoms include wheezing, coughing and shortness of breath.",
+    "Regular physical activity helps children keep a healthy weight.",
+    "Headaches in children are often caused by poor sleep or dehydration.",
+]
+QUERIES = ["how much sleep do children need", "infant fever doctor", "measles vaccine", "unknownword"]
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoLoad(FittedEmbeddings):
+        def fit(self, texts):
+            return self
+
+        def save(self, directory):
+            pass
+
+        def embed_documents(self, texts):
+            return []
+
+        def embed_query(self, text):
+            return []
+
+    with pytest.raises(TypeError):
+        NoLoad()
+
+
+def test_vectors_match_tfidf_and_truncated_svd():
+    embedding = LocalEmbeddings(dimensions=4).fit(CHUNKS)
+    vectorizer = TfidfVectorizer(**VECTORIZER_OPTIONS)
+    tfidf = vectorizer.fit_transform(CHUNKS)
+    svd = TruncatedSVD(n_components=4, random_state=0).fit(tfidf)
+
+    expected = svd.transform(vectorizer.transform(QUERIES))
+    norms = np.linalg.norm(expected, axis=1, keepdims=True)
+    expected = np.divide(expected, norms, out=np.zeros_like(expected), where=norms > 0)
+    actual = np.array([embedding.embed_query(query) for query in QUERIES])
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+    np.testing.assert_allclose(np.array(embedding.embed_documents(QUERIES)), actual)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    fitted = LocalEmbeddings(dimensions=4).fit(CHUNKS)
+    fitted.save(str(tmp_path))
+    loaded = LocalEmbeddings(dimensions=4)
+    assert not loaded.fitted
+    with pytest.raises(RuntimeError):
+        loaded.embed_query(QUERIES[0])
+    loaded.load(str(tmp_path))
+    assert loaded.fitted
+    np.testing.assert_array_equal(np.array(loaded.embed_documents(CHUNKS + QUERIES)),
+                                  np.array(fitted.embed_documents(CHUNKS + QUERIES)))
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from inference.micro_batch import MicroBatcher
+
+
+class Model:
+    """predict_fn recording each batch; the first call waits for release so
+    later requests queue up behind it."""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.release = threading.Event()
+        self.error = error
+
+    def __call__(self, rows):
+        self.batches.append(rows.copy())
+        if len(self.batches) == 1:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return np.column_stack([rows.sum(axis=1), rows[:, 0] * 10])
+
+
+def submit_while_blocked(model, batcher, rows):
+    """Submit rows concurrently while the first (warm-up) batch holds the worker."""
+    pool = ThreadPoolExecutor(len(rows) + 1)
+    first = pool.submit(batcher.predict, [0.0, 0.0])
+    while not model.batches:
+        time.sleep(0.001)
+    futures = [pool.submit(batcher.predict, row) for row in rows]
+    while batcher.stats()['pending'] < len(rows):
+        time.sleep(0.001)
+    model.release.set()
+    return first, futures
+
+
+def test_concurrent_requests_share_one_call_and_get_their_own_rows():
+    model = Model()
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=50)
+    rows = [[float(i), float(i) + 0.5] for i in range(1, 11)]
+    first, futures = submit_while_blocked(model, batcher, rows)
+
+    np.testing.assert_array_equal(first.result(5), [0.0, 0.0])
+    for row, future in zip(rows, futures):
+        np.testing.assert_array_equal(future.result(5), [sum(row), row[0] * 10])
+    assert len(model.batches) == 2
+    assert sorted(model.batches[1][:, 0]) == [row[0] for row in rows]
+    stats = batcher.stats()
+    assert (stats['requests'], stats['batches'], stats['errors']) == (11, 2, 0)
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = Model()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+    first, futures = submit_while_blocked(model, batcher, [[float(i), 0.0] for i in range(10)])
+    for future in futures:
+        future.result(5)
+    assert [len(batch) for batch in model.batches] == [1, 4, 4, 2]
+
+
+def test_a_lone_request_is_flushed_after_max_wait():
+    model = Model()
+    model.release.set()
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=30)
+    started = time.perf_counter()
+    np.testing.assert_array_equal(batcher.predict([1.0, 2.0], timeout=5), [3.0, 10.0])
+    elapsed = time.perf_counter() - started
+    assert 0.025 <= elapsed < 1.0
+    assert len(model.batches) == 1
+
+
+def test_an_error_reaches_every_request_in_the_batch():
+    model = Model(error=RuntimeError("forward pass failed"))
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=50)
+    first, futures = submit_while_blocked(model, batcher, [[float(i), 0.0] for i in range(5)])
+    for future in [first] + futures:
+        with pytest.raises(RuntimeError, match="forward pass failed"):
+            future.result(5)
+    assert batcher.stats()['errors'] == 6
+
+    # The worker keeps going after a failed batch
+    model.error = None
+    np.testing.assert_array_equal(batcher.predict([2.0, 1.0], timeout=5), [3.0, 20.0])
@@ -0,0 +1,39 @@
+import json
+
+import h5py
+import numpy as np
+import pytest
+
+from inference.numpy_model import NumpyModel, load_model
+
+H5_PATH = "models/multilabel_classification_model.h5"
+NPZ_PATH = "models/multilabel_classification_model.npz"
+
+
+def test_matches_keras():
+    tf = pytest.importorskip('tensorflow')
+
+    keras_model = tf.keras.models.load_model(H5_PATH)
+    x = np.random.default_rng(0).normal(scale=2.0, size=(500, keras_model.input_shape[-1])).astype(np.float32)
+    expected = keras_model.predict(x, batch_size=len(x), verbose=0)
+    for model in (NumpyModel.from_h5(H5_PATH), load_model(NPZ_PATH)):
+        np.testing.assert_allclose(model.predict(x), expected, atol=1e-5)
+
+
+def test_reads_keras2_weight_names(tmp_path):
+    rng = np.random.default_rng(0)
+    kernel, bias = rng.normal(size=(4, 3)).astype(np.float32), rng.normal(size=3).astype(np.float32)
+    config = {'class_name': 'Sequential', 'config': {'layers': [
+        {'class_name': 'Dense', 'config': {'name': 'dense', 'units': 3, 'activation': 'sigmoid'}},
+    ]}}
+    path = tmp_path / "keras2.h5"
+    with h5py.File(path, 'w') as f:
+        f.attrs['model_config'] = json.dumps(config)
+        layer = f.create_group('model_weights/dense')
+        layer.attrs['weight_names'] = [b'dense/kernel:0', b'dense/bias:0']
+        layer['dense/kernel:0'] = kernel
+        layer['dense/bias:0'] = bias
+
+    x = rng.normal(size=(5, 4)).astype(np.float32)
+    expected = 1 / (1 + np.exp(-(x @ kernel + bias)))
+    np.testing.assert_allclose(NumpyModel.from_h5(path).predict(x), expected, atol=1e-6)
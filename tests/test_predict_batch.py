@@ -0,0 +1,71 @@
+import math
+
+import dash
+import pytest
+
+from inference.features import allowed_values, feature_names, validate_row
+
+
+def valid_row():
+    return {name: min(allowed_values[name]) for name in feature_names}
+
+
+@pytest.mark.parametrize('value', [math.inf, -math.inf, math.nan, True, False, "1", 1.5, None])
+def test_validate_row_rejects_non_codes(value):
+    features, error = validate_row(dict(valid_row(), age=value))
+    assert features is None
+    assert error.startswith("age:")
+
+
+def test_validate_row_accepts_integral_numbers():
+    features, error = validate_row(dict(valid_row(), age=3.0))
+    assert error is None
+    assert features[feature_names.index('age')] == 3
+
+
+@pytest.fixture(scope='module')
+def client():
+    app = dash.Dash(__name__, use_pages=True, pages_folder='')
+    import pages.predictor
+    from inference.registry import registry
+
+    # Pages imported by hand (not from a pages folder) register no layout
+    dash.page_registry['pages.predictor']['layout'] = pages.predictor.layout
+    app.layout = dash.page_container
+
+    registry.get(timeout=60)
+    return app.server.test_client()
+
+
+def test_batch_scores_valid_rows(client):
+    response = client.post('/api/predict/batch', json={'rows': [valid_row(), dict(valid_row(), age=math.inf)]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['scored'] == 1
+    assert len(body['results'][0]['predictions']) > 0
+    assert 'error' in body['results'][1]
+
+
+def test_batch_scores_csv(client):
+    header = ','.join(feature_names)
+    values = ','.join(str(min(allowed_values[name])) for name in feature_names)
+    response = client.post('/api/predict/batch', data=f"{header}\n{values}\n", content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['scored'] == 1
+
+
+def test_each_stage_is_timed_once_per_request(client):
+    from inference.metrics import stage_seconds
+
+    def counts():
+        return {dict(labels)['stage']: value for name, labels, value in stage_seconds.samples()
+                if name.endswith('_count')}
+
+    before = counts()
+    # Values no earlier test sent, so the prediction cache misses
+    row = {name: max(allowed_values[name]) for name in feature_names}
+    assert client.post('/api/predict/batch', json=[row]).get_json()['scored'] == 1
+    after = counts()
+    added = {stage: after[stage] - before.get(stage, 0) for stage in after if after[stage] != before.get(stage, 0)}
+    assert added['validation'] == added['feature_assembly'] == added['model_forward'] == added['postprocess'] == 1
+    assert all(count == 1 for count in added.values())
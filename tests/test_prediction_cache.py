@@ -0,0 +1,78 @@
+import types
+
+import numpy as np
+import pytest
+
+from inference import cache as cache_module
+from inference.cache import PredictionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.monotonic for the cache module."""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_keys_normalise_int_and_float_inputs():
+    key = PredictionCache.key('v1', [3, 1, 2])
+    assert PredictionCache.key('v1', [3.0, 1.0, 2.0]) == key
+    assert PredictionCache.key('v1', np.array([3, 1, 2], dtype=np.int8)) == key
+    assert PredictionCache.key('v1', np.array([3.0, 1.0, 2.0])) == key
+    assert hash(key) == hash(PredictionCache.key('v1', (3.0, 1, 2.0)))
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(maxsize=2)
+    a, b, c = (PredictionCache.key('v1', [i]) for i in range(3))
+    cache.put(a, [0.1])
+    cache.put(b, [0.2])
+    assert cache.get(a)[0] == 0.1
+    cache.put(c, [0.3])
+    assert cache.get(b) is None
+    assert cache.get(a)[0] == 0.1 and cache.get(c)[0] == 0.3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache(ttl=60)
+    key = PredictionCache.key('v1', [1, 2])
+    cache.put(key, [0.5])
+    clock.value += 59
+    assert cache.get(key)[0] == 0.5
+    clock.value += 1
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert (stats['expirations'], stats['size']) == (1, 0)
+
+
+def test_outputs_are_read_only_copies():
+    cache = PredictionCache()
+    output = np.array([0.1, 0.2])
+    key = PredictionCache.key('v1', [1])
+    cache.put(key, output)
+    output[0] = 9
+    assert cache.get(key)[0] == 0.1
+    with pytest.raises(ValueError):
+        cache.get(key)[0] = 1
+
+
+def test_predict_many_scores_each_new_vector_once_per_model_version():
+    cache = PredictionCache()
+    calls = []
+
+    def predict(rows):
+        calls.append(rows.tolist())
+        return rows * 2
+
+    outputs = cache.predict_many('v1', [[1, 2], [3.0, 4.0], [1.0, 2.0]], predict)
+    np.testing.assert_array_equal(outputs, [[2, 4], [6, 8], [2, 4]])
+    assert calls == [[[1, 2], [3, 4]]]
+
+    cache.predict_many('v1', [[3, 4], [5, 6]], predict)
+    assert calls[1:] == [[[5, 6]]]
+
+    # A new model version does not reuse the old version's outputs
+    np.testing.assert_array_equal(cache.predict_many('v2', [[1, 2]], predict), [[2, 4]])
+    assert calls[2:] == [[[1, 2]]]
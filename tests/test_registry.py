@@ -0,0 +1,40 @@
+import numpy as np
+
+from inference import registry as registry_module
+from inference.registry import FAILED, READY, ModelRegistry
+
+
+class Model:
+    n_inputs = 3
+
+    def predict(self, x):
+        return np.zeros((len(x), 1))
+
+
+def test_failed_load_is_retried(monkeypatch):
+    monkeypatch.setattr(registry_module, 'RETRY_SECONDS', 0)
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("artifact missing")
+        return Model()
+
+    registry = ModelRegistry(loader)
+    registry.warm_up(background=False)
+    assert registry.status == FAILED
+
+    # Asking for the model again starts a retry, which succeeds
+    assert isinstance(registry.get(timeout=5), Model)
+    assert registry.status == READY and registry.error is None
+    assert len(attempts) == 2
+
+
+def test_retry_waits_for_backoff(monkeypatch):
+    monkeypatch.setattr(registry_module, 'RETRY_SECONDS', 3600)
+    registry = ModelRegistry(lambda: 1 / 0)
+    registry.warm_up(background=False)
+    thread = registry._thread
+    registry.warm_up(background=False)
+    assert registry._thread is thread and registry.status == FAILED
@@ -0,0 +1,96 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_survey_csv
+from survey import store
+from survey.bitmaps import FILTER_COLUMNS, BitmapIndex, open_bitmaps
+from survey.cube import add_derived_columns
+
+
+def write_batch(path, n_rows, seed, **columns):
+    frame = pd.read_csv(write_survey_csv(path, n_rows, seed))
+    for column, values in columns.items():
+        frame[column] = values
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def versions(tmp_path_factory):
+    """Every version of a dataset whose sizes are not multiples of 8, with
+    appends that start mid-byte and bring new levels."""
+    directory = tmp_path_factory.mktemp('bitmaps')
+    # 1003 rows: the first append starts in the middle of a byte
+    root = store.ingest(write_survey_csv(directory / 'survey.csv', 1003, seed=7), str(directory / 'cache'),
+                        chunk_rows=256)
+    # New ACE1 and SCREENTIME values (0 sorts before the known ones)
+    store.append(root, write_batch(directory / 'batch1.csv', 13, seed=8, ACE1=[9] * 6 + [1] * 7,
+                                   SCREENTIME=[0] * 13, SC_AGE_YEARS=[17] * 13), chunk_rows=256)
+    store.append(root, write_batch(directory / 'batch2.csv', 5, seed=9, ACE1=[9, 2, 9, 3, 9]), chunk_rows=256)
+    store.append(root, write_batch(directory / 'batch3.csv', 300, seed=10), chunk_rows=256)
+    return [store.SurveyStore(path) for path in sorted(
+        str(p) for p in (directory / 'cache').glob('*/versions/0*'))]
+
+
+def pandas_rows(frame, filters):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, values in filters.items():
+        if values:
+            mask &= frame[column].astype(object).isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def filter_cases(index):
+    """Single values, several values of a column, and combinations of columns."""
+    yield {}
+    for column in FILTER_COLUMNS:
+        levels = index.options(column)
+        yield {column: [levels[0]]}
+        yield {column: [levels[-1]]}
+        yield {column: levels[::2]}
+    for a, b in itertools.combinations(['age_group', 'ACE1', 'SCREENTIME', 'K2Q40A'], 2):
+        yield {a: index.options(a)[-1:], b: index.options(b)[:2]}
+    yield {'ACE1': [9], 'SCREENTIME': [0], 'age_group': ['16+']}
+
+
+def test_versions_have_the_expected_sizes(versions):
+    assert [data.n_rows for data in versions] == [1003, 1016, 1021, 1321]
+
+
+@pytest.mark.parametrize('version', range(4))
+def test_selection_matches_pandas(versions, version):
+    data = versions[version]
+    index = open_bitmaps(data)
+    frame = add_derived_columns(data.frame())
+    assert index.n_rows == len(frame)
+    for filters in filter_cases(index):
+        rows = index.rows(filters)
+        expected = pandas_rows(frame, filters)
+        if not any(filters.values()):
+            assert rows is None
+        else:
+            np.testing.assert_array_equal(rows, expected, err_msg=str(filters))
+
+
+def test_appends_add_new_levels(versions):
+    before, after = open_bitmaps(versions[0]), open_bitmaps(versions[1])
+    assert 9 not in before.options('ACE1') and 9 in after.options('ACE1')
+    assert after.options('SCREENTIME')[0] == 0
+    # Age groups keep their category order
+    assert after.options('age_group') == [group for group in ['0-5', '6-10', '11-15', '16+']
+                                          if group in after.options('age_group')]
+    # The new level's bitmap is empty before the appended rows
+    rows = after.rows({'ACE1': [9]})
+    assert rows.min() >= versions[0].n_rows
+
+
+def test_earlier_versions_are_unchanged_by_appends(versions):
+    first = versions[0]
+    reloaded = BitmapIndex.load(first)
+    frame = add_derived_columns(first.frame())
+    for filters in filter_cases(reloaded):
+        if any(filters.values()):
+            np.testing.assert_array_equal(reloaded.rows(filters), pandas_rows(frame, filters))
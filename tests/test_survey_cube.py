@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_survey_csv
+from survey import store
+from survey.cube import MEASURES, WEIGHT, add_derived_columns, open_cube
+
+
+@pytest.fixture(scope='module')
+def survey(tmp_path_factory):
+    """A synthetic dataset with an appended batch, its cube and records."""
+    directory = tmp_path_factory.mktemp('cube')
+    root = store.ingest(write_survey_csv(directory / 'survey.csv', 3000, seed=5), str(directory / 'cache'),
+                        chunk_rows=512)
+    store.append(root, write_survey_csv(directory / 'batch.csv', 700, seed=6), chunk_rows=512)
+    data = store.SurveyStore(store.current_directory(root))
+    return open_cube(data), add_derived_columns(data.frame())
+
+
+def weighted_by(frame, by):
+    weights = frame[WEIGHT].astype(float)
+    grouped = frame.assign(**{f'{m}_w': frame[m] * weights for m in MEASURES}, w=weights).groupby(by)
+    sums = grouped[['w'] + [f'{m}_w' for m in MEASURES]].sum()
+    expected = pd.DataFrame({'count': grouped.size(), 'population': sums['w'],
+                             'share': 100 * sums['w'] / weights.sum()})
+    for measure in MEASURES:
+        expected[f'{measure}_mean'] = sums[f'{measure}_w'] / sums['w']
+    return expected.reset_index()
+
+
+@pytest.mark.parametrize('by', [['ACE1'], ['SCREENTIME', 'SC_AGE_YEARS'], ['health_condition_count']])
+def test_weighted_estimates_match_pandas(survey, by):
+    cube, frame = survey
+    # Groups come in the cube's dimension order
+    estimates = cube.estimates(by).sort_values(by, ignore_index=True)
+    expected = weighted_by(frame, by).sort_values(by, ignore_index=True)
+    assert len(estimates) == len(expected)
+    for column in expected.columns:
+        np.testing.assert_allclose(estimates[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=column)
+
+
+def test_unweighted_rollup_matches_pandas(survey):
+    cube, frame = survey
+    rollup = cube.rollup(['age_group'])
+    grouped = frame.groupby('age_group', observed=False)
+    assert rollup['count'].tolist() == grouped.size().tolist()
+    for measure in MEASURES:
+        np.testing.assert_allclose(rollup[f'{measure}_mean'], grouped[measure].mean(), rtol=1e-9)
+        np.testing.assert_allclose(rollup[f'{measure}_std'], grouped[measure].std(ddof=0), rtol=1e-6)
+
+
+def test_confidence_intervals_contain_the_estimate(survey):
+    cube, _ = survey
+    estimates = cube.estimates(['ACE1', 'SCREENTIME'])
+    for name in ['population', 'share'] + [f'{measure}_mean' for measure in MEASURES]:
+        low, point, high = estimates[f'{name}_low'], estimates[name], estimates[f'{name}_high']
+        assert (low <= point).all() and (point <= high).all(), name
+        assert (high - low > 0).all(), name
+    # The whole sample's share is exactly 100 in every replicate
+    total = cube.estimates()
+    np.testing.assert_allclose(total[['share', 'share_low', 'share_high']].to_numpy(), 100)
+
+
+def test_subset_matches_the_filtered_records(survey):
+    cube, frame = survey
+    rows = np.flatnonzero((frame['ACE1'] == 1).to_numpy())
+    estimates = cube.subset(rows).estimates(['SCREENTIME'])
+    expected = weighted_by(frame.iloc[rows], ['SCREENTIME'])
+    np.testing.assert_allclose(estimates['A1_GRADE_mean'], expected['A1_GRADE_mean'], rtol=1e-9)
+    np.testing.assert_array_equal(estimates['count'], expected['count'])
+
+
+def test_appended_cube_matches_a_fresh_build(survey, tmp_path):
+    cube, frame = survey
+    csv = tmp_path / 'all.csv'
+    frame.drop(columns=['age_group', 'health_condition_count']).to_csv(csv, index=False)
+    fresh = open_cube(store.SurveyStore(store.current_directory(store.ingest(str(csv), str(tmp_path / 'cache')))))
+    by = ['ACE1', 'age_group']
+    pd.testing.assert_frame_equal(cube.estimates(by), fresh.estimates(by), check_dtype=False, rtol=1e-9)
@@ -0,0 +1,58 @@
+import os
+import shutil
+
+from conftest import write_survey_csv
+from survey import store
+
+
+def reingest(csv, cache_dir, seed):
+    write_survey_csv(csv, 500, seed)
+    return store.ingest(str(csv), str(cache_dir), chunk_rows=256)
+
+
+def test_reader_follows_a_reingested_dataset(tmp_path):
+    csv, cache_dir = tmp_path / 'survey.csv', tmp_path / 'cache'
+    old_root = reingest(csv, cache_dir, seed=0)
+    current = store.CurrentVersion(store.SurveyStore(store.current_directory(old_root)),
+                                   lambda data: data.manifest['source_hash'], interval=0)
+    first = current.get()
+
+    new_root = reingest(csv, cache_dir, seed=1)
+    # The replaced dataset stays until it is stale, and readers move off it
+    assert os.path.exists(store.current_directory(old_root))
+    assert current.get() != first
+    assert current._root == new_root
+
+    store.retire_datasets(str(cache_dir), new_root, [os.path.abspath(csv)], stale_seconds=0)
+    assert not os.path.exists(old_root)
+    assert os.path.exists(new_root)
+
+
+def test_reader_survives_a_deleted_dataset(tmp_path):
+    csv, cache_dir = tmp_path / 'survey.csv', tmp_path / 'cache'
+    root = reingest(csv, cache_dir, seed=0)
+    current = store.CurrentVersion(store.SurveyStore(store.current_directory(root)),
+                                   lambda data: data.manifest['source_hash'], interval=0)
+    first = current.get()
+
+    shutil.rmtree(root)
+    assert current.get() == first
+
+    new_root = reingest(csv, cache_dir, seed=1)
+    assert current.get() != first
+    assert current._root == new_root
+
+
+def test_replaced_versions_are_kept_until_stale(tmp_path):
+    csv, cache_dir = tmp_path / 'survey.csv', tmp_path / 'cache'
+    root = reingest(csv, cache_dir, seed=0)
+    for seed in range(1, 5):
+        write_survey_csv(tmp_path / f"batch{seed}.csv", 50, seed)
+        store.append(root, str(tmp_path / f"batch{seed}.csv"), chunk_rows=256)
+    versions = os.path.join(root, store.VERSIONS_DIR)
+    assert len(os.listdir(versions)) == 5
+
+    store.prune_versions(root, keep=2, stale_seconds=0)
+    assert sorted(os.listdir(versions)) == ['000004', '000005']
+    current = store.SurveyStore(store.current_directory(root))
+    assert len(current.frame()) == 700
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import write_survey_csv
+from survey import store
+from survey.table import SurveyTable, parse_filter
+
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('table')
+    csv = write_survey_csv(directory / 'survey.csv', 3000, seed=3)
+    frame = pd.read_csv(csv)
+    frame['STATE'] = np.random.default_rng(3).choice(['Ohio', 'ohio', 'Texas', 'Iowa'], len(frame))
+    frame.to_csv(csv, index=False)
+    root = store.ingest(csv, str(directory / 'cache'), chunk_rows=512)
+    return SurveyTable(store.SurveyStore(store.current_directory(root))), frame
+
+
+def test_case_prefixed_operators_are_parsed():
+    # What the DataTable sends with its default filter_options={'case': 'sensitive'}
+    assert parse_filter('{ACE1} s= 2 && {SCREENTIME} s> 1 && {STATE} icontains "oh"') == [
+        ('ACE1', '=', '2', True), ('SCREENTIME', '>', '1', True), ('STATE', 'contains', 'oh', False)]
+    assert parse_filter('{ACE1} ieq 2 && {FWC} le 10') == [('ACE1', '=', '2', False), ('FWC', '<=', '10', True)]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('{ACE1} s= 2', lambda f: f['ACE1'] == 2),
+    ('{ACE1} s= 2 && {SCREENTIME} s> 1', lambda f: (f['ACE1'] == 2) & (f['SCREENTIME'] > 1)),
+    ('{SC_AGE_YEARS} s<= 5 && {FWC} s>= 400', lambda f: (f['SC_AGE_YEARS'] <= 5) & (f['FWC'] >= 400)),
+    ('{STATE} scontains oh', lambda f: f['STATE'].str.contains('oh')),
+    ('{STATE} icontains oh', lambda f: f['STATE'].str.lower().str.contains('oh')),
+    ('{STATE} s= Ohio', lambda f: f['STATE'] == 'Ohio'),
+    ('{STATE} i= "OHIO"', lambda f: f['STATE'].str.lower() == 'ohio'),
+    ('{STATE} s!= Texas', lambda f: f['STATE'] != 'Texas'),
+    ('{SC_AGE_YEARS} datestartswith 2020', lambda f: f['SC_AGE_YEARS'] != f['SC_AGE_YEARS']),
+])
+def test_filtered_sorted_pages_match_pandas(table, query, expected):
+    table, frame = table
+    matching = frame[expected(frame)].sort_values('FWC', ascending=False, kind='stable')
+    rows, total = table.page(1, 25, [{'column_id': 'FWC', 'direction': 'desc'}], query)
+    assert total == len(matching)
+    assert [row['HHID'] for row in rows] == list(matching['HHID'].iloc[25:50])